@@ -9,6 +9,8 @@ Strategy:
 2. Add new table coverage (GL, PR, EM, IN, PO, PM modules)
 3. Add more negative examples (fake table rejection)
 4. Add edge cases (CTEs, window functions, complex JOINs)
+5. With --vgpt2, join on the real foreign keys of the Vista schema (multi-join
+   paths between modules) instead of placeholder Co joins
 
 The V4 format follows SQLCoder methodology:
 - DDL schema in the instruction
@@ -18,6 +20,7 @@ The V4 format follows SQLCoder methodology:
 Usage:
     python scripts/expand_v4_training_data.py --output data/vgpt2_v4_sft_expanded.json
     python scripts/expand_v4_training_data.py --preview  # Show what would be generated
+    python scripts/expand_v4_training_data.py --vgpt2 C:/Github/VGPT2 --output data/vgpt2_v4_sft_expanded.json
 
 Author: VGPT2 Training Pipeline
 Date: 2025-01-15
@@ -26,11 +29,17 @@ Date: 2025-01-15
 import json
 import argparse
 import random
+import sys
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, field, asdict
 from collections import defaultdict
 
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vgpt2_graph import JoinStep, path_tables, schema_graph, table_module
+from vgpt2_schema import load_vgpt2_schema
+
 
 # ============================================================================
 # Vista Module Definitions
@@ -453,8 +462,11 @@ class TrainingExample:
 
 class V4DataExpander:
     """Expands V4 training data with additional examples."""
+
+    # Cross-module join path examples per module (with a Vista schema)
+    PATHS_PER_MODULE = 12
     
-    def __init__(self, existing_data_path: str):
+    def __init__(self, existing_data_path: str, vgpt2_path: Optional[str] = None):
         self.existing_path = Path(existing_data_path)
         self.existing_data = []
         self.new_examples = []
@@ -464,6 +476,39 @@ class V4DataExpander:
             with open(self.existing_path, 'r', encoding='utf-8') as f:
                 self.existing_data = json.load(f)
             print(f"Loaded {len(self.existing_data)} existing examples")
+
+        # Foreign key join graph of the Vista schema (joins fall back to Co placeholders without it)
+        self.schema = load_vgpt2_schema(vgpt2_path) if vgpt2_path else None
+        self.join_graph = schema_graph(self.schema) if self.schema is not None else None
+        if self.join_graph is not None:
+            print(f"Loaded join graph: {self.schema.num_nodes()} tables, {self.join_graph.num_edges} joins")
+
+    def _join_step(self, table1: str, table2: str) -> Optional[JoinStep]:
+        """Direct foreign key join from table1 to table2, or None without a schema or foreign key."""
+        if self.join_graph is None:
+            return None
+        return self.join_graph.join_step(table1, table2)
+
+    def _join_clause(self, table1: str, table2: str) -> str:
+        """INNER JOIN line from table1 to table2.
+
+        Only direct foreign keys are used: a multi-hop path would join tables missing from the
+        prompt schema (see _generate_join_path_examples for examples built along paths).
+        """
+        step = self._join_step(table1, table2)
+        if step is None:
+            return f"INNER JOIN {table2} WITH (NOLOCK) ON {table1}.Co = {table2}.Co"
+        return f"INNER JOIN {table2} WITH (NOLOCK) ON {step.condition()}"
+
+    def _table_ddl(self, table: str) -> str:
+        """DDL of a table: the hand-written template, else built from the schema columns."""
+        if table in DDL_TEMPLATES or self.schema is None:
+            return DDL_TEMPLATES.get(table, DDL_TEMPLATES["JCJM"])
+        columns = [
+            f"  {col.name} {col.data_type}{' NOT NULL' if col.is_nullable is False else ''}"
+            for col in self.schema.columns(table)[:20]
+        ]
+        return f"CREATE TABLE {table} (\n" + ",\n".join(columns) + "\n);"
     
     def generate_gl_examples(self) -> List[TrainingExample]:
         """Generate General Ledger module examples."""
@@ -832,8 +877,79 @@ Note: PRTD links to JC via JCCo/Job/Phase for labor distribution.""",
                 "tables_used": ["PRTD", "JCCD", "JCJM"]
             }
         ))
+
+        # Foreign key paths from each module into other modules
+        examples.extend(self._generate_join_path_examples())
         
         return examples
+
+    def _generate_join_path_examples(self) -> List[TrainingExample]:
+        """Generate joins along foreign key paths that end in another module (needs the schema)."""
+        examples = []
+        if self.join_graph is None:
+            return examples
+
+        for module, module_info in VISTA_MODULES.items():
+            count = 0
+            for path in self.join_graph.module_paths(module, max_hops=2, cross_module=True):
+                if count >= self.PATHS_PER_MODULE:
+                    break
+                tables = path_tables(path)
+                if not all(self.schema.has_table(table) for table in tables):
+                    continue  # tables known only from foreign keys have no DDL
+                count += 1
+
+                start, end = tables[0], tables[-1]
+                end_module = VISTA_MODULES.get(table_module(end), {}).get("name", table_module(end))
+                co_col = next((col for col in self.schema.column_names(start) if col.endswith("Co")), None)
+                where = f"\nWHERE {start}.{co_col} = @{co_col}" if co_col else ""
+                steps = "\n".join(
+                    f"{i}. Join {step.right_table} on {', '.join(step.right_columns)}"
+                    for i, step in enumerate(path, start=2)
+                )
+                joins = "\n".join(
+                    f"INNER JOIN {step.right_table} WITH (NOLOCK) ON {step.condition()}" for step in path
+                )
+                if len(path) > 1:
+                    note = f"{start} and {end} have no direct foreign key; the join goes through {', '.join(tables[1:-1])}."
+                else:
+                    note = f"The join matches every column of the {path[0].constraint_name or 'foreign key'} relationship."
+                ddl = "\n\n".join(self._table_ddl(table) for table in tables)
+
+                examples.append(TrainingExample(
+                    instruction=f"""Generate a SQL query to answer the following question.
+
+Question: Show {start} records with their related {end} data
+
+Database Schema:
+{ddl}
+
+Provide:
+1. A brief explanation of the approach
+2. The SQL query
+3. Any important notes about Vista-specific conventions used""",
+                    input="",
+                    output=f"""To relate {start} ({module_info['name']}) to {end} ({end_module}):
+1. Query {start} as the primary table
+{steps}
+
+```sql
+SELECT 
+  {start}.*,
+  {end}.*
+FROM {start} WITH (NOLOCK)
+{joins}{where}
+```
+
+Note: {note}""",
+                    metadata={
+                        "category": "cross_module",
+                        "complexity": "advanced" if len(path) > 1 else "intermediate",
+                        "tables_used": tables
+                    }
+                ))
+
+        return examples
     
     def generate_cte_examples(self) -> List[TrainingExample]:
         """Generate examples using Common Table Expressions."""
@@ -1225,7 +1341,7 @@ Provide:
         table_alias = tables[0] if tables else "T"
         join_clause = ""
         if len(tables) > 1:
-            join_clause = f"\nINNER JOIN {tables[1]} WITH (NOLOCK) ON {tables[0]}.Co = {tables[1]}.Co"
+            join_clause = "\n" + self._join_clause(tables[0], tables[1])
         
         return f"""To answer this query:
 1. Query {tables[0]} for the primary data
@@ -1374,6 +1490,16 @@ Vista uses specific table naming conventions (e.g., APTH, ARTH, JCJM). Would you
         ]
         
         for table1, table2, join_keys, description, category in join_patterns:
+            join_clause = self._join_clause(table1, table2)
+            step = self._join_step(table1, table2)
+            if step is None:
+                join_clause += f"\n  -- Additional join keys: {join_keys}"
+                note = "Verify join keys based on your specific Vista configuration."
+            else:
+                join_keys = ", ".join(
+                    left if left == right else f"{table1}.{left} = {table2}.{right}" for left, right in step.pairs()
+                )
+                note = "Join conditions follow the foreign keys of the Vista schema."
             examples.append(TrainingExample(
                 instruction=f"""Generate a SQL query to answer the following question.
 
@@ -1399,13 +1525,12 @@ SELECT
   {table1}.*,
   {table2}.*
 FROM {table1} WITH (NOLOCK)
-INNER JOIN {table2} WITH (NOLOCK) ON {table1}.Co = {table2}.Co
-  -- Additional join keys: {join_keys}
+{join_clause}
 WHERE {table1}.Co = @Co
 ORDER BY {table1}.KeyID
 ```
 
-Note: Verify join keys based on your specific Vista configuration.""",
+Note: {note}""",
                 metadata={
                     "category": category,
                     "complexity": "intermediate",
@@ -1927,7 +2052,7 @@ Provide:
 SELECT 
   {main_table}.*
 FROM {main_table} WITH (NOLOCK)
-{"INNER JOIN " + tables[1] + " WITH (NOLOCK) ON " + main_table + ".Co = " + tables[1] + ".Co" if len(tables) > 1 else "-- Add joins as needed"}
+{self._join_clause(main_table, tables[1]) if len(tables) > 1 else "-- Add joins as needed"}
 WHERE {main_table}.Co = @Co
   -- Apply question-specific filters
 ORDER BY {main_table}.KeyID
@@ -2427,7 +2552,7 @@ Provide:
         primary = tables[0] if tables else "JCJM"
         join_note = ""
         if len(tables) > 1:
-            join_note = f"\nINNER JOIN {tables[1]} WITH (NOLOCK) ON {primary}.Co = {tables[1]}.Co"
+            join_note = "\n" + self._join_clause(primary, tables[1])
 
         return f"""To answer this question:
 1. Use {primary} as the driving table
@@ -2580,6 +2705,11 @@ def main():
         default="data/vgpt2_v4_sft_expanded.json",
         help="Output expanded dataset path"
     )
+    parser.add_argument(
+        "--vgpt2",
+        default=None,
+        help="Path to VGPT2 repository (join on the schema's foreign keys instead of Co placeholders)"
+    )
     parser.add_argument(
         "--preview",
         action="store_true",
@@ -2589,7 +2719,7 @@ def main():
     args = parser.parse_args()
     
     # Create expander
-    expander = V4DataExpander(args.input)
+    expander = V4DataExpander(args.input, args.vgpt2)
     
     # Generate expanded data
     combined = expander.expand_data()
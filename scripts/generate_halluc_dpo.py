@@ -6,12 +6,23 @@ This script creates DPO preference pairs that teach the model to:
 1. Reject fake/non-existent table names
 2. Reject fake column names on real tables  
 3. Reject generic SQL patterns not in Vista
+
+With --vgpt2, near-miss tables and columns (one edit away from real names,
+e.g. APHT or InvDtae) are synthesized from the schema and paired with the
+ranked "did you mean" suggestions of the fuzzy name index.
 """
 
+import argparse
 import json
 import random
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vgpt2_fuzzy import NameIndex, table_index
+from vgpt2_schema import SchemaSnapshot, load_vgpt2_schema
+
 # Common fake table names people might use (not in Vista)
 FAKE_TABLES = {
     # Invoice variations
@@ -230,6 +241,15 @@ FAKE_COLUMNS = {
     ],
 }
 
+# Question templates for fake columns
+FAKE_COLUMN_TEMPLATES = [
+    "Get {col} from {table}",
+    "Select {col} from {table}",
+    "What is {col} in {table}?",
+    "Query {table} for {col}",
+    "SELECT {col} FROM {table}",
+]
+
 # Generic SQL patterns that don't apply to Vista
 GENERIC_SQL_PATTERNS = [
     ("Join Users with Orders", "Neither 'Users' nor 'Orders' exist in Vista. For users, use DDUP. For purchase orders, use POHD."),
@@ -283,17 +303,9 @@ def generate_fake_column_pairs():
     """Generate DPO pairs for fake column rejection."""
     pairs = []
 
-    templates = [
-        "Get {col} from {table}",
-        "Select {col} from {table}",
-        "What is {col} in {table}?",
-        "Query {table} for {col}",
-        "SELECT {col} FROM {table}",
-    ]
-
     for table, columns in FAKE_COLUMNS.items():
         for fake_col, suggestion in columns:
-            for template in templates:
+            for template in FAKE_COLUMN_TEMPLATES:
                 question = template.format(col=fake_col, table=table)
 
                 chosen = f"The column '{fake_col}' does not exist in {table}. {suggestion}\n\nUse proper Vista column names with exact casing (Latin1_General_BIN collation)."
@@ -310,6 +322,72 @@ def generate_fake_column_pairs():
     return pairs
 
 
+def company_column(schema: SchemaSnapshot, table: str):
+    """Return the company column of a table's module (APCo for APTH, JCCo for bJCJM), or None if it has none."""
+    name = table[1:] if table.startswith('b') and len(table) > 2 else table
+    column = f"{name[:2].upper()}Co"
+    return column if schema.has_column(table, column) else None
+
+
+def generate_near_miss_table_pairs(schema: SchemaSnapshot, count: int, rng: random.Random):
+    """Generate DPO pairs for misspelled real tables (e.g. APHT instead of APTH)."""
+    index = table_index(schema)
+    table_names = [name for name in schema.table_names() if len(name) >= 4]
+
+    fakes = []
+    for real_table in rng.sample(table_names, min(count, len(table_names))):
+        fakes.extend((fake, real_table) for fake in index.near_misses(real_table, 1, rng))
+    suggestions = index.suggest_many([fake for fake, _ in fakes], k=4)
+
+    pairs = []
+    for fake_table, real_table in fakes:
+        similar = [name for name in suggestions[fake_table] if name != real_table][:3]
+        also = f" Similar tables: {', '.join(similar)}." if similar else ""
+        question = rng.choice(FAKE_TABLE_TEMPLATES).format(fake=fake_table)
+
+        company = company_column(schema, real_table)
+        where = f"\nWHERE {company} = @{company}" if company else ""
+        chosen = f"There is no '{fake_table}' table in Viewpoint Vista. Did you mean {real_table}?{also}\n\n```sql\nSELECT *\nFROM {real_table} WITH (NOLOCK){where}\n```"
+
+        rejected = f"```sql\nSELECT *\nFROM {fake_table}\n```"
+
+        pairs.append({
+            "instruction": question,
+            "input": "",
+            "chosen": chosen,
+            "rejected": rejected
+        })
+
+    return pairs
+
+
+def generate_near_miss_column_pairs(schema: SchemaSnapshot, count: int, rng: random.Random):
+    """Generate DPO pairs for misspelled columns of real tables (e.g. InvDtae instead of InvDate)."""
+    tables = [name for name in schema.table_names() if schema.num_columns(name)]
+
+    pairs = []
+    for table in rng.sample(tables, min(count, len(tables))):
+        index = NameIndex(schema.column_names(table))
+        real_col = rng.choice(schema.column_names(table))
+        for fake_col in index.near_misses(real_col, 1, rng):
+            similar = [name for name in index.suggest(fake_col, 4) if name != real_col][:2]
+            also = f" Similar columns: {', '.join(similar)}." if similar else ""
+            question = rng.choice(FAKE_COLUMN_TEMPLATES).format(col=fake_col, table=table)
+
+            chosen = f"The column '{fake_col}' does not exist in {table}. Did you mean {real_col}?{also}\n\nUse proper Vista column names with exact casing (Latin1_General_BIN collation)."
+
+            rejected = f"```sql\nSELECT {fake_col}\nFROM {table}\n```"
+
+            pairs.append({
+                "instruction": question,
+                "input": "",
+                "chosen": chosen,
+                "rejected": rejected
+            })
+
+    return pairs
+
+
 def generate_generic_sql_pairs():
     """Generate DPO pairs for generic SQL pattern rejection."""
     pairs = []
@@ -335,6 +413,14 @@ def generate_generic_sql_pairs():
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate hallucination-focused DPO pairs")
+    parser.add_argument("--vgpt2", type=str, default=None,
+                        help="Path to VGPT2 repository (enables near-miss table/column pairs)")
+    parser.add_argument("--near-miss", type=int, default=500,
+                        help="Near-miss table pairs and near-miss column pairs to generate (each)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for near-miss names")
+    args = parser.parse_args()
+
     print("Generating hallucination-focused DPO pairs...")
 
     # Generate all pairs
@@ -347,8 +433,16 @@ def main():
     generic_sql_pairs = generate_generic_sql_pairs()
     print(f"  Generic SQL pairs: {len(generic_sql_pairs)}")
 
+    near_miss_pairs = []
+    schema = load_vgpt2_schema(args.vgpt2) if args.vgpt2 else None
+    if schema is not None:
+        rng = random.Random(args.seed)
+        near_miss_pairs = generate_near_miss_table_pairs(schema, args.near_miss, rng)
+        near_miss_pairs += generate_near_miss_column_pairs(schema, args.near_miss, rng)
+        print(f"  Near-miss pairs: {len(near_miss_pairs)}")
+
     # Combine all
-    all_pairs = fake_table_pairs + fake_column_pairs + generic_sql_pairs
+    all_pairs = fake_table_pairs + fake_column_pairs + generic_sql_pairs + near_miss_pairs
     print(f"\nTotal hallucination pairs: {len(all_pairs)}")
 
     # Save to file
@@ -40,6 +40,11 @@ from dataclasses import dataclass, field, asdict
 from typing import List, Dict, Optional, Iterator
 from enum import Enum
 import logging
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vgpt2_schema import SchemaSnapshot, load_metadata_schema
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -427,16 +432,12 @@ class VGPT2DatasetGenerator:
     # DATA LOADING METHODS
     # =========================================================================
 
-    def load_columns(self) -> Dict:
-        """Load and cache columns.json."""
+    def load_columns(self) -> Optional[SchemaSnapshot]:
+        """Load and cache the compiled schema snapshot of columns.json."""
         if self._columns_cache is None:
-            columns_file = self.metadata_dir / "columns.json"
-            if columns_file.exists():
-                with open(columns_file, 'r', encoding='utf-8') as f:
-                    self._columns_cache = json.load(f)
-                logger.info(f"Loaded {len(self._columns_cache)} column definitions")
-            else:
-                self._columns_cache = {}
+            self._columns_cache = load_metadata_schema(self.metadata_dir)
+            if self._columns_cache is not None:
+                logger.info(f"Loaded {self._columns_cache.num_columns()} column definitions")
         return self._columns_cache
 
     def load_ddfi(self) -> List[Dict]:
@@ -545,39 +546,26 @@ class VGPT2DatasetGenerator:
     def generate_schema_queries(self, max_records: Optional[int] = None) -> List[TrainingRecord]:
         """Generate schema query training examples."""
         records = []
-        columns = self.load_columns()
-
-        # columns.json is a list of column definitions
-        # Group columns by ObjectName (table/view name)
-        tables = {}
-        for col in columns:
-            if isinstance(col, dict):
-                obj_name = col.get('ObjectName', 'unknown')
-                schema = col.get('SchemaName', 'dbo')
-                full_name = f"{schema}.{obj_name}" if schema != 'dbo' else obj_name
-
-                if full_name not in tables:
-                    tables[full_name] = {
-                        'columns': [],
-                        'module': col.get('Module', 'Unknown'),
-                        'object_type': col.get('ObjectType', 'Table')
-                    }
-                tables[full_name]['columns'].append(col)
+        schema = self.load_columns()
+        if schema is None:
+            return records
 
         # Generate examples for each table
-        for table_name, table_info in tables.items():
+        for obj_name in schema.table_names():
             if max_records and len(records) >= max_records:
                 break
 
-            cols = table_info['columns']
-            obj_type = table_info['object_type'].lower()
-            module = table_info['module']
+            attributes = schema.table_attributes(obj_name)
+            schema_name = attributes['schema_name'] or 'dbo'
+            table_name = f"{schema_name}.{obj_name}" if schema_name != 'dbo' else obj_name
+            obj_type = (attributes['object_type'] or 'Table').lower()
+            module = attributes['module'] or 'Unknown'
+            col_names = schema.column_names(obj_name)
 
             # Example 1: "What columns are in TABLE?"
-            col_names = [c.get('ColumnName', 'unknown') for c in cols[:15]]
-            col_list = ", ".join(col_names)
-            if len(cols) > 15:
-                col_list += f"... ({len(cols)} total columns)"
+            col_list = ", ".join(col_names[:15])
+            if len(col_names) > 15:
+                col_list += f"... ({len(col_names)} total columns)"
 
             records.append(TrainingRecord(
                 instruction=f"What columns are in the {table_name} {obj_type}?",
@@ -589,11 +577,10 @@ class VGPT2DatasetGenerator:
             ))
 
             # Example 2: Column details for first few columns
-            if len(cols) >= 3:
-                detail_cols = cols[:3]
+            if len(col_names) >= 3:
                 details = []
-                for c in detail_cols:
-                    details.append(f"{c.get('ColumnName')} ({c.get('DataType')}, {'nullable' if c.get('IsNullable') == 'True' else 'not null'})")
+                for c in schema.columns(obj_name)[:3]:
+                    details.append(f"{c.name} ({c.data_type}, {'nullable' if c.is_nullable else 'not null'})")
 
                 records.append(TrainingRecord(
                     instruction=f"Describe the key columns in {table_name}",
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Unit tests for the parallel batch runner.
+
+Usage:
+    pytest test_vgpt2_batch.py -v
+"""
+
+import multiprocessing
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vgpt2_batch import BatchRunner  # noqa: E402
+
+
+def _check(offset: int, item: int) -> tuple[int, int]:
+    return item + offset, os.getpid()
+
+
+def _parity(result: tuple[int, int]) -> list[str]:
+    return ["even" if result[0] % 2 == 0 else "odd"] + (["large"] if result[0] >= 100 else [])
+
+
+@pytest.mark.parametrize(
+    "workers, chunk_size",
+    [
+        (1, 7),
+        (1, 1000),
+        pytest.param(
+            3,
+            7,
+            marks=pytest.mark.skipif(
+                "fork" not in multiprocessing.get_all_start_methods(), reason="Requires the fork start method."
+            ),
+        ),
+    ],
+)
+def test_batch_runner(workers: int, chunk_size: int):
+    items = list(range(250))
+    runner = BatchRunner(_check, 10, workers=workers, chunk_size=chunk_size, tally=_parity)
+    results = runner.run(items)
+    assert [value for value, _ in results] == [item + 10 for item in items]  # in input order
+    assert runner.processed == len(items)
+    assert runner.counts == {"even": 125, "odd": 125, "large": 160}
+
+    pids = {pid for _, pid in results}
+    if workers == 1:
+        assert pids == {os.getpid()}  # in-process
+    else:
+        assert os.getpid() not in pids
+
+    assert runner.run(items[:5]) == [(item + 10, os.getpid()) for item in items[:5]]  # a single chunk stays local
+    assert runner.counts == {"even": 3, "odd": 2}  # reset per run
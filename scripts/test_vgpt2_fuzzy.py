@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Unit tests for the fuzzy name index.
+
+Usage:
+    pytest test_vgpt2_fuzzy.py -v
+"""
+
+import random
+import string
+import sys
+from pathlib import Path
+
+import pytest
+
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vgpt2_fuzzy import NameIndex, levenshtein  # noqa: E402
+
+
+NAMES = [
+    "APTH", "APTD", "APTL", "APHB", "APVM", "APUI", "APUL", "JCJM", "JCCD", "JCCM", "JCCP",
+    "HQCO", "HQMA", "PRTH", "PREH", "ARTH", "ARTL", "bAPTH", "vrvAPVendors", "udVendorNotes",
+]  # fmt: skip
+
+
+def _dp_levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def _random_name(rng: random.Random, max_length: int) -> str:
+    return "".join(rng.choice("ABCDHJPT") for _ in range(rng.randint(0, max_length)))
+
+
+@pytest.fixture(scope="module")
+def index() -> NameIndex:
+    return NameIndex(NAMES)
+
+
+def test_levenshtein():
+    assert levenshtein("kitten", "sitting") == 3
+    assert levenshtein("", "APTH") == 4
+    assert levenshtein("APTH", "") == 4
+    assert levenshtein("APHT", "APTH") == 2  # a swap is two edits
+
+    rng = random.Random(0)
+    for _ in range(2000):
+        a, b = _random_name(rng, 12), _random_name(rng, 12)
+        assert levenshtein(a, b) == _dp_levenshtein(a, b), (a, b)
+
+    a, b = _random_name(rng, 100) + "X" * 70, _random_name(rng, 100)  # wider than a 64-bit word
+    assert levenshtein(a, b) == _dp_levenshtein(a, b)
+
+
+def test_within(index: NameIndex):
+    keys = [name.upper() for name in NAMES]
+    rng = random.Random(0)
+    queries = NAMES + ["APHT", "JCMJ", "HQC", "apth", "XYZ", ""] + [_random_name(rng, 6) for _ in range(200)]
+    for query in queries:
+        for radius in range(4):
+            expected = sorted(
+                (_dp_levenshtein(query.upper(), key), key)
+                for key in keys
+                if _dp_levenshtein(query.upper(), key) <= radius
+            )
+            assert index.within(query, radius) == expected, (query, radius)
+
+    assert NameIndex([]).within("APTH", 2) == []
+
+
+def test_suggest(index: NameIndex):
+    assert index.suggest("APHT")[:2] == ["APTH", "APHB"]  # an adjacent swap ranks first among single edits
+    assert index.suggest("JCMJ")[0] == "JCJM"
+    assert index.suggest("APTX")[:3] == ["APTD", "APTH", "APTL"]  # one edit, then by name
+    assert index.suggest("apth", k=1) == ["APTH"]
+    assert index.suggest("VendorNotes")[0] == "udVendorNotes"  # by trigrams beyond the edit radius
+    assert index.suggest("QQQQ") == []
+    assert len(index.suggest("AP", k=3)) == 3
+
+    suggestions = index.suggest("APHT")
+    suggestions.clear()
+    assert index.suggest("APHT")[0] == "APTH"  # memoized results are copies
+    assert index.suggest_many(["APHT", "JCMJ", "APHT"]) == {
+        "APHT": index.suggest("APHT"),
+        "JCMJ": index.suggest("JCMJ"),
+    }
+    assert NameIndex(["APTH", "apth"]).suggest("Apth") == ["APTH", "apth"]  # one entry, both spellings
+
+
+def test_near_misses(index: NameIndex):
+    keys = {name.upper() for name in NAMES}
+    for name in ["APTH", "APTD", "JCJM", "HQCO", "bAPTH", "vrvAPVendors"]:
+        for seed in range(50):
+            fakes = index.near_misses(name, 5, random.Random(seed))
+            assert len(fakes) == len(set(fakes)) <= 5
+            for fake in fakes:
+                assert fake.upper() not in keys  # never an indexed name, in any case
+                assert fake.startswith(name[:2])
+                assert 1 <= levenshtein(fake, name) <= 2  # one edit (a swap counts as two)
+
+    assert index.near_misses("APTH", 5, random.Random(1)) == index.near_misses("APTH", 5, random.Random(1))
+    fakes = index.near_misses("AP", 50, random.Random(0))
+    assert "A" not in fakes and all(fake[:2] == "AP" for fake in fakes)
+    assert all(char in string.ascii_uppercase for fake in fakes for char in fake)  # replacements keep the case
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Unit tests for the foreign key join graph.
+
+The fixture schema has composite foreign keys in both foreign_keys.json layouts
+and a hub table (HQCO) joined to every module by company only.
+
+Usage:
+    pytest test_vgpt2_graph.py -v
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import vgpt2_graph  # noqa: E402
+from vgpt2_graph import JoinGraph, JoinStep, from_clause, path_tables, table_module  # noqa: E402
+from vgpt2_schema import load_schema  # noqa: E402
+
+
+COLUMNS = {
+    "APTH": ["APCo", "Mth", "APTrans", "VendorGroup", "Vendor"],
+    "APTL": ["APCo", "Mth", "APTrans", "APLine", "JCCo", "Job"],
+    "APTD": ["APCo", "Mth", "APTrans", "APLine", "APSeq"],
+    "APVM": ["VendorGroup", "Vendor", "Name"],
+    "JCJM": ["JCCo", "Job", "Description"],
+    "JCCD": ["JCCo", "Job", "Mth", "CostTrans"],
+    "HQCO": ["HQCo", "Name"],
+}
+FOREIGN_KEYS = [
+    # The per-column layout: one row per column of the constraint
+    *(
+        {
+            "ParentTable": "APTL",
+            "ParentColumn": column,
+            "ReferencedTable": "APTH",
+            "ReferencedColumn": column,
+            "ConstraintName": "FK_APTL_APTH",
+        }
+        for column in ("APCo", "Mth", "APTrans")
+    ),
+    {
+        "ParentTable": "APTD",
+        "ParentColumns": ["APCo", "Mth", "APTrans", "APLine"],
+        "ReferencedTable": "APTL",
+        "ReferencedColumns": ["APCo", "Mth", "APTrans", "APLine"],
+        "ConstraintName": "FK_APTD_APTL",
+    },
+    {
+        "ParentTable": "APTH",
+        "ParentColumns": ["VendorGroup", "Vendor"],
+        "ReferencedTable": "APVM",
+        "ReferencedColumns": ["VendorGroup", "Vendor"],
+        "ConstraintName": "FK_APTH_APVM",
+    },
+    {
+        "ParentTable": "APTL",
+        "ParentColumns": ["JCCo", "Job"],
+        "ReferencedTable": "JCJM",
+        "ReferencedColumns": ["JCCo", "Job"],
+        "ConstraintName": "FK_APTL_JCJM",
+    },
+    {
+        "ParentTable": "JCCD",
+        "ParentColumns": ["JCCo", "Job"],
+        "ReferencedTable": "JCJM",
+        "ReferencedColumns": ["JCCo", "Job"],
+        "ConstraintName": "FK_JCCD_JCJM",
+    },
+    # HQCO is a hub: 23 tables join it by company alone
+    *(
+        {
+            "ParentTable": table,
+            "ParentColumns": [column],
+            "ReferencedTable": "HQCO",
+            "ReferencedColumns": ["HQCo"],
+            "ConstraintName": f"FK_{table}_HQCO",
+        }
+        for table, column in [("APTH", "APCo"), ("JCJM", "JCCo"), ("JCCD", "JCCo")]
+        + [(f"HQ{i:02d}", "HQCo") for i in range(20)]
+    ),
+]
+
+
+def _tables(paths) -> list[list[str]]:
+    return sorted(path_tables(path) for path in paths)
+
+
+@pytest.fixture(scope="module")
+def graph(tmp_path_factory: pytest.TempPathFactory) -> JoinGraph:
+    root = tmp_path_factory.mktemp("metadata")
+    columns = [
+        {"ObjectName": table, "ColumnName": column, "DataType": "int"}
+        for table, names in COLUMNS.items()
+        for column in names
+    ]
+    (root / "columns.json").write_text(json.dumps(columns), encoding="utf-8")
+    (root / "foreign_keys.json").write_text(json.dumps(FOREIGN_KEYS), encoding="utf-8")
+    return JoinGraph(load_schema(root / "columns.json", root / "foreign_keys.json", root / "cache"))
+
+
+def test_join_step(graph: JoinGraph):
+    step = graph.join_step("APTL", "APTH")
+    assert step == JoinStep("APTL", "APTH", ("APCo", "Mth", "APTrans"), ("APCo", "Mth", "APTrans"), "FK_APTL_APTH")
+    assert step.condition() == "APTL.APCo = APTH.APCo AND APTL.Mth = APTH.Mth AND APTL.APTrans = APTH.APTrans"
+    assert graph.join_step("APTH", "APTL") == step.reversed()
+    assert graph.join_step("APTD", "APTH") is None  # no direct foreign key
+    assert graph.join_step("APTH", "APTH") is None
+    assert graph.degree("HQCO") == 23
+    assert graph.num_edges == 28
+
+
+def test_shortest_path(graph: JoinGraph):
+    assert path_tables(graph.shortest_path("APTH", "JCCD")) == ["APTH", "HQCO", "JCCD"]
+    assert path_tables(graph.shortest_path("APTD", "JCCD")) == ["APTD", "APTL", "JCJM", "JCCD"]
+    assert graph.shortest_path("APTD", "JCCD", max_hops=2) is None
+    assert graph.shortest_path("APTH", "APTH") == ()
+    assert graph.shortest_path("APTH", "APXX") is None
+
+
+def test_best_path(graph: JoinGraph):
+    assert path_tables(graph.best_path("APTH", "JCCD")) == ["APTH", "APTL", "JCJM", "JCCD"]  # around the hub
+    assert graph.best_path("APTH", "JCCD", max_hops=2) is None  # the cheapest path is too long
+    assert path_tables(graph.best_path("HQ00", "JCCD")) == ["HQ00", "HQCO", "JCCD"]  # only through the hub
+    assert from_clause(graph.best_path("APTD", "APTH")) == (
+        "FROM APTD WITH (NOLOCK)\n"
+        "INNER JOIN APTL WITH (NOLOCK) ON APTD.APCo = APTL.APCo AND APTD.Mth = APTL.Mth"
+        " AND APTD.APTrans = APTL.APTrans AND APTD.APLine = APTL.APLine\n"
+        "INNER JOIN APTH WITH (NOLOCK) ON APTL.APCo = APTH.APCo AND APTL.Mth = APTH.Mth AND APTL.APTrans = APTH.APTrans"
+    )
+
+
+def test_paths_from(graph: JoinGraph, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(vgpt2_graph, "HUB_DEGREE", 5)
+    assert _tables(graph.paths_from("JCCD")) == [
+        ["JCCD", "HQCO"],  # ends at the hub, does not pass through it
+        ["JCCD", "JCJM"],
+        ["JCCD", "JCJM", "APTL"],
+        ["JCCD", "JCJM", "HQCO"],
+    ]
+    assert _tables(graph.paths_from("JCCD", max_hops=1)) == [["JCCD", "HQCO"], ["JCCD", "JCJM"]]
+
+    through_hubs = _tables(graph.paths_from("JCCD", through_hubs=True))
+    assert len(through_hubs) == 4 + 22
+    assert ["JCCD", "HQCO", "HQ00"] in through_hubs
+    assert ["JCCD", "HQCO", "JCCD"] not in through_hubs
+
+    for path in graph.paths_from("APTD", max_hops=4, through_hubs=True):
+        tables = path_tables(path)
+        assert 1 <= len(path) <= 4
+        assert len(set(tables)) == len(tables)  # simple paths only
+
+
+def test_module_paths(graph: JoinGraph, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(vgpt2_graph, "HUB_DEGREE", 5)
+    assert _tables(graph.module_paths("jc", max_hops=1)) == [
+        ["JCCD", "HQCO"],
+        ["JCCD", "JCJM"],
+        ["JCJM", "APTL"],
+        ["JCJM", "HQCO"],
+        ["JCJM", "JCCD"],
+    ]
+    assert _tables(graph.module_paths("JC", max_hops=1, cross_module=True)) == [
+        ["JCCD", "HQCO"],
+        ["JCJM", "APTL"],
+        ["JCJM", "HQCO"],
+    ]
+
+    cross_module = _tables(graph.module_paths("JC", max_hops=2, cross_module=True))
+    assert ["JCCD", "JCJM", "APTL"] in cross_module
+    assert all(table_module(tables[-1]) != "JC" for tables in cross_module)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Unit tests for the compiled Vista schema snapshot.
+
+These tests compile a small metadata fixture and check the snapshot cache:
+compilation, reloading from disk, invalidation of stale snapshots and pickling.
+
+Usage:
+    pytest test_vgpt2_schema.py -v
+"""
+
+import json
+import os
+import pickle
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import vgpt2_schema  # noqa: E402
+from vgpt2_schema import ColumnRecord, ForeignKeyRecord, load_metadata_schema, load_schema  # noqa: E402
+
+
+COLUMNS = [
+    {"ObjectName": "APTH", "ColumnName": "APCo", "DataType": "tinyint", "IsNullable": "False", "Module": "AP"},
+    {"ObjectName": "APTH", "ColumnName": "Mth", "DataType": "smalldatetime", "IsNullable": "False"},
+    {"ObjectName": "APTH", "ColumnName": "Vendor", "DataType": "int", "IsNullable": "True", "OrdinalPosition": 3},
+    {"ObjectName": "APVM", "ColumnName": "VendorGroup", "DataType": "tinyint", "IsNullable": "False"},
+    {"ObjectName": "APVM", "ColumnName": "Vendor", "DataType": "int", "IsNullable": "False"},
+]
+FOREIGN_KEYS = [
+    {
+        "ParentTable": "APTH",
+        "ParentColumns": ["Vendor"],
+        "ReferencedTable": "APVM",
+        "ReferencedColumns": ["Vendor"],
+        "ConstraintName": "FK_APTH_APVM",
+    },
+    # The per-column layout: one row per column of the constraint
+    {
+        "ParentTable": "APTL",
+        "ParentColumn": "APCo",
+        "ReferencedTable": "APTH",
+        "ReferencedColumn": "APCo",
+        "ConstraintName": "FK_APTL_APTH",
+    },
+    {
+        "ParentTable": "APTL",
+        "ParentColumn": "Mth",
+        "ReferencedTable": "APTH",
+        "ReferencedColumn": "Mth",
+        "ConstraintName": "FK_APTL_APTH",
+    },
+    {
+        "ParentTable": "APTL",
+        "ParentColumn": "APTrans",
+        "ReferencedTable": "APTH",
+        "ReferencedColumn": "APTrans",
+        "ConstraintName": "FK_APTL_APTH",
+    },
+]
+
+
+class Metadata:
+    r"""A metadata directory with its own snapshot cache."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.cache_dir = root / "cache"
+        self.columns_file = root / "columns.json"
+        self.fk_file = root / "foreign_keys.json"
+        self.write_columns(COLUMNS)
+        self.fk_file.write_text(json.dumps(FOREIGN_KEYS), encoding="utf-8")
+
+    def write_columns(self, columns: list[dict]) -> None:
+        self.columns_file.write_text(json.dumps(columns), encoding="utf-8")
+
+    def load(self, **kwargs) -> "vgpt2_schema.SchemaSnapshot":
+        return load_schema(self.columns_file, self.fk_file, self.cache_dir, **kwargs)
+
+
+@pytest.fixture
+def metadata(tmp_path: Path):
+    vgpt2_schema._SNAPSHOTS.clear()
+    yield Metadata(tmp_path)
+    vgpt2_schema._SNAPSHOTS.clear()
+
+
+def test_compile(metadata: Metadata):
+    schema = metadata.load()
+    assert schema.path.exists()
+    assert schema.table_names() == ["APTH", "APVM"]
+    assert schema.column_names("APTH") == ["APCo", "Mth", "Vendor"]
+    assert schema.has_table("apth", case_sensitive=False)
+    assert not schema.has_table("APTD")
+    assert schema.num_columns() == 5
+    assert schema.column("APTH", "Vendor") == ColumnRecord("Vendor", "int", True, 3, None, None, None, None)
+    assert schema.table_attributes("APTH")["module"] == "AP"
+
+    fk = ForeignKeyRecord("APTH", ("Vendor",), "APVM", ("Vendor",), "FK_APTH_APVM")
+    composite_fk = ForeignKeyRecord(
+        "APTL", ("APCo", "Mth", "APTrans"), "APTH", ("APCo", "Mth", "APTrans"), "FK_APTL_APTH"
+    )
+    assert schema.num_foreign_keys() == 2
+    assert schema.foreign_keys("APTH") == [fk, composite_fk]
+    assert schema.foreign_keys("APVM") == [fk]
+    assert schema.foreign_keys("APTL") == [composite_fk]  # a table without columns keeps its foreign keys
+    assert schema.fk_dicts()["APTH"][0]["referenced_table"] == "APVM"
+    assert load_metadata_schema(metadata.root, metadata.cache_dir) is schema
+    assert load_metadata_schema(metadata.root / "missing", metadata.cache_dir) is None
+
+
+def test_reload(metadata: Metadata):
+    schema = metadata.load()
+    assert metadata.load() is schema  # shared within the process
+    vgpt2_schema._SNAPSHOTS.clear()  # a new process
+    with mock.patch.object(vgpt2_schema, "compile_schema", wraps=vgpt2_schema.compile_schema) as compile_schema:
+        reloaded = metadata.load()
+        assert reloaded is not schema
+        assert reloaded.path == schema.path
+        assert reloaded.column_names("APVM") == ["VendorGroup", "Vendor"]
+        compile_schema.assert_not_called()
+
+        stat = metadata.columns_file.stat()
+        os.utime(metadata.columns_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))  # same content
+        assert metadata.load() is reloaded
+        compile_schema.assert_not_called()
+
+        metadata.load(force=True)
+        compile_schema.assert_called_once()
+
+
+def test_reload_unreadable(metadata: Metadata, caplog: pytest.LogCaptureFixture):
+    path = metadata.load().path
+    vgpt2_schema._SNAPSHOTS.clear()
+    path.write_bytes(b"garbage")
+    schema = metadata.load()
+    assert "Ignoring unreadable schema snapshot" in caplog.text
+    assert schema.column_names("APTH") == ["APCo", "Mth", "Vendor"]
+
+
+_os_replace = os.replace
+
+
+def _replace_unmapped(src, dst):
+    assert Path(dst) not in vgpt2_schema._MAPPED  # Windows cannot replace a memory-mapped file
+    _os_replace(src, dst)
+
+
+def test_stale_invalidation(metadata: Metadata):
+    schema = metadata.load()
+    metadata.write_columns(COLUMNS + [{"ObjectName": "APTH", "ColumnName": "InvTotal", "DataType": "numeric"}])
+    with mock.patch.object(vgpt2_schema.os, "replace", _replace_unmapped):
+        reloaded = metadata.load()
+    assert reloaded is not schema
+    assert reloaded.path != schema.path  # compiled to a new file
+    assert schema.path.exists()  # the stale snapshot is still mapped here
+    assert "InvTotal" in reloaded.column_names("APTH")
+    assert metadata.load() is reloaded
+    assert schema.column_names("APTH") == ["APCo", "Mth", "Vendor"]  # the stale holders keep working
+
+    stale_path = reloaded.path
+    del reloaded
+    metadata.write_columns(COLUMNS)
+    assert metadata.load().path not in (schema.path, stale_path)
+    assert schema.path.exists()
+    assert not stale_path.exists()  # removed once nothing maps it
+
+    metadata.write_columns(COLUMNS[:3])
+    metadata.fk_file.unlink()
+    reloaded = metadata.load()
+    assert reloaded.table_names() == ["APTH"]
+    assert reloaded.sources["foreign_keys"] is None
+    assert reloaded.num_foreign_keys() == 0
+    assert schema.column_names("APVM") == ["VendorGroup", "Vendor"]
+
+
+def test_pickle(metadata: Metadata):
+    schema = metadata.load()
+    data = pickle.dumps(schema)
+    assert len(data) < 1024  # pickles as its path, not its contents
+    assert pickle.loads(data) is schema
+
+    vgpt2_schema._SNAPSHOTS.clear()  # a worker process re-maps the file
+    restored = pickle.loads(data)
+    assert restored is not schema
+    assert restored.path == schema.path
+    assert restored.column_names("APTH") == schema.column_names("APTH")
+    assert restored.foreign_keys("APTH") == schema.foreign_keys("APTH")
@@ -17,6 +17,7 @@ Date: 2024-12-27
 
 import json
 import re
+import sys
 import argparse
 from pathlib import Path
 from collections import Counter
@@ -24,6 +25,10 @@ from dataclasses import dataclass
 from typing import List, Dict, Optional, Tuple
 import logging
 
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vgpt2_batch import DEFAULT_CHUNK_SIZE, BatchRunner
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -70,8 +75,14 @@ class TrainingDataValidator:
         self.seen_instructions = set()
         self.seen_outputs = set()
 
-    def validate_dataset(self, data: List[Dict]) -> DatasetValidationReport:
-        """Validate entire dataset and return report."""
+    def validate_dataset(self, data: List[Dict], workers: Optional[int] = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> DatasetValidationReport:
+        """
+        Validate entire dataset and return report.
+
+        The per-record checks run on a process pool (workers=1 runs in-process);
+        duplicate tracking and the distributions are collected here, in record order.
+        """
         results = []
         categories = Counter()
         quality_scores = Counter()
@@ -79,14 +90,16 @@ class TrainingDataValidator:
         output_lengths = []
         duplicates = 0
 
-        for idx, record in enumerate(data):
-            result = self.validate_record(record, idx)
+        runner = BatchRunner(_check_record, self, workers=workers, chunk_size=chunk_size)
+        for idx, (record, (issues, warnings)) in enumerate(zip(data, runner.imap(data))):
+            result = ValidationResult(record_idx=idx, issues=issues, warnings=warnings)
             results.append(result)
 
             # Track duplicates
             instr = record.get('instruction', '')
             if instr in self.seen_instructions:
                 duplicates += 1
+                warnings.append("Duplicate instruction")
             self.seen_instructions.add(instr)
 
             # Track category distribution
@@ -127,6 +140,16 @@ class TrainingDataValidator:
 
     def validate_record(self, record: Dict, idx: int) -> ValidationResult:
         """Validate a single training record."""
+        issues, warnings = self.check_record(record)
+
+        # Check for duplicate instruction
+        if record.get('instruction', '') in self.seen_instructions:
+            warnings.append("Duplicate instruction")
+
+        return ValidationResult(record_idx=idx, issues=issues, warnings=warnings)
+
+    def check_record(self, record: Dict) -> Tuple[List[str], List[str]]:
+        """Run the stateless checks of one record; returns (issues, warnings)."""
         issues = []
         warnings = []
 
@@ -153,11 +176,7 @@ class TrainingDataValidator:
             sql_issues = self._validate_sql_output(output)
             warnings.extend(sql_issues)
 
-        # Check for duplicate instruction
-        if instruction in self.seen_instructions:
-            warnings.append("Duplicate instruction")
-
-        return ValidationResult(record_idx=idx, issues=issues, warnings=warnings)
+        return issues, warnings
 
     def _validate_sql_output(self, output: str) -> List[str]:
         """Basic SQL validation for output."""
@@ -229,11 +248,20 @@ class TrainingDataValidator:
         print("=" * 70)
 
 
+def _check_record(validator: TrainingDataValidator, record: Dict) -> Tuple[List[str], List[str]]:
+    # Module-level so the process pool can pickle it
+    return validator.check_record(record)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Validate training data for LLaMA Factory')
     parser.add_argument('input_file', help='Path to training data JSON file')
     parser.add_argument('--strict', action='store_true', help='Fail on any warnings')
     parser.add_argument('--output', help='Save validation report to file')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: all cores, 1 = no pool)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Records per worker task')
 
     args = parser.parse_args()
 
@@ -250,7 +278,7 @@ def main():
 
     # Validate
     validator = TrainingDataValidator()
-    report = validator.validate_dataset(data)
+    report = validator.validate_dataset(data, workers=args.workers, chunk_size=args.chunk_size)
 
     # Print report
     validator.print_report(report)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Parallel Batch Validation
+=========================
+Runs a per-record check over a large dataset on a process pool.
+
+- Records are split into fixed-size chunks; one task validates one chunk.
+- Results stream back in input order (Pool.imap), so callers can keep
+  order-dependent state (duplicate tracking) in the parent process.
+- The validator ("context") is shared read-only with the workers. Under fork it
+  and the records are inherited copy-on-write and tasks only carry index ranges;
+  under spawn the context is pickled once per worker (a SchemaSnapshot pickles
+  as its path and is re-mapped, not re-parsed).
+- Each chunk tallies its own counts (e.g. per error code); the parent merges them.
+- Small batches and workers=1 run in-process through the same code path.
+
+Usage:
+    from vgpt2_batch import BatchRunner
+
+    def check(validator, sql):
+        return validator.validate(sql)
+
+    def error_codes(result):
+        return [e.code for e in result.errors]
+
+    runner = BatchRunner(check, validator, tally=error_codes)
+    for result in runner.imap(queries):
+        ...
+    print(runner.counts.most_common(5))
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 256
+
+# Below this many chunks a pool costs more than it saves
+MIN_PARALLEL_CHUNKS = 2
+
+# Worker-side state: (func, context, tally, items). Set by fork inheritance or by _init_worker.
+_WORKER: Optional[Tuple[Callable, Any, Optional[Callable], Optional[Sequence]]] = None
+
+
+def default_workers() -> int:
+    """Number of usable cores (respects CPU affinity where available)."""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def _init_worker(func: Callable, context: Any, tally: Optional[Callable]) -> None:
+    global _WORKER
+    _WORKER = (func, context, tally, None)
+
+
+def _run_chunk(task) -> Tuple[List[Any], Counter]:
+    """Validate one chunk: task is a (start, stop) range under fork, else the records."""
+    func, context, tally, items = _WORKER
+    chunk = items[task[0]:task[1]] if items is not None else task
+    results = [func(context, item) for item in chunk]
+    counts = Counter()
+    if tally is not None:
+        for result in results:
+            counts.update(tally(result))
+    return results, counts
+
+
+class BatchRunner:
+    """
+    Maps func(context, item) over a dataset in chunks on a process pool.
+
+    func and tally must be module-level functions (picklable). After imap() is
+    exhausted, counts holds the merged tallies and processed the record count.
+    """
+
+    def __init__(self, func: Callable[[Any, Any], Any], context: Any = None,
+                 workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 tally: Optional[Callable[[Any], Iterable]] = None, desc: str = "records"):
+        self.func = func
+        self.context = context
+        self.workers = workers if workers is not None else default_workers()
+        self.chunk_size = max(1, chunk_size)
+        self.tally = tally
+        self.desc = desc
+        self.counts: Counter = Counter()
+        self.processed = 0
+
+    def imap(self, items: Sequence) -> Iterator[Any]:
+        """Yield func(context, item) for every item, in input order."""
+        global _WORKER
+        self.counts = Counter()
+        self.processed = 0
+
+        total = len(items)
+        ranges = [(start, min(start + self.chunk_size, total)) for start in range(0, total, self.chunk_size)]
+        workers = min(self.workers, len(ranges))
+        started = time.monotonic()
+
+        if workers <= 1 or len(ranges) < MIN_PARALLEL_CHUNKS:
+            _WORKER = (self.func, self.context, self.tally, items)
+            try:
+                yield from self._collect(map(_run_chunk, ranges), total, started, verbose=False)
+            finally:
+                _WORKER = None
+            return
+
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        ctx = multiprocessing.get_context(method)
+        logger.info(f"Validating {total:,} {self.desc} on {workers} workers "
+                    f"({len(ranges)} chunks of {self.chunk_size}, {method})")
+
+        if method == "fork":
+            # Workers inherit the context and records; tasks are just index ranges
+            _WORKER = (self.func, self.context, self.tally, items)
+            pool = ctx.Pool(workers)
+            tasks = ranges
+        else:
+            pool = ctx.Pool(workers, initializer=_init_worker, initargs=(self.func, self.context, self.tally))
+            tasks = (items[start:stop] for start, stop in ranges)
+        try:
+            yield from self._collect(pool.imap(_run_chunk, tasks), total, started)
+        finally:
+            pool.terminate()
+            pool.join()
+            _WORKER = None
+
+    def run(self, items: Sequence) -> List[Any]:
+        """Validate every item and return the results as a list."""
+        return list(self.imap(items))
+
+    def _collect(self, chunks: Iterable[Tuple[List[Any], Counter]], total: int, started: float,
+                 verbose: bool = True) -> Iterator[Any]:
+        step = max(total // 10, 1)
+        next_report = step
+        for results, counts in chunks:
+            self.counts.update(counts)
+            self.processed += len(results)
+            if verbose and next_report <= self.processed < total:
+                logger.info(f"  {self.processed:,}/{total:,} {self.desc} ({100 * self.processed / total:.0f}%)")
+                next_report = (self.processed // step + 1) * step
+            yield from results
+
+        if verbose:
+            elapsed = time.monotonic() - started
+            logger.info(f"  Validated {total:,} {self.desc} in {elapsed:.1f}s")
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Fuzzy Name Index
+================
+Ranked "did you mean" lookups and near-miss identifier synthesis over Vista
+table and column names.
+
+A NameIndex is built once per name list and combines:
+- a BK-tree over the upper-cased names (Levenshtein distance), for typo-range
+  radius searches without scanning every name
+- a trigram inverted index (names padded as "$NAME$", so names sharing the
+  module prefix share a gram), for ranking names that are not within edit range
+
+suggest() ranks edit-distance hits first (closest first), then trigram matches
+by Dice similarity. near_misses() synthesizes plausible fake names one edit away
+from a real name that do not exist in the index (for hallucination examples).
+
+The table index of a SchemaSnapshot is memoized per process (table_index), so the
+validator, SchemaLoader, DDLExtractor and the generators share it.
+
+Usage:
+    from vgpt2_fuzzy import NameIndex, table_index
+
+    index = table_index(schema)              # schema: vgpt2_schema.SchemaSnapshot
+    index.suggest("APHT")                    # ['APTH', 'APTD', ...]
+    index.suggest_many(["APHT", "JCMJ"])     # {'APHT': [...], 'JCMJ': [...]}
+    index.near_misses("APTH", 3)             # e.g. ['APHT', 'APTTH', 'APT']
+"""
+
+import logging
+import random
+import string
+import weakref
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+NGRAM = 3
+
+# Edit radius of the BK-tree search in suggest()
+DEFAULT_RADIUS = 1
+
+# Trigram matches below this Dice similarity are not suggested (0.25 keeps
+# 4-letter names of the same module, which share only the "$AP" gram)
+MIN_SIMILARITY = 0.25
+
+
+class _Pattern:
+    """
+    A string prepared for bit-parallel edit distance (Myers/Hyyro).
+
+    Each distance() against another string costs a handful of integer
+    operations per character of that string.
+    """
+
+    __slots__ = ("text", "_peq", "_mask", "_last")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._peq: Dict[str, int] = {}
+        for i, char in enumerate(text):
+            self._peq[char] = self._peq.get(char, 0) | (1 << i)
+        self._mask = (1 << len(text)) - 1
+        self._last = 1 << (len(text) - 1) if text else 0
+
+    def distance(self, other: str) -> int:
+        if not self.text:
+            return len(other)
+        peq, mask, last = self._peq, self._mask, self._last
+        pv, mv, score = mask, 0, len(self.text)
+        for char in other:
+            eq = peq.get(char, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mask)
+            mh = pv & xh
+            if ph & last:
+                score += 1
+            elif mh & last:
+                score -= 1
+            ph = ((ph << 1) | 1) & mask
+            mh = (mh << 1) & mask
+            pv = mh | (~(xv | ph) & mask)
+            mv = ph & xv
+        return score
+
+
+def levenshtein(a: str, b: str) -> int:
+    """Edit distance between a and b."""
+    return _Pattern(a).distance(b)
+
+
+def _grams(key: str) -> set:
+    padded = "$" + key + "$"
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+class NameIndex:
+    """
+    Case-insensitive fuzzy index over a list of identifiers.
+
+    Lookups return the original spelling; names that differ only in case share
+    one entry.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        # key (upper case) -> original spellings
+        self._names: Dict[str, List[str]] = {}
+        for name in names:
+            self._names.setdefault(name.upper(), []).append(name)
+        self._keys: List[str] = sorted(self._names)
+
+        # Trigram postings: gram -> key ids
+        self._postings: Dict[str, List[int]] = {}
+        self._gram_counts: List[int] = []
+        for kid, key in enumerate(self._keys):
+            grams = _grams(key)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(kid)
+
+        # BK-tree: node = key id, children[node] = {distance: child node}
+        self._children: List[Dict[int, int]] = [{} for _ in self._keys]
+        for kid in range(1, len(self._keys)):
+            self._bk_insert(kid)
+
+        # Memoized suggestions for batch lookups
+        self._memo: Dict[Tuple[str, int, Optional[int]], List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, name: str) -> bool:
+        return name.upper() in self._names
+
+    def _bk_insert(self, kid: int) -> None:
+        pattern = _Pattern(self._keys[kid])
+        node = 0
+        while True:
+            distance = pattern.distance(self._keys[node])
+            child = self._children[node].get(distance)
+            if child is None:
+                self._children[node][distance] = kid
+                return
+            node = child
+
+    def within(self, name: str, max_distance: int) -> List[Tuple[int, str]]:
+        """Return (distance, key) of every name within max_distance edits, closest first."""
+        if not self._keys:
+            return []
+        pattern = _Pattern(name.upper())
+        hits = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            distance = pattern.distance(self._keys[node])
+            if distance <= max_distance:
+                hits.append((distance, self._keys[node]))
+            # Triangle inequality: only subtrees at |d - distance| <= max_distance can match
+            for edge, child in self._children[node].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return sorted(hits)
+
+    def _similar(self, key: str) -> List[Tuple[float, str]]:
+        """Return (Dice similarity, key) of names sharing trigrams with key."""
+        grams = _grams(key)
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self._postings.get(gram, ()))
+        return [
+            (2 * count / (len(grams) + self._gram_counts[kid]), self._keys[kid])
+            for kid, count in overlap.items()
+        ]
+
+    def suggest(self, name: str, k: int = 5, max_distance: Optional[int] = None) -> List[str]:
+        """
+        Return up to k existing names similar to name, best first.
+
+        Names within max_distance edits come first, ordered by distance (an
+        adjacent swap such as APHT/APTH counts as one edit and, as the most common
+        typo, ranks first among them); then trigram matches by similarity. Longer names rarely have neighbours within one edit but
+        share most trigrams, so the default radius stays at 1 (wider radii visit
+        most of the BK-tree over short Vista names).
+        """
+        memo_key = (name.upper(), k, max_distance)
+        if memo_key in self._memo:
+            return list(self._memo[memo_key])
+
+        key = memo_key[0]
+        radius = DEFAULT_RADIUS if max_distance is None else max_distance
+        # candidate -> (edits, 0 for an adjacent swap else 1, -similarity)
+        ranked: Dict[str, Tuple[int, int, float]] = {}
+        for similarity, candidate in self._similar(key):
+            if similarity >= MIN_SIMILARITY:
+                ranked[candidate] = (radius + 1, 1, -similarity)
+        for distance, candidate in self.within(key, radius):
+            ranked[candidate] = (distance, 1, ranked.get(candidate, (0, 0, 0.0))[2])
+        for i in range(len(key) - 1):
+            swapped = key[:i] + key[i + 1] + key[i] + key[i + 2:]
+            if swapped != key and swapped in self._names:
+                ranked[swapped] = (1, 0, ranked.get(swapped, (0, 0, 0.0))[2])
+
+        suggestions = []
+        for candidate in sorted(ranked, key=lambda c: (ranked[c], c)):
+            suggestions.extend(self._names[candidate])
+            if len(suggestions) >= k:
+                break
+        self._memo[memo_key] = suggestions[:k]
+        return list(self._memo[memo_key])
+
+    def suggest_many(self, names: Iterable[str], k: int = 5,
+                     max_distance: Optional[int] = None) -> Dict[str, List[str]]:
+        """Batch suggest(); repeated names are looked up once."""
+        return {name: self.suggest(name, k, max_distance) for name in dict.fromkeys(names)}
+
+    def near_misses(self, name: str, count: int = 3, rng: Optional[random.Random] = None,
+                    keep_prefix: int = 2) -> List[str]:
+        """
+        Synthesize up to count fake names one edit away from name.
+
+        Edits (drop, swap, double or replace a character) keep the first
+        keep_prefix characters, so the module prefix stays realistic, and keep
+        the case of the replaced character. Names already in the index are skipped.
+        rng defaults to the global random state (so random.seed() applies).
+        """
+        rng = rng or random
+        head, tail = name[:keep_prefix], name[keep_prefix:]
+        candidates = set()
+        for i, char in enumerate(tail):
+            candidates.add(tail[:i] + tail[i + 1:])                      # drop
+            candidates.add(tail[:i] + char + tail[i:])                   # double
+            if i + 1 < len(tail) and tail[i + 1] != char:
+                candidates.add(tail[:i] + tail[i + 1] + char + tail[i + 2:])  # swap
+            if char.isalpha():
+                letters = string.ascii_lowercase if char.islower() else string.ascii_uppercase
+                replacement = rng.choice([c for c in letters if c != char])
+                candidates.add(tail[:i] + replacement + tail[i + 1:])    # replace
+
+        fakes = sorted(head + candidate for candidate in candidates if len(head + candidate) > 1)
+        fakes = [fake for fake in fakes if fake not in self]
+        rng.shuffle(fakes)
+        return fakes[:count]
+
+
+# =============================================================================
+# Shared indexes over a schema snapshot
+# =============================================================================
+
+# snapshot -> {kind: NameIndex}; dropped with the snapshot when it is recompiled
+_INDEXES: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _cached(schema, kind: str, names: Callable[[], Iterable[str]]) -> NameIndex:
+    indexes = _INDEXES.setdefault(schema, {})
+    if kind not in indexes:
+        indexes[kind] = NameIndex(names())
+        logger.info(f"Built fuzzy {kind} index over {len(indexes[kind]):,} names")
+    return indexes[kind]
+
+
+def table_index(schema) -> NameIndex:
+    """Fuzzy index over every table/view name of a SchemaSnapshot."""
+    return _cached(schema, "table", schema.table_names)
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Foreign Key Join Graph
+======================
+Join-path search over the foreign keys of a Vista schema snapshot.
+
+The graph is an adjacency index (table -> neighbour -> foreign keys) built once
+from the snapshot's CSR adjacency list. On top of it:
+- join_steps() answers "how do these two tables join" with one dict lookup
+- shortest_path() finds the path with the fewest joins (BFS)
+- best_path() finds the cheapest path when every table a path passes through
+  costs log2 of its degree (Dijkstra), so paths avoid hub tables such as HQCO
+  that are joined to hundreds of tables by company only
+- paths_from() / module_paths() enumerate every simple path of up to k joins,
+  without walking through hub tables
+
+Search trees are memoized per source table (LRU), so asking for many paths from
+the same table runs one search. The graph of a SchemaSnapshot is shared per
+process (schema_graph), like the fuzzy table index.
+
+Usage:
+    from vgpt2_graph import schema_graph
+
+    graph = schema_graph(schema)                 # schema: vgpt2_schema.SchemaSnapshot
+    graph.join_step("APTL", "APTH").condition()  # 'APTL.APCo = APTH.APCo AND APTL.Mth = APTH.Mth'
+    path = graph.best_path("APTD", "APTL")       # (JoinStep(APTD -> APTH), JoinStep(APTH -> APTL))
+    print(from_clause(path))                     # FROM APTD WITH (NOLOCK) INNER JOIN APTH ...
+    for path in graph.module_paths("AP", max_hops=2, cross_module=True):
+        ...
+
+    python vgpt2_graph.py --vgpt2 C:/Github/VGPT2 APTD APTL
+"""
+
+import heapq
+import logging
+import math
+import weakref
+from collections import OrderedDict
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_HOPS = 3
+
+# Tables joined to more tables than this are hubs: paths_from() does not walk through them
+HUB_DEGREE = 40
+
+# Search trees kept per graph (one per source table and search kind)
+TREE_CACHE_SIZE = 512
+
+
+class JoinStep(NamedTuple):
+    """One join along a foreign key, oriented from left_table to right_table."""
+    left_table: str
+    right_table: str
+    left_columns: Tuple[str, ...]
+    right_columns: Tuple[str, ...]
+    constraint_name: str
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        """(left column, right column) pairs."""
+        return list(zip(self.left_columns, self.right_columns))
+
+    def condition(self) -> str:
+        """The ON condition equating every column of the foreign key."""
+        return " AND ".join(
+            f"{self.left_table}.{left} = {self.right_table}.{right}" for left, right in self.pairs()
+        )
+
+    def reversed(self) -> "JoinStep":
+        return JoinStep(self.right_table, self.left_table, self.right_columns, self.left_columns,
+                        self.constraint_name)
+
+
+JoinPath = Tuple[JoinStep, ...]
+
+
+def path_tables(path: JoinPath) -> List[str]:
+    """Tables along a path, in join order."""
+    return [path[0].left_table] + [step.right_table for step in path] if path else []
+
+
+def from_clause(path: JoinPath, hint: str = " WITH (NOLOCK)", join: str = "INNER JOIN") -> str:
+    """FROM ... JOIN ... ON ... lines joining every table of a path."""
+    if not path:
+        return ""
+    lines = [f"FROM {path[0].left_table}{hint}"]
+    for step in path:
+        lines.append(f"{join} {step.right_table}{hint} ON {step.condition()}")
+    return "\n".join(lines)
+
+
+def table_module(table_name: str) -> str:
+    """Module prefix of a Vista table name (bAPTH, vAPTH and APTH are all 'AP')."""
+    name = table_name
+    if name[:1] in ("b", "v") and len(name) > 2 and name[1].isupper():
+        name = name[1:]
+    return name[:2].upper()
+
+
+class JoinGraph:
+    """
+    Adjacency index over the foreign keys of a SchemaSnapshot.
+
+    Nodes are snapshot table ids (every table on either side of a foreign key);
+    self-references are not edges. Between two tables joined by several foreign
+    keys, paths use the one with the most columns.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        # node -> {neighbour: [foreign key ids]}
+        self._adj: List[Dict[int, List[int]]] = [{} for _ in range(schema.num_nodes())]
+        for tid, neighbours in enumerate(self._adj):
+            for fid, other in schema.fk_edges(tid):
+                if other != tid:
+                    neighbours.setdefault(other, []).append(fid)
+
+        self._steps: Dict[Tuple[int, int], List[JoinStep]] = {}
+        self._trees: "OrderedDict[tuple, Dict[int, int]]" = OrderedDict()
+
+    def __contains__(self, table_name: str) -> bool:
+        return self.schema.node_id(table_name) is not None
+
+    @property
+    def num_edges(self) -> int:
+        return sum(len(neighbours) for neighbours in self._adj) // 2
+
+    def degree(self, table_name: str) -> int:
+        """Number of tables joined to a table by a foreign key."""
+        tid = self.schema.node_id(table_name)
+        return 0 if tid is None else len(self._adj[tid])
+
+    def neighbors(self, table_name: str) -> List[str]:
+        tid = self.schema.node_id(table_name)
+        if tid is None:
+            return []
+        return [self.schema.node_name(other) for other in self._adj[tid]]
+
+    # -- direct joins -----------------------------------------------------
+
+    def _steps_between(self, u: int, v: int) -> List[JoinStep]:
+        """Join steps u -> v, one per foreign key, most columns first."""
+        key = (u, v)
+        if key not in self._steps:
+            left = self.schema.node_name(u)
+            steps = []
+            for fid in self._adj[u].get(v, ()):
+                fk = self.schema.foreign_key(fid)
+                if fk.parent_table == left:
+                    steps.append(JoinStep(fk.parent_table, fk.referenced_table, fk.parent_columns,
+                                          fk.referenced_columns, fk.constraint_name))
+                else:
+                    steps.append(JoinStep(fk.referenced_table, fk.parent_table, fk.referenced_columns,
+                                          fk.parent_columns, fk.constraint_name))
+            steps.sort(key=lambda step: -len(step.left_columns))
+            self._steps[key] = steps
+        return self._steps[key]
+
+    def join_steps(self, table1: str, table2: str) -> List[JoinStep]:
+        """Every foreign key joining table1 to table2 (oriented table1 -> table2), most columns first."""
+        u, v = self.schema.node_id(table1), self.schema.node_id(table2)
+        if u is None or v is None or u == v:
+            return []
+        return list(self._steps_between(u, v))
+
+    def join_step(self, table1: str, table2: str) -> Optional[JoinStep]:
+        """The foreign key join from table1 to table2 with the most columns, or None."""
+        steps = self.join_steps(table1, table2)
+        return steps[0] if steps else None
+
+    # -- path search ------------------------------------------------------
+
+    def _cached_tree(self, key: tuple) -> Optional[Dict[int, int]]:
+        tree = self._trees.get(key)
+        if tree is not None:
+            self._trees.move_to_end(key)
+        return tree
+
+    def _store_tree(self, key: tuple, tree: Dict[int, int]) -> Dict[int, int]:
+        self._trees[key] = tree
+        if len(self._trees) > TREE_CACHE_SIZE:
+            self._trees.popitem(last=False)
+        return tree
+
+    def _bfs_tree(self, source: int, max_hops: int) -> Dict[int, int]:
+        """node -> predecessor on a fewest-joins path from source (source maps to itself)."""
+        key = ("bfs", source, max_hops)
+        tree = self._cached_tree(key)
+        if tree is not None:
+            return tree
+
+        tree = {source: source}
+        frontier = [source]
+        for _ in range(max_hops):
+            following = []
+            for u in frontier:
+                for v in self._adj[u]:
+                    if v not in tree:
+                        tree[v] = u
+                        following.append(v)
+            if not following:
+                break
+            frontier = following
+        return self._store_tree(key, tree)
+
+    def _weighted_tree(self, source: int) -> Dict[int, int]:
+        """node -> predecessor on a cheapest path from source, passing through a table costing log2(degree)."""
+        key = ("dijkstra", source)
+        tree = self._cached_tree(key)
+        if tree is not None:
+            return tree
+
+        tree = {source: source}
+        cost = {source: 0.0}
+        done = set()
+        heap = [(0.0, source)]
+        while heap:
+            distance, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            weight = 1.0 + (math.log2(len(self._adj[u])) if u != source else 0.0)
+            for v in self._adj[u]:
+                candidate = distance + weight
+                if v not in done and candidate < cost.get(v, math.inf):
+                    cost[v] = candidate
+                    tree[v] = u
+                    heapq.heappush(heap, (candidate, v))
+        return self._store_tree(key, tree)
+
+    def _path(self, tree: Dict[int, int], target: int) -> Optional[JoinPath]:
+        if target not in tree:
+            return None
+        nodes = [target]
+        while tree[nodes[-1]] != nodes[-1]:
+            nodes.append(tree[nodes[-1]])
+        nodes.reverse()
+        return tuple(self._steps_between(u, v)[0] for u, v in zip(nodes, nodes[1:]))
+
+    def shortest_path(self, table1: str, table2: str, max_hops: int = DEFAULT_MAX_HOPS) -> Optional[JoinPath]:
+        """
+        A path with the fewest joins from table1 to table2, or None if none has at most max_hops.
+
+        An empty path means table1 and table2 are the same table.
+        """
+        u, v = self.schema.node_id(table1), self.schema.node_id(table2)
+        if u is None or v is None:
+            return None
+        return self._path(self._bfs_tree(u, max_hops), v)
+
+    def best_path(self, table1: str, table2: str, max_hops: int = DEFAULT_MAX_HOPS) -> Optional[JoinPath]:
+        """
+        The cheapest path from table1 to table2 when passing through hub tables costs more.
+
+        Returns None when the cheapest path has more than max_hops joins (a
+        longer but cheaper path is preferred over a short one through a hub).
+        """
+        u, v = self.schema.node_id(table1), self.schema.node_id(table2)
+        if u is None or v is None:
+            return None
+        path = self._path(self._weighted_tree(u), v)
+        return path if path is not None and len(path) <= max_hops else None
+
+    # -- enumeration ------------------------------------------------------
+
+    def paths_from(self, table_name: str, max_hops: int = 2, through_hubs: bool = False) -> Iterator[JoinPath]:
+        """
+        Yield every simple path of 1..max_hops joins starting at a table.
+
+        Paths may end at a hub table but only pass through one when through_hubs
+        is set (a hub joins almost anything to anything by company alone).
+        """
+        source = self.schema.node_id(table_name)
+        if source is None:
+            return
+
+        def extend(node: int, path: JoinPath, visited: set) -> Iterator[JoinPath]:
+            for v in self._adj[node]:
+                if v in visited:
+                    continue
+                longer = path + (self._steps_between(node, v)[0],)
+                yield longer
+                if len(longer) < max_hops and (through_hubs or len(self._adj[v]) <= HUB_DEGREE):
+                    visited.add(v)
+                    yield from extend(v, longer, visited)
+                    visited.remove(v)
+
+        yield from extend(source, (), {source})
+
+    def module_paths(self, module: str, max_hops: int = 2, cross_module: bool = False,
+                     through_hubs: bool = False) -> Iterator[JoinPath]:
+        """
+        Yield every path of up to max_hops joins starting at a table of a module.
+
+        With cross_module, only paths ending in another module are yielded.
+        """
+        module = module.upper()
+        for tid in range(len(self._adj)):
+            name = self.schema.node_name(tid)
+            if table_module(name) != module:
+                continue
+            for path in self.paths_from(name, max_hops, through_hubs):
+                if not cross_module or table_module(path[-1].right_table) != module:
+                    yield path
+
+
+# =============================================================================
+# Shared graph per schema snapshot
+# =============================================================================
+
+# snapshot -> JoinGraph; dropped with the snapshot when it is recompiled
+_GRAPHS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def schema_graph(schema) -> JoinGraph:
+    """Join graph over the foreign keys of a SchemaSnapshot (built once per process)."""
+    graph = _GRAPHS.get(schema)
+    if graph is None:
+        graph = _GRAPHS[schema] = JoinGraph(schema)
+        logger.info(f"Built join graph over {schema.num_nodes():,} tables, {graph.num_edges:,} joins")
+    return graph
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    from vgpt2_schema import load_vgpt2_schema
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Find join paths between Vista tables")
+    parser.add_argument('tables', nargs='*', help='Two tables to join, or one table to list paths from')
+    parser.add_argument('--vgpt2', type=str, default='C:/Github/VGPT2', help='Path to VGPT2 repository')
+    parser.add_argument('--max-hops', type=int, default=DEFAULT_MAX_HOPS, help='Maximum joins per path')
+    parser.add_argument('--module', type=str, default=None, help='Count the cross-module paths of a module')
+    args = parser.parse_args()
+
+    schema = load_vgpt2_schema(args.vgpt2)
+    if schema is None:
+        raise SystemExit(1)
+    graph = schema_graph(schema)
+
+    if len(args.tables) == 2:
+        path = graph.best_path(args.tables[0], args.tables[1], args.max_hops)
+        print(from_clause(path) if path else f"No join path within {args.max_hops} joins")
+    elif len(args.tables) == 1:
+        for path in graph.paths_from(args.tables[0], args.max_hops):
+            print(" -> ".join(path_tables(path)))
+    if args.module:
+        paths = sum(1 for _ in graph.module_paths(args.module, args.max_hops, cross_module=True))
+        print(f"{args.module}: {paths:,} cross-module paths of up to {args.max_hops} joins")
@@ -0,0 +1,789 @@
+#!/usr/bin/env python3
+"""
+Compiled Vista Schema Snapshot
+==============================
+Compiles the Viewpoint Vista metadata (columns.json / foreign_keys.json) once
+into a compact binary snapshot and memory-maps it on every later run.
+
+The snapshot stores:
+- one interned string table (every table, column, type and constraint name once)
+- array-backed column tables, grouped by table (CSR offsets per table)
+- the foreign keys with a CSR adjacency list over the tables
+
+The snapshot is rebuilt when a source file changes (size/mtime, confirmed by sha256).
+Every compile writes a new file and a small pointer file names the current one, so a
+snapshot that is still memory-mapped (by this or another process) is never overwritten.
+Every VGPT2 loader (SchemaLoader, DDLExtractor, the validators and generators) reads
+the schema through this module, so a process parses the JSON at most once.
+
+Usage:
+    from vgpt2_schema import load_vgpt2_schema
+
+    schema = load_vgpt2_schema("C:/Github/VGPT2")
+    schema.has_table("APTH")             # True
+    schema.column_names("APTH")          # ['APCo', 'Mth', ...]
+    schema.foreign_keys("APTD")          # [ForeignKeyRecord(...), ...]
+
+    python vgpt2_schema.py --vgpt2 C:/Github/VGPT2 --stats
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import uuid
+import weakref
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VGSS"
+VERSION = 2  # 2: one foreign key per constraint in the ParentColumn layout
+NULL = -(2**31)  # missing integer / string id
+_PREAMBLE = struct.Struct("<4sII")  # magic, version, header length
+
+# Candidate locations of the metadata files inside a VGPT2 checkout, in priority order
+COLUMNS_CANDIDATES = [
+    ("Viewpoint_Database", "_MetadataV2", "_data", "columns.json"),
+    ("Viewpoint_Database", "_Metadata", "columns.json"),
+    ("structured_docs", "schema", "columns.json"),
+]
+FOREIGN_KEYS_CANDIDATES = [
+    ("Viewpoint_Database", "_MetadataV2", "_data", "foreign_keys.json"),
+    ("Viewpoint_Database", "_Metadata", "foreign_keys.json"),
+    ("structured_docs", "schema", "foreign_keys.json"),
+]
+
+
+class ColumnRecord(NamedTuple):
+    """One column of a table, decoded from the snapshot on demand."""
+    name: str
+    data_type: str
+    is_nullable: Optional[bool]
+    ordinal_position: Optional[int]
+    max_length: Optional[int]
+    precision: Optional[int]
+    scale: Optional[int]
+    default_value: Optional[str]
+
+
+class ForeignKeyRecord(NamedTuple):
+    """One foreign key row (ParentTable -> ReferencedTable/ChildTable)."""
+    parent_table: str
+    parent_columns: Tuple[str, ...]
+    referenced_table: str
+    referenced_columns: Tuple[str, ...]
+    constraint_name: str
+
+
+# =============================================================================
+# Compilation
+# =============================================================================
+
+def _to_int(value) -> int:
+    """Parse an optional integer field, returning NULL for missing/invalid values."""
+    if isinstance(value, bool) or value is None:
+        return NULL
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, str):
+        value = value.strip()
+        if value.lstrip("-").isdigit():
+            return int(value)
+    return NULL
+
+
+def _to_nullable(value) -> int:
+    if value is None:
+        return -1
+    return 1 if value in ("True", "true", True, "YES", "1", 1) else 0
+
+
+def _as_list(value) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def _iter_column_rows(data) -> Iterator[dict]:
+    """Normalize both columns.json layouts into flat ObjectName/ColumnName rows."""
+    if isinstance(data, dict):  # {table: [{column_name, data_type, is_nullable}, ...]}
+        for table_name, columns in data.items():
+            for col in columns or []:
+                if isinstance(col, dict):
+                    yield {
+                        "ObjectName": table_name,
+                        "ColumnName": col.get("column_name", col.get("ColumnName", "")),
+                        "DataType": col.get("data_type", col.get("DataType", "")),
+                        "IsNullable": col.get("is_nullable", col.get("IsNullable")),
+                    }
+    else:
+        for col in data or []:
+            if isinstance(col, dict):
+                yield col
+
+
+def _iter_fk_rows(data) -> Iterator[Tuple[str, List[str], str, List[str], str]]:
+    """Normalize the foreign_keys.json layouts into (parent, parent_cols, referenced, referenced_cols, name)."""
+    if isinstance(data, dict):  # {table: [{referenced_table, fk_columns, referenced_columns}, ...]}
+        for table_name, relations in data.items():
+            for rel in relations or []:
+                if isinstance(rel, dict):
+                    yield (
+                        table_name,
+                        _as_list(rel.get("fk_columns")),
+                        rel.get("referenced_table", ""),
+                        _as_list(rel.get("referenced_columns")),
+                        rel.get("constraint_name", ""),
+                    )
+    else:
+        for fk in data or []:
+            if not isinstance(fk, dict):
+                continue
+            yield (
+                fk.get("ParentTable", fk.get("parent_table", "")),
+                _as_list(fk.get("ParentColumns", fk.get("parent_columns", fk.get("ParentColumn")))),
+                fk.get("ReferencedTable", fk.get("ChildTable", fk.get("child_table", ""))),
+                _as_list(fk.get("ReferencedColumns", fk.get("ChildColumns", fk.get("child_columns", fk.get("ReferencedColumn"))))),
+                fk.get("ConstraintName", fk.get("constraint_name", "")),
+            )
+
+
+def _group_fk_rows(rows) -> List[Tuple[str, List[str], str, List[str], str]]:
+    """Merge the rows of one constraint (one row per column in the ParentColumn layout) into one foreign key."""
+    foreign_keys = []
+    by_constraint: Dict[Tuple[str, str, str], Tuple[str, List[str], str, List[str], str]] = {}
+    for parent, parent_cols, referenced, referenced_cols, name in rows:
+        fk = by_constraint.get((parent, referenced, name)) if name else None
+        if fk is None:
+            fk = (parent, [], referenced, [], name)
+            foreign_keys.append(fk)
+            if name:
+                by_constraint[(parent, referenced, name)] = fk
+
+        pairs = set(zip(fk[1], fk[3]))
+        for p_col, r_col in zip(parent_cols, referenced_cols):
+            if (p_col, r_col) not in pairs:
+                pairs.add((p_col, r_col))
+                fk[1].append(p_col)
+                fk[3].append(r_col)
+    return foreign_keys
+
+
+class _Interner:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.offsets = array("I", [0])
+        self.data = bytearray()
+
+    def __call__(self, value: Optional[str]) -> int:
+        if value is None:
+            return NULL
+        value = str(value)
+        idx = self.ids.get(value)
+        if idx is None:
+            idx = self.ids[value] = len(self.ids)
+            self.data += value.encode("utf-8")
+            self.offsets.append(len(self.data))
+        return idx
+
+
+def _source_fingerprints(columns_file: Path, fk_file: Optional[Path]) -> dict:
+    return {"columns": _fingerprint(columns_file), "foreign_keys": _fingerprint(fk_file) if fk_file else None}
+
+
+def _fingerprint(path: Path) -> dict:
+    stat = path.stat()
+    return {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": _sha256(path)}
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compile_schema(columns_file: Path, fk_file: Optional[Path], output: Path, sources: Optional[dict] = None) -> None:
+    """
+    Compile the metadata JSON files into a binary snapshot at `output`.
+
+    Args:
+        columns_file: Path to columns.json
+        fk_file: Path to foreign_keys.json (optional)
+        output: Snapshot file to write (replaced atomically, so it must not be memory-mapped)
+        sources: Fingerprints of the source files, if already computed
+    """
+    logger.info(f"Compiling schema snapshot from {columns_file}")
+    strings = _Interner()
+    table_ids: Dict[str, int] = {}
+    table_columns: List[List[tuple]] = []
+    table_meta: List[List[int]] = []  # name, schema, object type, module
+
+    with open(columns_file, "r", encoding="utf-8") as f:
+        columns_data = json.load(f)
+
+    for col in _iter_column_rows(columns_data):
+        table_name = col.get("ObjectName", "")
+        if not table_name:
+            continue
+
+        tid = table_ids.get(table_name)
+        if tid is None:
+            tid = table_ids[table_name] = len(table_meta)
+            table_meta.append([
+                strings(table_name),
+                strings(col.get("SchemaName")),
+                strings(col.get("ObjectType")),
+                strings(col.get("Module")),
+            ])
+            table_columns.append([])
+
+        table_columns[tid].append((
+            strings(col.get("ColumnName", "")),
+            strings(col.get("DataType", "")),
+            _to_nullable(col.get("IsNullable")),
+            _to_int(col.get("OrdinalPosition")),
+            _to_int(col.get("MaxLength")),
+            _to_int(col.get("Precision")),
+            _to_int(col.get("Scale")),
+            strings(col.get("DefaultValue")),
+        ))
+
+    del columns_data
+    num_column_tables = len(table_meta)
+
+    fk_rows = []
+    if fk_file is not None:
+        with open(fk_file, "r", encoding="utf-8") as f:
+            fk_rows = _group_fk_rows(_iter_fk_rows(json.load(f)))
+
+    def get_table_id(name: str) -> int:
+        tid = table_ids.get(name)
+        if tid is None:  # tables that only appear in foreign keys get no columns
+            tid = table_ids[name] = len(table_meta)
+            table_meta.append([strings(name), NULL, NULL, NULL])
+            table_columns.append([])
+        return tid
+
+    sections: Dict[str, array] = {
+        "str_offsets": strings.offsets,
+        "table_name": array("i"), "table_schema": array("i"), "table_type": array("i"), "table_module": array("i"),
+        "table_col_ptr": array("I", [0]),
+        "col_name": array("i"), "col_type": array("i"), "col_nullable": array("b"), "col_ordinal": array("i"),
+        "col_max_length": array("i"), "col_precision": array("i"), "col_scale": array("i"), "col_default": array("i"),
+        "fk_parent": array("i"), "fk_referenced": array("i"), "fk_name": array("i"),
+        "fk_col_ptr": array("I", [0]), "fk_parent_cols": array("i"), "fk_referenced_cols": array("i"),
+        "adj_ptr": array("I", [0]), "adj_fk": array("i"),
+    }
+
+    adjacency: List[List[int]] = []
+    for parent, parent_cols, referenced, referenced_cols, name in fk_rows:
+        if not parent or not referenced:
+            continue
+
+        fid = len(sections["fk_parent"])
+        pid, rid = get_table_id(parent), get_table_id(referenced)
+        sections["fk_parent"].append(pid)
+        sections["fk_referenced"].append(rid)
+        sections["fk_name"].append(strings(name))
+        for p_col, r_col in zip(parent_cols, referenced_cols):
+            sections["fk_parent_cols"].append(strings(p_col))
+            sections["fk_referenced_cols"].append(strings(r_col))
+        sections["fk_col_ptr"].append(len(sections["fk_parent_cols"]))
+        adjacency.extend([] for _ in range(len(table_meta) - len(adjacency)))
+        adjacency[pid].append(fid)
+        if rid != pid:
+            adjacency[rid].append(fid)
+
+    adjacency.extend([] for _ in range(len(table_meta) - len(adjacency)))
+    column_fields = ["col_name", "col_type", "col_nullable", "col_ordinal",
+                     "col_max_length", "col_precision", "col_scale", "col_default"]
+    for meta, columns, fk_ids in zip(table_meta, table_columns, adjacency):
+        for key, value in zip(("table_name", "table_schema", "table_type", "table_module"), meta):
+            sections[key].append(value)
+        for column in columns:
+            for key, value in zip(column_fields, column):
+                sections[key].append(value)
+        sections["table_col_ptr"].append(len(sections["col_name"]))
+        sections["adj_fk"].extend(fk_ids)
+        sections["adj_ptr"].append(len(sections["adj_fk"]))
+
+    layout = {}
+    offset = 0
+    for key, values in sections.items():
+        layout[key] = [offset, values.typecode, len(values)]
+        offset += (len(values) * values.itemsize + 7) // 8 * 8
+    layout["str_data"] = [offset, "B", len(strings.data)]
+
+    header = json.dumps({
+        "sources": sources or _source_fingerprints(columns_file, fk_file),
+        "num_column_tables": num_column_tables,
+        "sections": layout,
+    }).encode("utf-8")
+    header += b" " * (-(_PREAMBLE.size + len(header)) % 8)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=output.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for values in sections.values():
+            data = values.tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % 8))
+        f.write(strings.data)
+    os.replace(tmp_path, output)
+    logger.info(f"Compiled {num_column_tables} tables, {len(sections['col_name'])} columns, "
+                f"{len(sections['fk_parent'])} foreign keys into {output}")
+
+
+# =============================================================================
+# Memory-mapped snapshot
+# =============================================================================
+
+class SchemaSnapshot:
+    """
+    Read-only view over a compiled schema snapshot.
+
+    Strings and records are decoded lazily, so only the tables a caller touches
+    cost any Python objects.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_len = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} schema snapshot")
+
+        self.header = json.loads(bytes(self._mmap[_PREAMBLE.size:_PREAMBLE.size + header_len]))
+        base = _PREAMBLE.size + header_len
+        buffer = memoryview(self._mmap)
+        for key, (offset, typecode, length) in self.header["sections"].items():
+            itemsize = array(typecode).itemsize
+            view = buffer[base + offset:base + offset + length * itemsize]
+            setattr(self, f"_{key}", view.cast(typecode) if typecode != "B" else view)
+
+        self.num_column_tables: int = self.header["num_column_tables"]
+        self._table_ids: Optional[Dict[str, int]] = None
+        self._table_ids_upper: Optional[Dict[str, int]] = None
+        self._column_index: Dict[int, Dict[str, int]] = {}
+        _MAPPED[self.path] = self
+
+    @property
+    def sources(self) -> dict:
+        return self.header["sources"]
+
+    # -- strings ----------------------------------------------------------
+
+    def string(self, sid: int) -> Optional[str]:
+        """Decode an interned string id (None for NULL)."""
+        if sid == NULL:
+            return None
+        return bytes(self._str_data[self._str_offsets[sid]:self._str_offsets[sid + 1]]).decode("utf-8")
+
+    # -- tables -----------------------------------------------------------
+
+    def _ids(self) -> Dict[str, int]:
+        if self._table_ids is None:
+            self._table_ids = {self.string(self._table_name[tid]): tid for tid in range(len(self._table_name))}
+        return self._table_ids
+
+    def table_id(self, table_name: str, case_sensitive: bool = True) -> Optional[int]:
+        """Return the table id of a table with columns, or None."""
+        if case_sensitive:
+            tid = self._ids().get(table_name)
+        else:
+            if self._table_ids_upper is None:
+                self._table_ids_upper = {}
+                for name, idx in self._ids().items():
+                    if idx < self.num_column_tables:
+                        self._table_ids_upper.setdefault(name.upper(), idx)
+            tid = self._table_ids_upper.get(table_name.upper())
+        return tid if tid is not None and tid < self.num_column_tables else None
+
+    def has_table(self, table_name: str, case_sensitive: bool = True) -> bool:
+        return self.table_id(table_name, case_sensitive) is not None
+
+    def table_names(self) -> List[str]:
+        """All tables/views with columns, in source order."""
+        return [self.string(self._table_name[tid]) for tid in range(self.num_column_tables)]
+
+    def table_attributes(self, table_name: str) -> Optional[Dict[str, Optional[str]]]:
+        """Return the raw SchemaName / ObjectType / Module of a table (None where absent)."""
+        tid = self.table_id(table_name)
+        if tid is None:
+            return None
+        return {
+            "schema_name": self.string(self._table_schema[tid]),
+            "object_type": self.string(self._table_type[tid]),
+            "module": self.string(self._table_module[tid]),
+        }
+
+    def num_columns(self, table_name: Optional[str] = None) -> int:
+        if table_name is None:
+            return len(self._col_name)
+        tid = self.table_id(table_name)
+        return 0 if tid is None else self._table_col_ptr[tid + 1] - self._table_col_ptr[tid]
+
+    # -- columns ----------------------------------------------------------
+
+    def column_names(self, table_name: str) -> List[str]:
+        tid = self.table_id(table_name)
+        if tid is None:
+            return []
+        return [self.string(self._col_name[cid]) for cid in range(self._table_col_ptr[tid], self._table_col_ptr[tid + 1])]
+
+    def _column_record(self, cid: int) -> ColumnRecord:
+        nullable = self._col_nullable[cid]
+
+        def opt(value: int) -> Optional[int]:
+            return None if value == NULL else value
+
+        return ColumnRecord(
+            name=self.string(self._col_name[cid]),
+            data_type=self.string(self._col_type[cid]),
+            is_nullable=None if nullable < 0 else bool(nullable),
+            ordinal_position=opt(self._col_ordinal[cid]),
+            max_length=opt(self._col_max_length[cid]),
+            precision=opt(self._col_precision[cid]),
+            scale=opt(self._col_scale[cid]),
+            default_value=self.string(self._col_default[cid]),
+        )
+
+    def columns(self, table_name: str) -> List[ColumnRecord]:
+        tid = self.table_id(table_name)
+        if tid is None:
+            return []
+        return [self._column_record(cid) for cid in range(self._table_col_ptr[tid], self._table_col_ptr[tid + 1])]
+
+    def _column_ids(self, tid: int) -> Dict[str, int]:
+        if tid not in self._column_index:
+            start, end = self._table_col_ptr[tid], self._table_col_ptr[tid + 1]
+            self._column_index[tid] = {self.string(self._col_name[cid]): cid for cid in range(start, end)}
+        return self._column_index[tid]
+
+    def has_column(self, table_name: str, column_name: str) -> bool:
+        """Check a column exists in a table (case-sensitive)."""
+        tid = self.table_id(table_name)
+        return tid is not None and column_name in self._column_ids(tid)
+
+    def column(self, table_name: str, column_name: str) -> Optional[ColumnRecord]:
+        tid = self.table_id(table_name)
+        if tid is None:
+            return None
+        cid = self._column_ids(tid).get(column_name)
+        return None if cid is None else self._column_record(cid)
+
+    # -- foreign keys -----------------------------------------------------
+
+    def num_foreign_keys(self) -> int:
+        return len(self._fk_parent)
+
+    def _fk_record(self, fid: int) -> ForeignKeyRecord:
+        start, end = self._fk_col_ptr[fid], self._fk_col_ptr[fid + 1]
+        return ForeignKeyRecord(
+            parent_table=self.string(self._table_name[self._fk_parent[fid]]),
+            parent_columns=tuple(self.string(self._fk_parent_cols[i]) for i in range(start, end)),
+            referenced_table=self.string(self._table_name[self._fk_referenced[fid]]),
+            referenced_columns=tuple(self.string(self._fk_referenced_cols[i]) for i in range(start, end)),
+            constraint_name=self.string(self._fk_name[fid]) or "",
+        )
+
+    def foreign_keys(self, table_name: str) -> List[ForeignKeyRecord]:
+        """Foreign keys on either side of a table, via the CSR adjacency list."""
+        tid = self._ids().get(table_name)
+        if tid is None:
+            return []
+        return [self._fk_record(self._adj_fk[i]) for i in range(self._adj_ptr[tid], self._adj_ptr[tid + 1])]
+
+    def iter_foreign_keys(self) -> Iterator[ForeignKeyRecord]:
+        for fid in range(len(self._fk_parent)):
+            yield self._fk_record(fid)
+
+    # -- foreign key graph ------------------------------------------------
+    # Node ids cover every table, including tables that only appear in foreign keys.
+
+    def num_nodes(self) -> int:
+        return len(self._table_name)
+
+    def node_id(self, table_name: str) -> Optional[int]:
+        return self._ids().get(table_name)
+
+    def node_name(self, tid: int) -> str:
+        return self.string(self._table_name[tid])
+
+    def foreign_key(self, fid: int) -> ForeignKeyRecord:
+        return self._fk_record(fid)
+
+    def fk_edges(self, tid: int) -> Iterator[Tuple[int, int]]:
+        """Yield (foreign key id, id of the table on the other side) for every foreign key on a table."""
+        for i in range(self._adj_ptr[tid], self._adj_ptr[tid + 1]):
+            fid = self._adj_fk[i]
+            parent = self._fk_parent[fid]
+            yield fid, self._fk_referenced[fid] if parent == tid else parent
+
+    # -- legacy dict views ------------------------------------------------
+
+    def column_dicts(self) -> "TableMap":
+        """table -> [{column_name, data_type, is_nullable}] as built by the old JSON loaders."""
+        def build(table_name: str) -> List[dict]:
+            return [
+                {
+                    "column_name": col.name,
+                    "data_type": col.data_type,
+                    "is_nullable": "False" if col.is_nullable is False else "True",
+                }
+                for col in self.columns(table_name)
+            ]
+
+        return TableMap(self.table_names, build)
+
+    def column_name_sets(self) -> "TableMap":
+        """table -> set of column names."""
+        return TableMap(self.table_names, lambda table_name: set(self.column_names(table_name)))
+
+    def fk_dicts(self) -> "TableMap":
+        """parent table -> [{referenced_table, fk_columns, referenced_columns}]."""
+        def parents() -> List[str]:
+            seen = dict.fromkeys(self.string(self._table_name[tid]) for tid in self._fk_parent)
+            return list(seen)
+
+        def build(table_name: str) -> List[dict]:
+            return [
+                {
+                    "referenced_table": fk.referenced_table,
+                    "fk_columns": list(fk.parent_columns),
+                    "referenced_columns": list(fk.referenced_columns),
+                }
+                for fk in self.foreign_keys(table_name) if fk.parent_table == table_name
+            ]
+
+        return TableMap(parents, build)
+
+    def __reduce__(self):
+        # Pickles as its path: a worker process re-maps the same file instead of copying it
+        return _open_snapshot, (str(self.path),)
+
+    def close(self) -> None:
+        for key in self.header["sections"]:
+            getattr(self, f"_{key}").release()
+        self._mmap.close()
+
+
+class TableMap(Mapping):
+    """Read-only mapping keyed by table name whose values are built (and cached) on first access."""
+
+    def __init__(self, keys: Callable[[], Sequence[str]], build: Callable[[str], object]):
+        self._keys = None
+        self._get_keys = keys
+        self._build = build
+        self._cache: Dict[str, object] = {}
+
+    def _key_set(self) -> Dict[str, None]:
+        if self._keys is None:
+            self._keys = dict.fromkeys(self._get_keys())
+        return self._keys
+
+    def __getitem__(self, table_name: str):
+        if table_name not in self._key_set():
+            raise KeyError(table_name)
+        if table_name not in self._cache:
+            self._cache[table_name] = self._build(table_name)
+        return self._cache[table_name]
+
+    def __contains__(self, table_name) -> bool:
+        return table_name in self._key_set()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._key_set())
+
+    def __len__(self) -> int:
+        return len(self._key_set())
+
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+def _default_cache_dir() -> Path:
+    return Path(os.getenv("VGPT2_SCHEMA_CACHE", Path.home() / ".cache" / "vgpt2_schema"))
+
+
+def _is_current(fingerprint: Optional[dict], path: Optional[Path]) -> bool:
+    """Check a source file against its recorded fingerprint (mtime first, then content hash)."""
+    if fingerprint is None or path is None:
+        return fingerprint is None and path is None
+    if not path.exists() or fingerprint["path"] != str(path):
+        return False
+    stat = path.stat()
+    if stat.st_size != fingerprint["size"]:
+        return False
+    return stat.st_mtime_ns == fingerprint["mtime_ns"] or _sha256(path) == fingerprint["sha256"]
+
+
+def _find_file(root: Path, candidates: List[Tuple[str, ...]]) -> Optional[Path]:
+    for parts in candidates:
+        path = root.joinpath(*parts)
+        if path.exists():
+            return path
+    return None
+
+
+def _snapshot_key(columns_file: Path, fk_file: Optional[Path]) -> str:
+    return hashlib.sha1(f"{columns_file}|{fk_file}".encode("utf-8")).hexdigest()[:16]
+
+
+def _read_pointer(pointer: Path) -> Optional[Path]:
+    """Return the snapshot file a pointer file names, or None."""
+    try:
+        name = pointer.read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    return pointer.parent / name if name else None
+
+
+def _write_pointer(pointer: Path, snapshot_file: Path) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=pointer.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(snapshot_file.name)
+    try:
+        os.replace(tmp_path, pointer)
+    except OSError as e:  # e.g. another process is reading the pointer on Windows
+        os.unlink(tmp_path)
+        logger.warning(f"Could not update the schema snapshot pointer {pointer}: {e}")
+
+
+def _remove_stale_snapshots(cache_dir: Path, key: str, current: Path) -> None:
+    """Delete the older snapshots of the same sources, except those this process still has mapped."""
+    for path in cache_dir.glob(f"schema_{key}_*.bin"):
+        if path != current and path not in _MAPPED:
+            try:
+                path.unlink()
+            except OSError:  # still mapped by another process on Windows, removed by a later compile
+                pass
+
+
+_SNAPSHOTS: Dict[Path, SchemaSnapshot] = {}
+_MAPPED: "weakref.WeakValueDictionary[Path, SchemaSnapshot]" = weakref.WeakValueDictionary()  # every live snapshot
+
+
+def load_schema(
+    columns_file: os.PathLike,
+    fk_file: Optional[os.PathLike] = None,
+    cache_dir: Optional[os.PathLike] = None,
+    force: bool = False,
+) -> SchemaSnapshot:
+    """
+    Return the snapshot of the given metadata files, compiling it if it is missing or stale.
+
+    Snapshots are shared within a process, so every loader reading the same files
+    gets the same memory-mapped object.
+    """
+    columns_file = Path(columns_file).resolve()
+    fk_file = Path(fk_file).resolve() if fk_file is not None and Path(fk_file).exists() else None
+    cache_dir = Path(cache_dir) if cache_dir is not None else _default_cache_dir()
+    key = _snapshot_key(columns_file, fk_file)
+    pointer = cache_dir / f"schema_{key}.current"
+
+    snapshot_file = _read_pointer(pointer)
+    snapshot = _SNAPSHOTS.pop(snapshot_file, None) if snapshot_file is not None else None
+    if snapshot is None and snapshot_file is not None and snapshot_file.exists() and not force:
+        try:
+            snapshot = SchemaSnapshot(snapshot_file)
+        except (ValueError, KeyError, OSError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable schema snapshot {snapshot_file}: {e}")
+
+    if snapshot is not None:
+        sources = snapshot.sources
+        if not force and _is_current(sources["columns"], columns_file) and _is_current(sources["foreign_keys"], fk_file):
+            _SNAPSHOTS[snapshot_file] = snapshot
+            return snapshot
+        # Not closed: other loaders may still hold the stale snapshot, it is unmapped with its last reference
+        del snapshot
+
+    # A new file per compile: replacing a snapshot that is still mapped fails on Windows
+    sources = _source_fingerprints(columns_file, fk_file)
+    digest = hashlib.sha256(
+        "|".join(source["sha256"] if source else "" for source in sources.values()).encode("utf-8")
+    ).hexdigest()
+    snapshot_file = cache_dir / f"schema_{key}_{digest[:16]}_{uuid.uuid4().hex[:8]}.bin"
+    compile_schema(columns_file, fk_file, snapshot_file, sources)
+    _SNAPSHOTS[snapshot_file] = snapshot = SchemaSnapshot(snapshot_file)
+    _write_pointer(pointer, snapshot_file)
+    _remove_stale_snapshots(cache_dir, key, snapshot_file)
+    return snapshot
+
+
+def _open_snapshot(path: str) -> SchemaSnapshot:
+    snapshot_file = Path(path)
+    snapshot = _SNAPSHOTS.get(snapshot_file)
+    if snapshot is None:
+        _SNAPSHOTS[snapshot_file] = snapshot = SchemaSnapshot(snapshot_file)
+    return snapshot
+
+
+def find_schema_files(vgpt2_path: os.PathLike) -> Tuple[Optional[Path], Optional[Path]]:
+    """Locate columns.json and foreign_keys.json inside a VGPT2 checkout."""
+    root = Path(vgpt2_path)
+    return _find_file(root, COLUMNS_CANDIDATES), _find_file(root, FOREIGN_KEYS_CANDIDATES)
+
+
+def load_vgpt2_schema(
+    vgpt2_path: os.PathLike,
+    cache_dir: Optional[os.PathLike] = None,
+    force: bool = False,
+) -> Optional[SchemaSnapshot]:
+    """Return the snapshot of a VGPT2 checkout, or None if it has no columns.json."""
+    columns_file, fk_file = find_schema_files(vgpt2_path)
+    if columns_file is None:
+        logger.warning(f"columns.json not found under {vgpt2_path}")
+        return None
+    return load_schema(columns_file, fk_file, cache_dir, force)
+
+
+def load_metadata_schema(metadata_dir: os.PathLike, cache_dir: Optional[os.PathLike] = None) -> Optional[SchemaSnapshot]:
+    """Return the snapshot of a single metadata directory (columns.json + foreign_keys.json)."""
+    metadata_dir = Path(metadata_dir)
+    columns_file = metadata_dir / "columns.json"
+    if not columns_file.exists():
+        logger.warning(f"columns.json not found at {columns_file}")
+        return None
+    return load_schema(columns_file, metadata_dir / "foreign_keys.json", cache_dir)
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Compile the Vista schema snapshot")
+    parser.add_argument('--vgpt2', type=str, default='C:/Github/VGPT2', help='Path to VGPT2 repository')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Snapshot directory')
+    parser.add_argument('--force', action='store_true', help='Recompile even if the snapshot is current')
+    parser.add_argument('--stats', action='store_true', help='Show snapshot statistics')
+    args = parser.parse_args()
+
+    schema = load_vgpt2_schema(args.vgpt2, args.cache_dir, args.force)
+    if schema is not None and args.stats:
+        print(f"\nSnapshot: {schema.path} ({schema.path.stat().st_size / 1024**2:.1f} MB)")
+        print(f"  tables: {schema.num_column_tables}")
+        print(f"  columns: {schema.num_columns()}")
+        print(f"  foreign_keys: {schema.num_foreign_keys()}")
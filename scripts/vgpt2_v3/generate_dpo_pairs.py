@@ -22,6 +22,10 @@ from typing import List, Dict
 import sys
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from vgpt2_graph import path_tables, schema_graph
+from vgpt2_schema import load_vgpt2_schema
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -57,78 +61,32 @@ class DPOGenerator:
     6+ Dynamic schema-based generation for high volume
     """
 
+    # Two-join paths generated per source table by generate_fk_join_pairs
+    MAX_PATHS_PER_TABLE = 2
+
     def __init__(self, vgpt2_path: str, target_pairs: int = 15000):
         self.vgpt2 = Path(vgpt2_path)
         self.columns_data = {}
         self.fk_data = {}
+        self.join_graph = None
         self.tables = []
         self.target_pairs = target_pairs
         self._load_schema()
 
     def _load_schema(self):
-        """Load schema data from VGPT2 repository."""
-        # Load columns.json - try multiple possible locations
-        columns_paths = [
-            self.vgpt2 / "Viewpoint_Database" / "_MetadataV2" / "_data" / "columns.json",
-            self.vgpt2 / "Viewpoint_Database" / "_Metadata" / "columns.json",
-            self.vgpt2 / "structured_docs" / "schema" / "columns.json",
-        ]
+        """Load schema data from the compiled snapshot of the VGPT2 repository."""
+        schema = load_vgpt2_schema(self.vgpt2)
+        if schema is None:
+            return
 
-        for columns_file in columns_paths:
-            if columns_file.exists():
-                with open(columns_file, 'r', encoding='utf-8') as f:
-                    raw_data = json.load(f)
-
-                # Handle list format (each item has ObjectName and ColumnName)
-                if isinstance(raw_data, list):
-                    # Group by table name
-                    from collections import defaultdict
-                    table_columns = defaultdict(list)
-                    for item in raw_data:
-                        table_name = item.get('ObjectName', '')
-                        if table_name:
-                            table_columns[table_name].append({
-                                'column_name': item.get('ColumnName', ''),
-                                'data_type': item.get('DataType', ''),
-                                'is_nullable': item.get('IsNullable', 'True'),
-                            })
-                    self.columns_data = dict(table_columns)
-                else:
-                    self.columns_data = raw_data
-
-                self.tables = list(self.columns_data.keys())
-                logger.info(f"Loaded {len(self.tables)} tables from {columns_file}")
-                break
-
-        # Load foreign_keys.json - try multiple possible locations
-        fk_paths = [
-            self.vgpt2 / "Viewpoint_Database" / "_Metadata" / "foreign_keys.json",
-            self.vgpt2 / "structured_docs" / "schema" / "foreign_keys.json",
-        ]
+        # Lazy table -> list views, columns/FKs are decoded per table on first access
+        self.columns_data = schema.column_dicts()
+        self.tables = list(self.columns_data.keys())
+        logger.info(f"Loaded {len(self.tables)} tables from {schema.sources['columns']['path']}")
 
-        for fk_file in fk_paths:
-            if fk_file.exists():
-                with open(fk_file, 'r', encoding='utf-8') as f:
-                    raw_fk = json.load(f)
-
-                # Handle list format
-                if isinstance(raw_fk, list):
-                    from collections import defaultdict
-                    fk_by_table = defaultdict(list)
-                    for item in raw_fk:
-                        parent_table = item.get('ParentTable', '')
-                        if parent_table:
-                            fk_by_table[parent_table].append({
-                                'referenced_table': item.get('ReferencedTable', ''),
-                                'fk_columns': [item.get('ParentColumn', '')],
-                                'referenced_columns': [item.get('ReferencedColumn', '')],
-                            })
-                    self.fk_data = dict(fk_by_table)
-                else:
-                    self.fk_data = raw_fk
-
-                logger.info(f"Loaded FK relationships for {len(self.fk_data)} tables from {fk_file}")
-                break
+        self.fk_data = schema.fk_dicts()
+        self.join_graph = schema_graph(schema)
+        logger.info(f"Loaded FK relationships for {len(self.fk_data)} tables")
 
     def generate_all(self) -> List[DPOPair]:
         """Generate all DPO pairs targeting self.target_pairs count."""
@@ -723,7 +681,10 @@ ORDER BY TotalCost DESC
         return pairs
 
     def generate_fk_join_pairs(self) -> List[DPOPair]:
-        """Generate JOIN pairs from ALL foreign key relationships with multiple variations."""
+        """
+        Generate JOIN pairs from ALL foreign key relationships with multiple variations,
+        plus two-join pairs for tables related through an intermediate table.
+        """
         pairs = []
 
         # Use ALL FK relationships
@@ -807,6 +768,55 @@ LEFT JOIN {ref_table} ON {table}.{fk_cols[0]} = {ref_table}.{ref_cols[0]}
 ```"""
                         ))
 
+        pairs.extend(self._generate_fk_path_pairs())
+        return pairs
+
+    def _generate_fk_path_pairs(self) -> List[DPOPair]:
+        """Generate two-join pairs for tables related only through an intermediate table."""
+        pairs = []
+        if self.join_graph is None:
+            return pairs
+
+        for table in self.tables:
+            found = 0
+            for path in self.join_graph.paths_from(table, max_hops=2):
+                if found >= self.MAX_PATHS_PER_TABLE:
+                    break
+                tables = path_tables(path)
+                end_table = tables[-1]
+                # Only paths to tables with columns and no direct foreign key of their own
+                if len(path) != 2 or end_table == table or self.join_graph.join_step(table, end_table):
+                    continue
+                t1_cols = [c.get('column_name', '') for c in self.columns_data.get(table, [])[:2] if c.get('column_name')]
+                t3_cols = [c.get('column_name', '') for c in self.columns_data.get(end_table, [])[:2] if c.get('column_name')]
+                if not t1_cols or not t3_cols:
+                    continue
+                found += 1
+
+                co_col = self._get_company_col(table)
+                middle_table = tables[1]
+                select_clause = ", ".join([f"{table}.{c}" for c in t1_cols] + [f"{end_table}.{c}" for c in t3_cols])
+                joins = "\n".join(
+                    f"INNER JOIN {step.right_table} WITH (NOLOCK)\n  ON {step.condition()}" for step in path
+                )
+                pairs.append(DPOPair(
+                    instruction=f"Join {table} with {end_table}",
+                    input="",
+                    chosen=f"""```sql
+SELECT {select_clause}
+FROM {table} WITH (NOLOCK)
+{joins}
+WHERE {table}.{co_col} = @{co_col}
+```
+
+{table} and {end_table} have no direct foreign key; they are related through {middle_table}.""",
+                    rejected=f"""```sql
+SELECT *
+FROM {table}
+JOIN {end_table} ON {table}.{path[0].left_columns[0]} = {end_table}.{path[-1].right_columns[0]}
+```"""
+                ))
+
         return pairs
 
     def generate_extended_hallucination_pairs(self) -> List[DPOPair]:
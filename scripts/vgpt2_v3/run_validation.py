@@ -29,6 +29,9 @@ from datetime import datetime
 import sys
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from vgpt2_schema import load_vgpt2_schema
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -117,34 +120,13 @@ class SQLValidator:
             self._load_schema(schema_path)
 
     def _load_schema(self, schema_path: str):
-        """Load schema data for validation."""
+        """Load schema data for validation from the compiled schema snapshot."""
         try:
-            columns_paths = [
-                Path(schema_path) / "Viewpoint_Database" / "_MetadataV2" / "_data" / "columns.json",
-                Path(schema_path) / "Viewpoint_Database" / "_Metadata" / "columns.json",
-            ]
-
-            for path in columns_paths:
-                if path.exists():
-                    with open(path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-
-                    if isinstance(data, list):
-                        for item in data:
-                            table = item.get('ObjectName', '')
-                            col = item.get('ColumnName', '')
-                            if table:
-                                self.valid_tables.add(table.upper())
-                                if table not in self.column_map:
-                                    self.column_map[table] = set()
-                                if col:
-                                    self.column_map[table].add(col)
-                    else:
-                        self.valid_tables = set(k.upper() for k in data.keys())
-                        self.column_map = {k: set(c.get('column_name', '') for c in v) for k, v in data.items()}
-
-                    logger.info(f"Loaded schema: {len(self.valid_tables)} tables")
-                    break
+            schema = load_vgpt2_schema(schema_path)
+            if schema is not None:
+                self.valid_tables = set(name.upper() for name in schema.table_names())
+                self.column_map = schema.column_name_sets()
+                logger.info(f"Loaded schema: {len(self.valid_tables)} tables")
         except Exception as e:
             logger.warning(f"Could not load schema for validation: {e}")
 
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Unit tests for the SQL analyzer and the SQL validator.
+
+The validator runs against a small Vista metadata fixture, so the tests need no VGPT2 checkout.
+
+Usage:
+    pytest test_sql_validator.py -v
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils.sql_analyzer import analyze_sql  # noqa: E402
+from utils.sql_validator import SQLValidator  # noqa: E402
+
+
+COLUMNS = {
+    "APTH": ["APCo", "Mth", "APTrans", "VendorGroup", "Vendor", "InvDate", "GrossAmt"],
+    "APVM": ["VendorGroup", "Vendor", "Name"],
+    "APTL": ["APCo", "Mth", "APTrans", "APLine", "GrossAmt"],
+}
+FOREIGN_KEYS = [
+    {
+        "ParentTable": "APTH",
+        "ParentColumns": ["VendorGroup", "Vendor"],
+        "ReferencedTable": "APVM",
+        "ReferencedColumns": ["VendorGroup", "Vendor"],
+        "ConstraintName": "FK_APTH_APVM",
+    },
+    # The per-column layout: one row per column of the constraint
+    *(
+        {
+            "ParentTable": "APTL",
+            "ParentColumn": column,
+            "ReferencedTable": "APTH",
+            "ReferencedColumn": column,
+            "ConstraintName": "FK_APTL_APTH",
+        }
+        for column in ("APCo", "Mth", "APTrans")
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def validator(tmp_path_factory: pytest.TempPathFactory):
+    root = tmp_path_factory.mktemp("vgpt2")
+    metadata_dir = root / "Viewpoint_Database" / "_Metadata"
+    metadata_dir.mkdir(parents=True)
+    columns = [
+        {"ObjectName": table, "ColumnName": column, "DataType": "int", "IsNullable": "False"}
+        for table, names in COLUMNS.items()
+        for column in names
+    ]
+    (metadata_dir / "columns.json").write_text(json.dumps(columns), encoding="utf-8")
+    (metadata_dir / "foreign_keys.json").write_text(json.dumps(FOREIGN_KEYS), encoding="utf-8")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("VGPT2_SCHEMA_CACHE", str(root / "cache"))
+        validator = SQLValidator(str(root))
+        validator.schema.table_exists("APTH")  # load the snapshot within the cache dir
+        yield validator
+
+
+def _codes(validator: SQLValidator, sql: str) -> list[str]:
+    result = validator.validate(sql)
+    return [issue.code for issue in result.errors + result.warnings]
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT CONVERT(varchar, InvDate, 101) FROM APTH",
+        "SELECT CONVERT(varchar(10), InvDate, 101) FROM APTH",
+        "SELECT TRY_CONVERT(date, InvDate) FROM APTH",
+        "SELECT CAST(InvDate AS date) FROM APTH",
+        "SELECT TRY_CAST(InvDate AS datetime2(0)) FROM APTH",
+        "SELECT DATEADD(month, 1, InvDate) FROM APTH",
+    ],
+)
+def test_type_arguments(sql: str):
+    assert [column.name for column in analyze_sql(sql).columns] == ["InvDate"]
+
+
+@pytest.mark.parametrize(
+    "sql, aliases, columns",
+    [
+        ("SELECT Total = SUM(GrossAmt) FROM APTH", {"Total"}, ["GrossAmt"]),
+        ("SELECT APCo, [Invoice Count] = COUNT(APTrans) FROM APTH", {"Invoice Count"}, ["APCo", "APTrans"]),
+        ("SELECT DISTINCT Company = APCo FROM APTH", {"Company"}, ["APCo"]),
+        ("SELECT TOP 10 Amount = GrossAmt FROM APTH", {"Amount"}, ["GrossAmt"]),
+        ("SELECT TOP (10) Amount = GrossAmt FROM APTH", {"Amount"}, ["GrossAmt"]),
+        ("SELECT Total = SUM(GrossAmt) FROM APTH WHERE APCo = 1", {"Total"}, ["GrossAmt", "APCo"]),
+    ],
+)
+def test_equals_aliases(sql: str, aliases: set[str], columns: list[str]):
+    analysis = analyze_sql(sql)
+    assert analysis.column_aliases == aliases
+    assert [column.name for column in analysis.columns] == columns
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT CONVERT(varchar, InvDate, 101) FROM APTH WITH (NOLOCK) WHERE APCo = @APCo",
+        "SELECT TRY_CONVERT(date, InvDate) FROM APTH WITH (NOLOCK) WHERE APCo = @APCo",
+        "SELECT Total = SUM(GrossAmt) FROM APTH WITH (NOLOCK) WHERE APCo = @APCo ORDER BY Total",
+        "SELECT Name FROM APVM WITH (NOLOCK) WHERE VendorGroup = @VendorGroup",
+        "SELECT APCo, CURRENT_TIMESTAMP AS Now FROM APTH WITH (NOLOCK) WHERE APCo = @APCo",
+        "SELECT APCo, CURRENT_USER, SESSION_USER, SYSTEM_USER, USER FROM APTH WITH (NOLOCK) WHERE APCo = @APCo",
+        "SELECT Vendor, SUM(GrossAmt) OVER (PARTITION BY Vendor ORDER BY Mth "
+        "ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS RunningAmt FROM APTH WITH (NOLOCK) WHERE APCo = @APCo",
+        "SELECT Vendor, AVG(GrossAmt) OVER (PARTITION BY Vendor ORDER BY Mth "
+        "ROWS BETWEEN 2 PRECEDING AND 1 FOLLOWING) AS AvgAmt FROM APTH WITH (NOLOCK) WHERE APCo = @APCo",
+        "SELECT Vendor, MAX(GrossAmt) OVER (ORDER BY Mth RANGE BETWEEN CURRENT ROW AND UNBOUNDED FOLLOWING) "
+        "AS MaxAmt FROM APTH WITH (NOLOCK) WHERE APCo = @APCo",
+    ],
+)
+def test_validator_accepts(validator: SQLValidator, sql: str):
+    assert _codes(validator, sql) == []
+
+
+def test_validator_rejects(validator: SQLValidator):
+    assert _codes(validator, "SELECT CONVERT(varchar, InvDt, 101) FROM APTH WITH (NOLOCK) WHERE APCo = 1") == [
+        "COLUMN_NOT_FOUND"
+    ]
+    assert _codes(validator, "SELECT Total = SUM(GrossAmt) FROM APTH WITH (NOLOCK)") == ["MISSING_COMPANY_FILTER"]
+    assert _codes(validator, "SELECT Name FROM APVM WITH (NOLOCK)") == []  # keyed by VendorGroup, not APCo
+
+
+def test_incomplete_join(validator: SQLValidator):
+    sql = (
+        "SELECT APTL.APLine FROM APTH WITH (NOLOCK) "
+        "INNER JOIN APTL WITH (NOLOCK) ON APTH.APCo = APTL.APCo "
+        "WHERE APTH.APCo = @APCo"
+    )
+    result = validator.validate(sql)
+    assert [issue.code for issue in result.warnings] == ["INCOMPLETE_JOIN"]
+    assert result.warnings[0].message == (
+        "Join between 'APTH' and 'APTL' matches 1 of 3 columns of foreign key FK_APTL_APTH. "
+        "Also match: APTH.Mth = APTL.Mth AND APTH.APTrans = APTL.APTrans"
+    )
+    assert not result.is_valid  # strict
+
+    complete = sql.replace(
+        "APTH.APCo = APTL.APCo", "APTL.APCo = APTH.APCo AND APTL.Mth = APTH.Mth AND APTL.APTrans = APTH.APTrans"
+    )
+    assert _codes(validator, complete) == []
@@ -3,6 +3,7 @@
 # Shared utilities for data generation and validation
 
 from .schema_loader import SchemaLoader
+from .sql_analyzer import SQLAnalysis, analyze_sql
 from .sql_validator import SQLValidator
 
-__all__ = ['SchemaLoader', 'SQLValidator']
+__all__ = ['SchemaLoader', 'SQLAnalysis', 'SQLValidator', 'analyze_sql']
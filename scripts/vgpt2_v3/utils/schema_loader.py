@@ -7,7 +7,7 @@ Loads and indexes Viewpoint Vista schema data for fast lookups.
 This module provides:
 - Column name validation
 - Table/view existence checks
-- Foreign key relationship lookups
+- Foreign key relationship lookups and multi-hop join paths
 - Module-to-company column mapping
 
 Usage:
@@ -25,14 +25,25 @@ Usage:
     # Validate a column name
     schema.column_exists("APTH", "APCo")  # True
     schema.column_exists("APTH", "apco")  # False (case-sensitive!)
+
+    # Join two tables, directly or through intermediate tables
+    schema.find_join_columns("APTL", "APTH")  # [('APCo', 'APCo'), ('Mth', 'Mth'), ...]
+    schema.find_join_path("APTD", "APTL")     # [JoinStep(APTD -> APTH), JoinStep(APTH -> APTL)]
 """
 
 import json
 import logging
+import sys
 from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass, field
 
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from vgpt2_fuzzy import NameIndex, table_index
+from vgpt2_graph import DEFAULT_MAX_HOPS, JoinGraph, JoinStep, schema_graph
+from vgpt2_schema import SchemaSnapshot, load_metadata_schema
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -120,12 +131,11 @@ class SchemaLoader:
         self.vgpt2 = Path(vgpt2_path)
         self.metadata_dir = self.vgpt2 / "Viewpoint_Database" / "_Metadata"
 
-        # Indexes (populated on first access)
+        # Compiled schema snapshot and per-table objects (populated on first access)
+        self._schema: Optional[SchemaSnapshot] = None
         self._tables: Dict[str, TableInfo] = {}
-        self._columns_by_table: Dict[str, Dict[str, ColumnInfo]] = {}
-        self._foreign_keys: List[ForeignKeyInfo] = []
-        self._fk_by_table: Dict[str, List[ForeignKeyInfo]] = {}
         self._all_table_names: Set[str] = set()
+        self._column_suggesters: Dict[str, NameIndex] = {}
         self._loaded = False
 
     def _ensure_loaded(self):
@@ -135,58 +145,47 @@ class SchemaLoader:
             self._loaded = True
 
     def _load_all(self):
-        """Load all schema data files."""
+        """Load the compiled schema snapshot and the tables list."""
         logger.info("Loading Viewpoint schema data...")
-        self._load_columns()
+        self._schema = load_metadata_schema(self.metadata_dir)
         self._load_tables_list()
-        self._load_foreign_keys()
-        logger.info(f"Loaded {len(self._tables)} tables/views, {sum(len(t.columns) for t in self._tables.values())} columns")
-
-    def _load_columns(self):
-        """Load columns.json and build table structures."""
-        columns_file = self.metadata_dir / "columns.json"
-        if not columns_file.exists():
-            logger.warning(f"columns.json not found at {columns_file}")
-            return
-
-        with open(columns_file, 'r', encoding='utf-8') as f:
-            columns_data = json.load(f)
-
-        for col in columns_data:
-            if not isinstance(col, dict):
-                continue
-
-            obj_name = col.get('ObjectName', '')
-            schema_name = col.get('SchemaName', 'dbo')
-            obj_type = col.get('ObjectType', 'TABLE')
-            module = self._infer_module(obj_name)
-
-            # Create table entry if needed
-            if obj_name not in self._tables:
-                self._tables[obj_name] = TableInfo(
-                    name=obj_name,
-                    schema_name=schema_name,
-                    object_type=obj_type,
-                    module=module
-                )
-                self._columns_by_table[obj_name] = {}
-
-            # Create column info
-            col_info = ColumnInfo(
-                name=col.get('ColumnName', ''),
-                data_type=col.get('DataType', 'unknown'),
-                is_nullable=col.get('IsNullable', 'True') == 'True',
-                table_name=obj_name,
+        if self._schema is not None:
+            logger.info(f"Loaded {self._schema.num_column_tables} tables/views, {self._schema.num_columns()} columns")
+
+    def _table_names(self) -> List[str]:
+        return self._schema.table_names() if self._schema is not None else []
+
+    def _build_table(self, table_name: str) -> Optional[TableInfo]:
+        """Materialize the TableInfo of one table from the snapshot."""
+        if table_name in self._tables:
+            return self._tables[table_name]
+        if self._schema is None or not self._schema.has_table(table_name):
+            return None
+
+        attributes = self._schema.table_attributes(table_name)
+        schema_name = attributes['schema_name'] or 'dbo'
+        table = TableInfo(
+            name=table_name,
+            schema_name=schema_name,
+            object_type=attributes['object_type'] or 'TABLE',
+            module=self._infer_module(table_name)
+        )
+        for col in self._schema.columns(table_name):
+            table.columns.append(ColumnInfo(
+                name=col.name,
+                data_type=col.data_type or 'unknown',
+                is_nullable=col.is_nullable is not False,
+                table_name=table_name,
                 schema_name=schema_name,
-                ordinal_position=int(col.get('OrdinalPosition', 0)),
-                max_length=col.get('MaxLength'),
-                precision=col.get('Precision'),
-                scale=col.get('Scale'),
-                default_value=col.get('DefaultValue')
-            )
+                ordinal_position=col.ordinal_position or 0,
+                max_length=col.max_length,
+                precision=col.precision,
+                scale=col.scale,
+                default_value=col.default_value
+            ))
 
-            self._tables[obj_name].columns.append(col_info)
-            self._columns_by_table[obj_name][col_info.name] = col_info
+        self._tables[table_name] = table
+        return table
 
     def _load_tables_list(self):
         """Load complete tables/views list."""
@@ -202,41 +201,15 @@ class SchemaLoader:
                     self._all_table_names.add(name.upper())
                     self._all_table_names.add(name.lower())
 
-        # Also add from columns data
-        self._all_table_names.update(self._tables.keys())
-
-    def _load_foreign_keys(self):
-        """Load foreign key relationships."""
-        fk_file = self.metadata_dir / "foreign_keys.json"
-        if not fk_file.exists():
-            logger.warning(f"foreign_keys.json not found at {fk_file}")
-            return
-
-        with open(fk_file, 'r', encoding='utf-8') as f:
-            fk_data = json.load(f)
-
-        for fk in fk_data:
-            if not isinstance(fk, dict):
-                continue
-
-            fk_info = ForeignKeyInfo(
-                parent_table=fk.get('ParentTable', fk.get('parent_table', '')),
-                parent_columns=fk.get('ParentColumns', fk.get('parent_columns', [])),
-                child_table=fk.get('ChildTable', fk.get('child_table', '')),
-                child_columns=fk.get('ChildColumns', fk.get('child_columns', [])),
-                constraint_name=fk.get('ConstraintName', fk.get('constraint_name', ''))
-            )
-
-            self._foreign_keys.append(fk_info)
-
-            # Index by both tables
-            if fk_info.parent_table not in self._fk_by_table:
-                self._fk_by_table[fk_info.parent_table] = []
-            self._fk_by_table[fk_info.parent_table].append(fk_info)
-
-            if fk_info.child_table not in self._fk_by_table:
-                self._fk_by_table[fk_info.child_table] = []
-            self._fk_by_table[fk_info.child_table].append(fk_info)
+    @staticmethod
+    def _to_fk_info(fk) -> ForeignKeyInfo:
+        return ForeignKeyInfo(
+            parent_table=fk.parent_table,
+            parent_columns=list(fk.parent_columns),
+            child_table=fk.referenced_table,
+            child_columns=list(fk.referenced_columns),
+            constraint_name=fk.constraint_name
+        )
 
     def _infer_module(self, table_name: str) -> str:
         """Infer module from table name prefix."""
@@ -270,7 +243,9 @@ class SchemaLoader:
             True if table exists, False otherwise
         """
         self._ensure_loaded()
-        return table_name in self._tables or table_name in self._all_table_names
+        if self._schema is not None and self._schema.has_table(table_name):
+            return True
+        return table_name in self._all_table_names
 
     def column_exists(self, table_name: str, column_name: str) -> bool:
         """
@@ -284,40 +259,40 @@ class SchemaLoader:
             True if column exists with exact case, False otherwise
         """
         self._ensure_loaded()
-        if table_name not in self._columns_by_table:
-            return False
-        return column_name in self._columns_by_table[table_name]
+        return self._schema is not None and self._schema.has_column(table_name, column_name)
 
     def get_table(self, table_name: str) -> Optional[TableInfo]:
         """Get table information."""
         self._ensure_loaded()
-        return self._tables.get(table_name)
+        return self._build_table(table_name)
 
     def get_columns(self, table_name: str) -> List[ColumnInfo]:
         """Get all columns for a table."""
         self._ensure_loaded()
-        table = self._tables.get(table_name)
+        table = self._build_table(table_name)
         return table.columns if table else []
 
     def get_column(self, table_name: str, column_name: str) -> Optional[ColumnInfo]:
         """Get specific column information."""
         self._ensure_loaded()
-        if table_name not in self._columns_by_table:
+        table = self._build_table(table_name)
+        if not table:
             return None
-        return self._columns_by_table[table_name].get(column_name)
+        return next((col for col in table.columns if col.name == column_name), None)
 
     def get_foreign_keys(self, table_name: str) -> List[ForeignKeyInfo]:
         """Get foreign key relationships for a table."""
         self._ensure_loaded()
-        return self._fk_by_table.get(table_name, [])
+        if self._schema is None:
+            return []
+        return [self._to_fk_info(fk) for fk in self._schema.foreign_keys(table_name)]
 
     def get_company_column(self, table_name: str) -> Optional[str]:
         """Get the company column for a table based on its module."""
         self._ensure_loaded()
-        table = self._tables.get(table_name)
-        if not table:
+        if self._schema is None or not self._schema.has_table(table_name):
             return None
-        return self.MODULE_COMPANY_COLUMNS.get(table.module)
+        return self.MODULE_COMPANY_COLUMNS.get(self._infer_module(table_name))
 
     def find_join_columns(self, table1: str, table2: str) -> List[Tuple[str, str]]:
         """
@@ -325,62 +300,76 @@ class SchemaLoader:
 
         Returns list of (table1_column, table2_column) pairs.
         """
-        self._ensure_loaded()
+        graph = self.get_join_graph()
+        if graph is None:
+            return []
+        return [pair for step in graph.join_steps(table1, table2) for pair in step.pairs()]
 
-        join_cols = []
+    def find_join_path(self, table1: str, table2: str, max_hops: int = DEFAULT_MAX_HOPS) -> List[JoinStep]:
+        """
+        Find the foreign key joins leading from table1 to table2.
 
-        # Check foreign keys
-        for fk in self._foreign_keys:
-            if (fk.parent_table == table1 and fk.child_table == table2) or \
-               (fk.parent_table == table2 and fk.child_table == table1):
-                for p_col, c_col in zip(fk.parent_columns, fk.child_columns):
-                    if fk.parent_table == table1:
-                        join_cols.append((p_col, c_col))
-                    else:
-                        join_cols.append((c_col, p_col))
+        Prefers paths that do not pass through hub tables (HQCO, ...); search
+        results are memoized per source table. Returns an empty list when no
+        path of at most max_hops joins exists.
+        """
+        graph = self.get_join_graph()
+        if graph is None:
+            return []
+        return list(graph.best_path(table1, table2, max_hops) or ())
 
-        return join_cols
+    def get_join_graph(self) -> Optional[JoinGraph]:
+        """Foreign key join graph (shared with other loaders of the same snapshot)."""
+        self._ensure_loaded()
+        return schema_graph(self._schema) if self._schema is not None else None
 
     def get_all_table_names(self) -> Set[str]:
         """Get set of all known table/view names."""
         self._ensure_loaded()
-        return set(self._tables.keys())
+        return set(self._table_names())
 
     def suggest_similar_tables(self, invalid_name: str, max_suggestions: int = 5) -> List[str]:
         """
-        Suggest similar table names for an invalid name.
+        Suggest similar table names for an invalid name, best match first.
 
-        Uses simple prefix matching for suggestions.
+        Uses the fuzzy table index (edit distance, then trigram similarity),
+        built once per schema snapshot.
         """
         self._ensure_loaded()
+        if self._schema is None:
+            return []
+        return table_index(self._schema).suggest(invalid_name, max_suggestions)
 
-        suggestions = []
-        invalid_upper = invalid_name.upper()
-
-        for table_name in self._tables.keys():
-            # Check prefix match
-            if table_name.upper().startswith(invalid_upper[:2]):
-                suggestions.append(table_name)
-            # Check if invalid name is substring
-            elif invalid_upper in table_name.upper():
-                suggestions.append(table_name)
-
-        return sorted(suggestions)[:max_suggestions]
+    def suggest_similar_columns(self, table_name: str, invalid_name: str, max_suggestions: int = 5) -> List[str]:
+        """Suggest columns of a table similar to an invalid column name, best match first."""
+        self._ensure_loaded()
+        if self._schema is None:
+            return []
+        if table_name not in self._column_suggesters:
+            self._column_suggesters[table_name] = NameIndex(self._schema.column_names(table_name))
+        return self._column_suggesters[table_name].suggest(invalid_name, max_suggestions)
+
+    def get_table_index(self) -> Optional[NameIndex]:
+        """Fuzzy index over all table/view names (shared with other loaders of the same snapshot)."""
+        self._ensure_loaded()
+        return table_index(self._schema) if self._schema is not None else None
 
     def get_stats(self) -> Dict:
         """Get schema statistics."""
         self._ensure_loaded()
 
-        tables = [t for t in self._tables.values() if t.object_type == 'TABLE']
-        views = [t for t in self._tables.values() if t.object_type == 'VIEW']
+        names = self._table_names()
+        object_types = [
+            (self._schema.table_attributes(name)['object_type'] or 'TABLE') for name in names
+        ] if self._schema is not None else []
 
         return {
-            'total_objects': len(self._tables),
-            'tables': len(tables),
-            'views': len(views),
-            'total_columns': sum(len(t.columns) for t in self._tables.values()),
-            'foreign_keys': len(self._foreign_keys),
-            'modules': list(set(t.module for t in self._tables.values()))
+            'total_objects': len(names),
+            'tables': object_types.count('TABLE'),
+            'views': object_types.count('VIEW'),
+            'total_columns': self._schema.num_columns() if self._schema is not None else 0,
+            'foreign_keys': self._schema.num_foreign_keys() if self._schema is not None else 0,
+            'modules': list(set(self._infer_module(name) for name in names))
         }
 
 
@@ -398,6 +387,8 @@ if __name__ == "__main__":
     parser.add_argument('--check-table', type=str, help='Check if table exists')
     parser.add_argument('--check-column', type=str, nargs=2,
                         metavar=('TABLE', 'COLUMN'), help='Check if column exists')
+    parser.add_argument('--join-path', type=str, nargs=2,
+                        metavar=('TABLE1', 'TABLE2'), help='Find the foreign key joins between two tables')
 
     args = parser.parse_args()
 
@@ -422,3 +413,10 @@ if __name__ == "__main__":
         table, column = args.check_column
         exists = schema.column_exists(table, column)
         print(f"\nColumn '{table}.{column}': {'EXISTS' if exists else 'NOT FOUND'}")
+
+    if args.join_path:
+        table1, table2 = args.join_path
+        path = schema.find_join_path(table1, table2)
+        print(f"\nJoin path '{table1}' -> '{table2}': {'FOUND' if path else 'NOT FOUND'}")
+        for step in path:
+            print(f"  JOIN {step.right_table} ON {step.condition()}")
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Single-Pass SQL Analyzer for VGPT2 v3
+=====================================
+Tokenizes a T-SQL query once and extracts everything the validators need from
+that one token stream.
+
+This module provides:
+- A T-SQL lexer (comments, strings, [bracketed]/"quoted" identifiers, @variables)
+- Table references with their schema, alias and table hints
+- CTE names and derived-table aliases
+- Column references (qualified or not) with the clause they appear in
+- WHERE / ON / HAVING predicates and column = column equalities (join conditions)
+
+Usage:
+    from utils.sql_analyzer import analyze_sql
+
+    analysis = analyze_sql("SELECT APTH.APCo FROM APTH WITH (NOLOCK) WHERE APTH.APCo = @APCo")
+    analysis.tables        # [TableRef(name='APTH', ..., hints={'NOLOCK'})]
+    analysis.columns       # [ColumnRef(qualifier='APTH', name='APCo', clause='SELECT'), ...]
+    analysis.predicates    # [Predicate(column=ColumnRef(...), operator='=')]
+    analysis.equalities    # [ColumnEquality(left=ColumnRef(...), right=ColumnRef(...))] for a.x = b.y
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+# Reserved words and built-in functions that are never table or column names
+KEYWORDS = {
+    'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'IS',
+    'NULL', 'JOIN', 'ON', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'FULL',
+    'GROUP', 'BY', 'ORDER', 'HAVING', 'UNION', 'ALL', 'AS', 'EXCEPT', 'INTERSECT',
+    'WITH', 'NOLOCK', 'INSERT', 'UPDATE', 'DELETE', 'INTO', 'MERGE', 'USING', 'MATCHED',
+    'VALUES', 'SET', 'CREATE', 'ALTER', 'DROP', 'TABLE', 'VIEW', 'PROCEDURE', 'FUNCTION',
+    'INDEX', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'DISTINCT', 'PERCENT', 'TIES',
+    'TOP', 'LIKE', 'BETWEEN', 'EXISTS', 'ASC', 'DESC', 'LIMIT', 'ANY', 'SOME',
+    'OFFSET', 'FETCH', 'NEXT', 'ROWS', 'ROW', 'ONLY', 'OVER', 'PARTITION', 'FIRST',
+    'ROW_NUMBER', 'RANK', 'DENSE_RANK', 'NTILE', 'LAG', 'LEAD',
+    'FIRST_VALUE', 'LAST_VALUE', 'SUM', 'COUNT', 'AVG', 'MIN', 'MAX',
+    'COALESCE', 'ISNULL', 'NULLIF', 'CAST', 'CONVERT', 'DATEADD',
+    'DATEDIFF', 'GETDATE', 'GETUTCDATE', 'YEAR', 'MONTH', 'DAY',
+    'RECURSIVE', 'CROSS', 'APPLY', 'PIVOT', 'UNPIVOT', 'FOR',
+    'DECLARE', 'EXEC', 'EXECUTE', 'BEGIN', 'TRAN', 'TRANSACTION', 'COMMIT', 'ROLLBACK',
+    'IF', 'WHILE', 'RETURN', 'PRINT', 'GO', 'OUTPUT', 'DEFAULT', 'COLLATE', 'ESCAPE',
+    'ROWNUM', 'INTERVAL',
+}
+
+# Table hints allowed inside WITH ( ... )
+TABLE_HINTS = {
+    'NOLOCK', 'READUNCOMMITTED', 'READCOMMITTED', 'READCOMMITTEDLOCK', 'REPEATABLEREAD',
+    'SERIALIZABLE', 'HOLDLOCK', 'UPDLOCK', 'XLOCK', 'ROWLOCK', 'PAGLOCK', 'TABLOCK',
+    'TABLOCKX', 'NOWAIT', 'READPAST', 'SNAPSHOT', 'INDEX', 'FORCESEEK', 'FORCESCAN',
+    'NOEXPAND', 'KEEPIDENTITY', 'KEEPDEFAULTS', 'IGNORE_CONSTRAINTS', 'IGNORE_TRIGGERS',
+}
+
+# Functions whose first argument is a date part keyword (month, mm, dd, ...)
+DATEPART_FUNCTIONS = {'DATEADD', 'DATEDIFF', 'DATEDIFF_BIG', 'DATEPART', 'DATENAME', 'DATETRUNC'}
+
+# Functions whose first argument is a data type: CONVERT(varchar, InvDate, 101)
+# (CAST / TRY_CAST / PARSE name the type after AS, which is skipped like a column alias)
+TYPE_ARGUMENT_FUNCTIONS = {'CONVERT', 'TRY_CONVERT'}
+
+# Functions called without parentheses: SELECT CURRENT_TIMESTAMP AS Now
+NILADIC_FUNCTIONS = {'CURRENT_TIMESTAMP', 'CURRENT_USER', 'SESSION_USER', 'SYSTEM_USER', 'USER'}
+
+# Window frame words: ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+WINDOW_FRAME_KEYWORDS = {'UNBOUNDED', 'PRECEDING', 'FOLLOWING', 'CURRENT', 'RANGE', 'GROUPS'}
+
+KEYWORDS |= DATEPART_FUNCTIONS | TYPE_ARGUMENT_FUNCTIONS | NILADIC_FUNCTIONS | WINDOW_FRAME_KEYWORDS
+
+# Clause keywords that switch what the following identifiers mean
+CLAUSE_KEYWORDS = {'SELECT', 'FROM', 'WHERE', 'HAVING', 'ON', 'SET', 'VALUES', 'GROUP', 'ORDER', 'USING'}
+TABLE_INTRODUCERS = {'FROM', 'JOIN', 'INTO', 'UPDATE', 'APPLY', 'USING'}
+PREDICATE_CLAUSES = {'WHERE', 'ON', 'HAVING'}
+COMPARISON_OPERATORS = {'=', '<>', '!=', '<', '>', '<=', '>=', 'LIKE', 'IN', 'IS', 'BETWEEN'}
+ARITHMETIC_OPERATORS = {'+', '-', '*', '/', '%', '&', '|', '^'}
+
+TOKEN_PATTERN = re.compile(r"""
+  \s*(?:
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>N?'(?:[^']|'')*(?:'|\Z))
+  | (?P<bracket>\[(?:[^\]]|\]\])*(?:\]|\Z))
+  | (?P<quoted>"(?:[^"]|"")*(?:"|\Z))
+  | (?P<var>@@?\w+)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>[^\W\d]\w*|\#{1,2}\w+)
+  | (?P<op><>|!=|<=|>=|[-+*/%=<>&|^~])
+  | (?P<punct>[(),;.])
+  | (?P<other>\S)
+  )
+""", re.VERBOSE | re.DOTALL)
+
+
+class Token(NamedTuple):
+    """A lexical token. `upper` is the uppercased value of unquoted words, else ''."""
+    kind: str  # word, ident (quoted), string, number, var, op, punct, other
+    value: str
+    upper: str
+    pos: int
+
+
+def tokenize(sql: str) -> List[Token]:
+    """Split T-SQL into tokens in one regex pass, dropping whitespace and comments."""
+    tokens = []
+    append = tokens.append
+    for match in TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        if kind == 'comment':
+            continue
+
+        value = match.group(kind)
+        pos = match.start(kind)
+        if kind == 'word':
+            append(Token('word', value, value.upper(), pos))
+        elif kind == 'bracket':
+            append(Token('ident', value[1:-1].replace(']]', ']'), '', pos))
+        elif kind == 'quoted':
+            append(Token('ident', value[1:-1].replace('""', '"'), '', pos))
+        else:
+            append(Token(kind, value, '', pos))
+    return tokens
+
+
+@dataclass
+class TableRef:
+    """A table or view read or written by the query."""
+    name: str
+    schema: Optional[str] = None
+    alias: Optional[str] = None
+    hints: Set[str] = field(default_factory=set)
+    clause: str = 'FROM'  # FROM, JOIN, INTO, UPDATE, DELETE, APPLY, USING
+    position: int = 0
+
+    @property
+    def is_read(self) -> bool:
+        return self.clause in ('FROM', 'JOIN', 'APPLY', 'USING')
+
+
+class ColumnRef(NamedTuple):
+    """A column reference, e.g. `APTH.APCo` (qualifier 'APTH') or `APCo`."""
+    qualifier: Optional[str]
+    name: str
+    clause: str
+    position: int
+
+
+class Predicate(NamedTuple):
+    """A column compared in a WHERE / ON / HAVING clause."""
+    column: ColumnRef
+    operator: str
+
+
+class ColumnEquality(NamedTuple):
+    """Two columns compared with = in a WHERE / ON / HAVING clause (a join condition)."""
+    left: ColumnRef
+    right: ColumnRef
+
+
+@dataclass
+class SQLAnalysis:
+    """Everything extracted from one pass over a query's tokens."""
+    tokens: List[Token]
+    tables: List[TableRef] = field(default_factory=list)
+    columns: List[ColumnRef] = field(default_factory=list)
+    predicates: List[Predicate] = field(default_factory=list)
+    equalities: List[ColumnEquality] = field(default_factory=list)
+    cte_names: Set[str] = field(default_factory=set)
+    derived_aliases: Set[str] = field(default_factory=set)
+    column_aliases: Set[str] = field(default_factory=set)
+    keywords: Set[str] = field(default_factory=set)
+    paren_depth: int = 0  # open parentheses left at the end
+    paren_mismatch: bool = False  # a ')' closed more than was opened
+    _qualifiers: Optional[Dict[str, TableRef]] = field(default=None, repr=False)
+
+    @property
+    def balanced_parens(self) -> bool:
+        return self.paren_depth == 0 and not self.paren_mismatch
+
+    @property
+    def first_keyword(self) -> str:
+        return self.tokens[0].upper if self.tokens else ''
+
+    @property
+    def is_select(self) -> bool:
+        return 'SELECT' in self.keywords
+
+    @property
+    def is_write(self) -> bool:
+        return bool(self.keywords & {'INSERT', 'UPDATE', 'DELETE', 'MERGE'})
+
+    @property
+    def aliases(self) -> Dict[str, TableRef]:
+        return {ref.alias: ref for ref in self.tables if ref.alias}
+
+    def resolve(self, qualifier: str) -> Optional[TableRef]:
+        """Return the table a column qualifier (alias first, then table name) refers to."""
+        if self._qualifiers is None:
+            self._qualifiers = {}
+            for ref in reversed(self.tables):
+                self._qualifiers[ref.name.upper()] = ref
+            for ref in reversed(self.tables):
+                if ref.alias:
+                    self._qualifiers[ref.alias.upper()] = ref
+        return self._qualifiers.get(qualifier.upper())
+
+
+def _is_name(token: Optional[Token]) -> bool:
+    """A token usable as an identifier (unquoted non-keyword or quoted)."""
+    return token is not None and (token.kind == 'ident' or (token.kind == 'word' and token.upper not in KEYWORDS))
+
+
+class _Parser:
+    """Walks the token stream once, tracking the current clause per parenthesis depth."""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.analysis = SQLAnalysis(tokens=tokens)
+        self.skip: Set[int] = set()  # token indexes that are not column references
+        self._equals_left: Optional[Tuple[int, ColumnRef]] = None  # (index of '=', column before it)
+
+    def peek(self, i: int) -> Optional[Token]:
+        return self.tokens[i] if 0 <= i < len(self.tokens) else None
+
+    def parse(self) -> SQLAnalysis:
+        analysis = self.analysis
+        tokens = self.tokens
+        clauses = ['']  # current clause per parenthesis depth
+        derived_depths: List[int] = []  # depths of pending derived tables FROM ( ... ) alias
+        keyword_argument_next = False  # the next name is a date part or a data type
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token.value == '(' and token.kind == 'punct':
+                # Function arguments and subqueries inside FROM never list tables by comma
+                clauses.append('' if clauses[-1] == 'FROM' else clauses[-1])
+                analysis.paren_depth += 1
+            elif token.value == ')' and token.kind == 'punct':
+                analysis.paren_depth -= 1
+                if analysis.paren_depth < 0:
+                    analysis.paren_mismatch = True
+                if len(clauses) > 1:
+                    clauses.pop()
+                if derived_depths and derived_depths[-1] == len(clauses):
+                    derived_depths.pop()
+                    i = self._derived_alias(i + 1)
+                    continue
+            elif token.value == ',' and token.kind == 'punct' and clauses[-1] == 'FROM':
+                i = self._table_ref(i + 1, 'FROM', derived_depths, len(clauses))
+                continue
+            elif token.kind == 'word' and token.upper in KEYWORDS:
+                keyword = token.upper
+                analysis.keywords.add(keyword)
+                if keyword in CLAUSE_KEYWORDS:
+                    clauses[-1] = 'FROM' if keyword == 'USING' else keyword
+                elif keyword in ('JOIN', 'APPLY'):
+                    clauses[-1] = 'FROM'
+
+                if keyword in TABLE_INTRODUCERS:
+                    i = self._table_ref(i + 1, keyword, derived_depths, len(clauses))
+                    continue
+                if keyword == 'DELETE' and self.peek(i + 1) is not None and self.peek(i + 1).upper != 'FROM':
+                    i = self._table_ref(i + 1, 'DELETE', derived_depths, len(clauses))
+                    continue
+                if keyword == 'AS' and self.peek(i + 1) is not None and self.peek(i + 1).kind in ('word', 'ident'):
+                    # Column alias (SELECT x AS Total) or data type (CAST(x AS int))
+                    following = self.peek(i + 2)
+                    if clauses[-1] == 'SELECT' and not (following is not None and following.value == '('):
+                        analysis.column_aliases.add(self.peek(i + 1).value)
+                    self.skip.add(i + 1)
+                keyword_argument_next = keyword in DATEPART_FUNCTIONS or keyword in TYPE_ARGUMENT_FUNCTIONS
+            elif token.kind in ('word', 'ident'):
+                i = self._name(i, clauses[-1], keyword_argument_next)
+                keyword_argument_next = False
+                continue
+            i += 1
+
+        return analysis
+
+    def _name(self, i: int, clause: str, is_keyword_argument: bool) -> int:
+        """Handle an identifier: CTE name, function call, column reference or alias."""
+        analysis = self.analysis
+        tokens = self.tokens
+        # Gather a dotted name: a.b.c
+        parts = [tokens[i]]
+        j = i + 1
+        while self.peek(j) is not None and self.peek(j).value == '.' and self.peek(j + 1) is not None \
+                and (self.peek(j + 1).kind in ('word', 'ident') or self.peek(j + 1).value == '*'):
+            parts.append(tokens[j + 1])
+            j += 2
+
+        nxt = self.peek(j)
+        prev = self.peek(i - 1)
+        if i in self.skip or is_keyword_argument:
+            return j
+
+        # CTE definition: name AS ( ... ) or name (cols) AS ( ... )
+        if len(parts) == 1 and nxt is not None and nxt.upper == 'AS' and self.peek(j + 1) is not None \
+                and self.peek(j + 1).value == '(' and (prev is None or prev.upper == 'WITH' or prev.value == ','):
+            analysis.cte_names.add(parts[0].value)
+            return j
+
+        # Function call
+        if nxt is not None and nxt.value == '(' and parts[-1].kind == 'word':
+            return j
+
+        if parts[-1].value == '*':
+            return j
+
+        # Alias = expression at the start of a SELECT item: "SELECT Total = SUM(GrossAmt)"
+        if clause == 'SELECT' and len(parts) == 1 and nxt is not None and nxt.value == '=' and \
+                prev is not None and (prev.upper in ('SELECT', 'DISTINCT', 'ALL') or prev.value == ','
+                                      or self._follows_top(i - 1)):
+            analysis.column_aliases.add(parts[0].value)
+            return j
+
+        # Alias without AS in the SELECT list: "SELECT APCo Company"
+        if clause == 'SELECT' and len(parts) == 1 and prev is not None and \
+                (prev.kind in ('string', 'number') or prev.value == ')' or prev.upper == 'END' or _is_name(prev)) \
+                and not self._follows_top(i - 1):
+            analysis.column_aliases.add(parts[0].value)
+            return j
+
+        qualifier = parts[-2].value if len(parts) >= 2 else None
+        column = ColumnRef(qualifier=qualifier, name=parts[-1].value, clause=clause, position=parts[0].pos)
+        analysis.columns.append(column)
+
+        if clause in PREDICATE_CLAUSES:
+            operator = None
+            if nxt is not None and (nxt.upper or nxt.value) in COMPARISON_OPERATORS | {'NOT'}:
+                operator = nxt.upper or nxt.value
+            elif prev is not None and (prev.upper or prev.value) in COMPARISON_OPERATORS:
+                operator = prev.upper or prev.value
+            if operator is not None:
+                analysis.predicates.append(Predicate(column=column, operator=operator))
+
+            # column = column, unless either side is part of an expression
+            if prev is not None and prev.value == '=' and self._equals_left is not None \
+                    and self._equals_left[0] == i - 1 \
+                    and not (nxt is not None and nxt.kind == 'op' and nxt.value in ARITHMETIC_OPERATORS):
+                analysis.equalities.append(ColumnEquality(left=self._equals_left[1], right=column))
+            if nxt is not None and nxt.value == '=' and \
+                    not (prev is not None and prev.kind == 'op' and prev.value in ARITHMETIC_OPERATORS):
+                self._equals_left = (j, column)
+        return j
+
+    def _follows_top(self, i: int) -> bool:
+        """Check if token i ends the row count of TOP n / TOP (n)."""
+        if self.tokens[i].value == ')':
+            depth = 0
+            while i >= 0:
+                if self.tokens[i].value == ')':
+                    depth += 1
+                elif self.tokens[i].value == '(':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                i -= 1
+        prev = self.peek(i - 1)
+        return prev is not None and prev.upper in ('TOP', 'PERCENT')
+
+    def _table_ref(self, i: int, clause: str, derived_depths: List[int], depth: int) -> int:
+        """Parse `[schema.]name [AS alias] [WITH (hints)]` after FROM/JOIN/INTO/UPDATE/DELETE."""
+        analysis = self.analysis
+        token = self.peek(i)
+        if token is None:
+            return i
+
+        if token.value == '(':  # derived table / subquery
+            if clause != 'INTO':
+                derived_depths.append(depth)
+            return i
+
+        if not _is_name(token):
+            return i
+
+        parts = [token]
+        j = i + 1
+        while self.peek(j) is not None and self.peek(j).value == '.' and self.peek(j + 1) is not None \
+                and self.peek(j + 1).kind in ('word', 'ident'):
+            parts.append(self.peek(j + 1))
+            j += 2
+
+        nxt = self.peek(j)
+        # Table-valued function: FROM dbo.fn(...) / CROSS APPLY fn(...)
+        if nxt is not None and nxt.value == '(' and clause != 'INTO' and not self._is_hint_list(j):
+            return j
+
+        ref = TableRef(
+            name=parts[-1].value,
+            schema=parts[-2].value if len(parts) >= 2 else None,
+            clause=clause,
+            position=token.pos
+        )
+
+        # Optional alias
+        if nxt is not None and nxt.upper == 'AS' and _is_name(self.peek(j + 1)):
+            ref.alias = self.peek(j + 1).value
+            j += 2
+        elif _is_name(nxt) and clause != 'INTO':
+            ref.alias = nxt.value
+            j += 1
+
+        # Table hints: WITH (NOLOCK, ...) or legacy (NOLOCK)
+        nxt = self.peek(j)
+        if nxt is not None and nxt.upper == 'WITH' and self.peek(j + 1) is not None and self.peek(j + 1).value == '(':
+            analysis.keywords.add('WITH')
+            j = self._hints(j + 1, ref)
+        elif nxt is not None and nxt.value == '(' and self._is_hint_list(j):
+            j = self._hints(j, ref)
+
+        analysis.tables.append(ref)
+        return j
+
+    def _is_hint_list(self, i: int) -> bool:
+        nxt = self.peek(i + 1)
+        return nxt is not None and nxt.upper in TABLE_HINTS
+
+    def _hints(self, i: int, ref: TableRef) -> int:
+        """Consume `( hint, hint )` starting at the opening parenthesis."""
+        j = i + 1
+        depth = 1
+        while j < len(self.tokens) and depth > 0:
+            token = self.tokens[j]
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            elif token.kind == 'word' and depth == 1:
+                ref.hints.add(token.upper)
+            j += 1
+        return j
+
+    def _derived_alias(self, i: int) -> int:
+        """Record the alias following the closing parenthesis of a derived table."""
+        token = self.peek(i)
+        if token is not None and token.upper == 'AS':
+            i += 1
+            token = self.peek(i)
+        if _is_name(token):
+            self.analysis.derived_aliases.add(token.value)
+            return i + 1
+        return i
+
+
+def analyze_sql(sql: str) -> SQLAnalysis:
+    """Tokenize and analyze a query in a single pass."""
+    return _Parser(tokenize(sql)).parse()
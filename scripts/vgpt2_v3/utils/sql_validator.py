@@ -11,6 +11,9 @@ This module checks:
 - WITH (NOLOCK) usage
 - Company column filtering
 - Table alias violations
+- Incomplete joins (a foreign key join matching only some of its columns)
+
+The query is tokenized once by utils.sql_analyzer; all checks share that analysis.
 
 Usage:
     from utils.sql_validator import SQLValidator
@@ -24,13 +27,18 @@ Usage:
         print(f"Errors: {result.errors}")
 """
 
-import re
 import logging
+import sys
 from dataclasses import dataclass, field
-from typing import List, Set, Optional, Tuple
 from pathlib import Path
+from typing import Dict, Iterator, List, Set, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from vgpt2_batch import DEFAULT_CHUNK_SIZE, BatchRunner
 
 from .schema_loader import SchemaLoader
+from .sql_analyzer import KEYWORDS, SQLAnalysis, TableRef, analyze_sql
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -79,29 +87,9 @@ class SQLValidator:
     - Company column filtering
     - No table aliases rule
     - Case sensitivity
+    - Join completeness along foreign keys
     """
 
-    # Patterns for SQL parsing
-    TABLE_PATTERN = re.compile(
-        r'(?:FROM|JOIN|INTO|UPDATE|DELETE\s+FROM)\s+(\[?[\w\.]+\]?)',
-        re.IGNORECASE
-    )
-
-    COLUMN_PATTERN = re.compile(
-        r'(?:SELECT|WHERE|AND|OR|ON|SET|ORDER\s+BY|GROUP\s+BY)\s+[\w\.\[\]]+',
-        re.IGNORECASE
-    )
-
-    ALIAS_PATTERN = re.compile(
-        r'(?:FROM|JOIN)\s+(\[?[\w\.]+\]?)\s+(?:AS\s+)?([a-zA-Z]\w*)\s+(?:WITH|ON|WHERE|JOIN|LEFT|RIGHT|INNER|OUTER|,|$)',
-        re.IGNORECASE
-    )
-
-    NOLOCK_PATTERN = re.compile(
-        r'(\[?[\w\.]+\]?)\s+WITH\s*\(\s*NOLOCK\s*\)',
-        re.IGNORECASE
-    )
-
     def __init__(self, vgpt2_path: str):
         """
         Initialize the validator.
@@ -112,26 +100,20 @@ class SQLValidator:
         self.schema = SchemaLoader(vgpt2_path)
 
         # Common non-table keywords that look like tables
-        self.sql_keywords = {
-            'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'IS',
-            'NULL', 'JOIN', 'ON', 'LEFT', 'RIGHT', 'INNER', 'OUTER',
-            'GROUP', 'BY', 'ORDER', 'HAVING', 'UNION', 'ALL', 'AS',
-            'WITH', 'NOLOCK', 'INSERT', 'UPDATE', 'DELETE', 'INTO',
-            'VALUES', 'SET', 'CREATE', 'ALTER', 'DROP', 'TABLE', 'VIEW',
-            'INDEX', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'DISTINCT',
-            'TOP', 'LIKE', 'BETWEEN', 'EXISTS', 'ASC', 'DESC', 'LIMIT',
-            'OFFSET', 'FETCH', 'NEXT', 'ROWS', 'ONLY', 'OVER', 'PARTITION',
-            'ROW_NUMBER', 'RANK', 'DENSE_RANK', 'NTILE', 'LAG', 'LEAD',
-            'FIRST_VALUE', 'LAST_VALUE', 'SUM', 'COUNT', 'AVG', 'MIN', 'MAX',
-            'COALESCE', 'ISNULL', 'NULLIF', 'CAST', 'CONVERT', 'DATEADD',
-            'DATEDIFF', 'GETDATE', 'GETUTCDATE', 'YEAR', 'MONTH', 'DAY',
-            'CTE', 'RECURSIVE', 'CROSS', 'APPLY', 'PIVOT', 'UNPIVOT'
-        }
+        self.sql_keywords = KEYWORDS
+
+        # table -> {COLUMN: Column} for case-insensitive column lookups
+        self._column_index: Dict[str, Dict[str, str]] = {}
+
+        # Error/warning code counts of the last validate_batch run
+        self.last_error_types: Dict[str, int] = {}
 
     def validate(self, sql: str, strict: bool = True) -> ValidationResult:
         """
         Validate a SQL query.
 
+        The query is tokenized once; every check runs over the same analysis.
+
         Args:
             sql: SQL query to validate
             strict: If True, treat warnings as errors
@@ -140,23 +122,30 @@ class SQLValidator:
             ValidationResult with errors and warnings
         """
         result = ValidationResult(sql=sql, is_valid=True)
+        analysis = analyze_sql(sql)
 
         # Basic syntax check
-        self._check_basic_syntax(sql, result)
+        self._check_basic_syntax(analysis, result)
 
         # Extract and validate tables
-        tables = self._extract_tables(sql)
-        result.tables_found = tables
-        self._validate_tables(tables, sql, result)
+        tables = self._extract_tables(analysis)
+        result.tables_found = {ref.name for ref in tables}
+        self._validate_tables(tables, analysis, result)
 
         # Check WITH (NOLOCK)
-        self._check_nolock(sql, tables, result)
+        self._check_nolock(analysis, tables, result)
 
         # Check for table aliases
-        self._check_aliases(sql, result)
+        self._check_aliases(tables, result)
 
         # Check company column filtering
-        self._check_company_filter(sql, tables, result)
+        self._check_company_filter(analysis, tables, result)
+
+        # Check column names against the referenced tables
+        self._check_columns(analysis, tables, result)
+
+        # Check joins match every column of their foreign key
+        self._check_joins(analysis, tables, result)
 
         # Determine overall validity
         result.is_valid = len(result.errors) == 0
@@ -165,21 +154,19 @@ class SQLValidator:
 
         return result
 
-    def _check_basic_syntax(self, sql: str, result: ValidationResult):
+    def _check_basic_syntax(self, analysis: SQLAnalysis, result: ValidationResult):
         """Check basic SQL syntax."""
-        sql_upper = sql.upper().strip()
-
-        # Must start with valid keyword
-        valid_starts = ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'CREATE', 'ALTER', 'DROP', '--']
-        if not any(sql_upper.startswith(kw) for kw in valid_starts):
+        # Must start with valid keyword (comments are skipped by the lexer)
+        valid_starts = ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'CREATE', 'ALTER', 'DROP']
+        if analysis.tokens and analysis.first_keyword not in valid_starts:
             result.errors.append(ValidationError(
                 code='INVALID_START',
                 message='SQL must start with SELECT, INSERT, UPDATE, DELETE, WITH, or DDL statement',
                 severity='error'
             ))
 
-        # Check balanced parentheses
-        if sql.count('(') != sql.count(')'):
+        # Check balanced parentheses (outside strings and comments)
+        if not analysis.balanced_parens:
             result.errors.append(ValidationError(
                 code='UNBALANCED_PARENS',
                 message='Unbalanced parentheses in SQL',
@@ -187,44 +174,37 @@ class SQLValidator:
             ))
 
         # Check for common Oracle syntax errors
-        if ' INTERVAL ' in sql_upper and ' YEAR' in sql_upper:
+        if 'INTERVAL' in analysis.keywords and 'YEAR' in analysis.keywords:
             result.errors.append(ValidationError(
                 code='ORACLE_SYNTAX',
                 message="Oracle INTERVAL syntax not valid in SQL Server. Use DATEADD() instead.",
                 severity='error'
             ))
 
-        if 'ROWNUM' in sql_upper:
+        if 'ROWNUM' in analysis.keywords:
             result.errors.append(ValidationError(
                 code='ORACLE_SYNTAX',
                 message="Oracle ROWNUM not valid in SQL Server. Use TOP or ROW_NUMBER() instead.",
                 severity='error'
             ))
 
-    def _extract_tables(self, sql: str) -> Set[str]:
-        """Extract table names from SQL."""
-        tables = set()
-
-        matches = self.TABLE_PATTERN.findall(sql)
-        for match in matches:
-            # Clean up table name
-            table = match.strip('[]').split('.')[-1]  # Remove schema prefix
-
-            # Skip if it's a keyword
-            if table.upper() in self.sql_keywords:
+    def _extract_tables(self, analysis: SQLAnalysis) -> List[TableRef]:
+        """Return the schema table references (no CTEs or temp tables)."""
+        tables = []
+        for ref in analysis.tables:
+            # Skip CTE references and temp tables
+            if ref.name in analysis.cte_names or ref.name.lower().startswith('cte_'):
                 continue
-
-            # Skip if it looks like a CTE reference
-            if table.lower().startswith('cte_'):
+            if ref.name.startswith('#'):
                 continue
 
-            tables.add(table)
+            tables.append(ref)
 
         return tables
 
-    def _validate_tables(self, tables: Set[str], sql: str, result: ValidationResult):
+    def _validate_tables(self, tables: List[TableRef], analysis: SQLAnalysis, result: ValidationResult):
         """Validate that tables exist in schema."""
-        for table in tables:
+        for table in sorted({ref.name for ref in tables}):
             if not self.schema.table_exists(table):
                 suggestions = self.schema.suggest_similar_tables(table)
                 msg = f"Table/view '{table}' does not exist in Viewpoint Vista"
@@ -242,8 +222,7 @@ class SQLValidator:
             if table.startswith('b') and len(table) > 2:
                 view_name = table[1:]  # Remove 'b' prefix
                 if self.schema.table_exists(view_name):
-                    sql_upper = sql.upper()
-                    if 'SELECT' in sql_upper and 'INSERT' not in sql_upper and 'UPDATE' not in sql_upper:
+                    if analysis.is_select and not analysis.keywords & {'INSERT', 'UPDATE'}:
                         result.warnings.append(ValidationError(
                             code='BASE_TABLE_IN_SELECT',
                             message=f"Use view '{view_name}' instead of base table '{table}' for SELECT queries",
@@ -251,65 +230,208 @@ class SQLValidator:
                             location=table
                         ))
 
-    def _check_nolock(self, sql: str, tables: Set[str], result: ValidationResult):
-        """Check that WITH (NOLOCK) is used for all tables in SELECT queries."""
-        if 'SELECT' not in sql.upper():
+    def _check_nolock(self, analysis: SQLAnalysis, tables: List[TableRef], result: ValidationResult):
+        """Check that WITH (NOLOCK) is used for all tables read by SELECT queries."""
+        if not analysis.is_select:
             return
 
-        # Find tables with NOLOCK
-        nolock_matches = self.NOLOCK_PATTERN.findall(sql)
-        tables_with_nolock = {m.strip('[]').split('.')[-1] for m in nolock_matches}
-
-        # Check each table
-        for table in tables:
-            if table not in tables_with_nolock:
+        reported = set()
+        for ref in tables:
+            if ref.is_read and 'NOLOCK' not in ref.hints and ref.name not in reported:
+                reported.add(ref.name)
                 result.warnings.append(ValidationError(
                     code='MISSING_NOLOCK',
-                    message=f"Table '{table}' should have WITH (NOLOCK) for SELECT queries",
+                    message=f"Table '{ref.name}' should have WITH (NOLOCK) for SELECT queries",
                     severity='warning',
-                    location=table
+                    location=ref.name
                 ))
 
-    def _check_aliases(self, sql: str, result: ValidationResult):
+    def _check_aliases(self, tables: List[TableRef], result: ValidationResult):
         """Check for table alias usage (not allowed in Viewpoint)."""
-        matches = self.ALIAS_PATTERN.findall(sql)
-
-        for table, alias in matches:
-            # Skip if alias looks like a keyword or is the same as table
-            if alias.upper() in self.sql_keywords:
-                continue
-            if alias.upper() == table.upper().strip('[]'):
+        for ref in tables:
+            # Skip if alias is the same as table
+            if not ref.alias or ref.alias.upper() == ref.name.upper():
                 continue
 
             result.warnings.append(ValidationError(
                 code='TABLE_ALIAS',
-                message=f"Table alias '{alias}' for '{table}' violates Viewpoint standards. Use full table name.",
+                message=f"Table alias '{ref.alias}' for '{ref.name}' violates Viewpoint standards. Use full table name.",
                 severity='warning',
-                location=f"{table} {alias}"
+                location=f"{ref.name} {ref.alias}"
             ))
 
-    def _check_company_filter(self, sql: str, tables: Set[str], result: ValidationResult):
-        """Check that company columns are filtered."""
-        if 'SELECT' not in sql.upper():
+    def _check_company_filter(self, analysis: SQLAnalysis, tables: List[TableRef], result: ValidationResult):
+        """Check that company columns are filtered in a WHERE / ON / HAVING predicate."""
+        if not analysis.is_select:
             return
 
-        for table in tables:
-            company_col = self.schema.get_company_column(table)
-            if not company_col:
+        # Company columns filtered unqualified (count for every table) or per qualified table
+        unqualified = set()
+        qualified = set()
+        for predicate in analysis.predicates:
+            column = predicate.column
+            if column.qualifier is None:
+                unqualified.add(column.name.upper())
+            else:
+                ref = analysis.resolve(column.qualifier)
+                if ref is not None:
+                    qualified.add((ref.name, column.name.upper()))
+
+        reported = set()
+        for ref in tables:
+            if not ref.is_read or ref.name in reported:
                 continue
 
-            # Check if company column is in WHERE or JOIN
-            if company_col not in sql and company_col.lower() not in sql.lower():
+            # Tables keyed by a group instead (APVM by VendorGroup) have no company column
+            company_col = self.schema.get_company_column(ref.name)
+            if not company_col or not self.schema.column_exists(ref.name, company_col):
+                continue
+
+            if company_col.upper() not in unqualified and (ref.name, company_col.upper()) not in qualified:
+                reported.add(ref.name)
                 result.warnings.append(ValidationError(
                     code='MISSING_COMPANY_FILTER',
-                    message=f"Consider filtering by {company_col} for table '{table}' to ensure data isolation",
+                    message=f"Consider filtering by {company_col} for table '{ref.name}' to ensure data isolation",
                     severity='warning',
-                    location=table
+                    location=ref.name
                 ))
 
-    def validate_batch(self, queries: List[str]) -> List[ValidationResult]:
-        """Validate multiple queries."""
-        return [self.validate(q) for q in queries]
+    def _get_column_index(self, table: str) -> Dict[str, str]:
+        """Return {COLUMN: Column} for a table, empty if the schema has no columns for it."""
+        if table not in self._column_index:
+            self._column_index[table] = {col.name.upper(): col.name for col in self.schema.get_columns(table)}
+        return self._column_index[table]
+
+    def _check_columns(self, analysis: SQLAnalysis, tables: List[TableRef], result: ValidationResult):
+        """Check that referenced columns exist, with the exact case, in the tables they refer to."""
+        # Unqualified columns are only checked when every source of the query has a known schema
+        sources = [ref for ref in analysis.tables if ref.name not in analysis.cte_names]
+        all_known = bool(sources) and not analysis.derived_aliases and not analysis.cte_names and \
+            all(self._get_column_index(ref.name) for ref in sources)
+
+        checked = set()
+        for column in analysis.columns:
+            result.columns_found.add(column.name)
+            if column.qualifier is None:
+                if not all_known or column.name in analysis.column_aliases:
+                    continue
+                candidates = sources
+            else:
+                ref = analysis.resolve(column.qualifier)
+                if ref is None or ref not in tables or not self._get_column_index(ref.name):
+                    continue  # CTE, derived table, outer reference or unknown table
+                candidates = [ref]
+
+            key = (column.name, tuple(ref.name for ref in candidates))
+            if key in checked:
+                continue
+            checked.add(key)
+
+            if any(self.schema.column_exists(ref.name, column.name) for ref in candidates):
+                continue
+
+            location = f"{column.qualifier}.{column.name}" if column.qualifier else column.name
+            matches = [self._get_column_index(ref.name).get(column.name.upper()) for ref in candidates]
+            matches = [match for match in matches if match]
+            if matches:
+                result.errors.append(ValidationError(
+                    code='COLUMN_CASE_MISMATCH',
+                    message=f"Column '{column.name}' should be '{matches[0]}' (Vista column names are case-sensitive)",
+                    severity='error',
+                    location=location
+                ))
+            else:
+                table_names = ', '.join(sorted({ref.name for ref in candidates}))
+                msg = f"Column '{column.name}' does not exist in {table_names}"
+                suggestions = [
+                    name for ref in candidates
+                    for name in self.schema.suggest_similar_columns(ref.name, column.name, 3)
+                ]
+                if suggestions:
+                    msg += f". Did you mean: {', '.join(list(dict.fromkeys(suggestions))[:3])}"
+                result.errors.append(ValidationError(
+                    code='COLUMN_NOT_FOUND',
+                    message=msg,
+                    severity='error',
+                    location=location
+                ))
+
+    def _check_joins(self, analysis: SQLAnalysis, tables: List[TableRef], result: ValidationResult):
+        """Check that two tables joined on part of a foreign key also match its other columns."""
+        if not analysis.is_select or not analysis.equalities:
+            return
+        graph = self.schema.get_join_graph()
+        if graph is None:
+            return
+
+        # (left table, right table) -> {(LEFTCOL, RIGHTCOL)} equated by the query, in both orientations
+        equated: Dict[Tuple[str, str], Set[Tuple[str, str]]] = {}
+        for equality in analysis.equalities:
+            if equality.left.qualifier is None or equality.right.qualifier is None:
+                continue
+            left, right = analysis.resolve(equality.left.qualifier), analysis.resolve(equality.right.qualifier)
+            if left is None or right is None or left.name == right.name or left not in tables or right not in tables:
+                continue
+            left_col, right_col = equality.left.name.upper(), equality.right.name.upper()
+            equated.setdefault((left.name, right.name), set()).add((left_col, right_col))
+            equated.setdefault((right.name, left.name), set()).add((right_col, left_col))
+
+        reported = set()
+        for (left, right), pairs in equated.items():
+            if (right, left) in reported:
+                continue
+            reported.add((left, right))
+            steps = graph.join_steps(left, right)
+            coverage = [
+                (sum((a.upper(), b.upper()) in pairs for a, b in step.pairs()), step) for step in steps
+            ]
+            if not coverage or any(matched == len(step.left_columns) for matched, step in coverage):
+                continue
+
+            matched, step = max(coverage, key=lambda item: item[0])
+            if matched == 0:
+                continue  # joined on columns of no foreign key
+            missing = [
+                f"{left}.{a} = {right}.{b}" for a, b in step.pairs() if (a.upper(), b.upper()) not in pairs
+            ]
+            result.warnings.append(ValidationError(
+                code='INCOMPLETE_JOIN',
+                message=f"Join between '{left}' and '{right}' matches {matched} of {len(step.left_columns)} "
+                        f"columns of foreign key {step.constraint_name or 'relationship'}. "
+                        f"Also match: {' AND '.join(missing)}",
+                severity='warning',
+                location=f"{left} JOIN {right}"
+            ))
+
+    def validate_batch(self, queries: List[str], strict: bool = True, workers: Optional[int] = None,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[ValidationResult]:
+        """
+        Validate multiple queries on a process pool.
+
+        The validator (and its memory-mapped schema) is shared read-only with the
+        workers; results come back in input order.
+
+        Args:
+            queries: SQL queries to validate
+            strict: If True, treat warnings as errors
+            workers: Worker processes (default: all cores, 1 = in-process)
+            chunk_size: Queries per worker task
+        """
+        return list(self.iter_batch(queries, strict, workers, chunk_size))
+
+    def iter_batch(self, queries: List[str], strict: bool = True, workers: Optional[int] = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[ValidationResult]:
+        """Like validate_batch, but yields each result as soon as its chunk is done."""
+        check = _validate_strict if strict else _validate_lenient
+        runner = BatchRunner(check, self, workers=workers, chunk_size=chunk_size,
+                             tally=_issue_codes, desc="queries")
+        yield from runner.imap(queries)
+
+        # Per-code counts, tallied per chunk by the workers and merged here
+        self.last_error_types = dict(runner.counts)
+        if runner.counts:
+            top = ", ".join(f"{code}={count:,}" for code, count in runner.counts.most_common(5))
+            logger.info(f"Batch of {runner.processed:,} queries: {top}")
 
     def get_stats(self, results: List[ValidationResult]) -> dict:
         """Get statistics from validation results."""
@@ -335,6 +457,22 @@ class SQLValidator:
         }
 
 
+# =============================================================================
+# Batch worker functions (module-level so the process pool can pickle them)
+# =============================================================================
+
+def _validate_strict(validator: SQLValidator, sql: str) -> ValidationResult:
+    return validator.validate(sql, strict=True)
+
+
+def _validate_lenient(validator: SQLValidator, sql: str) -> ValidationResult:
+    return validator.validate(sql, strict=False)
+
+
+def _issue_codes(result: ValidationResult) -> List[str]:
+    return [e.code for e in result.errors + result.warnings]
+
+
 # =============================================================================
 # CLI for testing
 # =============================================================================
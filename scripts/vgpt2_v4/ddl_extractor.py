@@ -8,12 +8,17 @@ Extracts CREATE TABLE statements from VGPT2 metadata for use in
 schema-in-prompt training examples.
 """
 
-import json
 import logging
+import sys
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Dict, List, Optional, Set
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from vgpt2_fuzzy import NameIndex, table_index
+from vgpt2_schema import SchemaSnapshot, load_metadata_schema
+
 logger = logging.getLogger(__name__)
 
 
@@ -117,25 +122,24 @@ class DDLExtractor:
         self.vgpt2_path = Path(vgpt2_path)
         self.metadata_dir = self.vgpt2_path / "Viewpoint_Database" / "_Metadata"
         
-        # Caches
+        # Compiled schema snapshot and materialized tables
+        self._schema: Optional[SchemaSnapshot] = None
         self._tables: Dict[str, TableInfo] = {}
         self._columns_loaded = False
-        self._fk_loaded = False
         
         logger.info(f"DDLExtractor initialized with path: {vgpt2_path}")
     
     def load_all(self) -> None:
-        """Load all metadata files."""
+        """Load the compiled schema snapshot (tables are materialized on demand)."""
         self._load_columns()
-        self._load_foreign_keys()
-        self._infer_primary_keys()
-        logger.info(f"Loaded {len(self._tables)} tables")
+        if self._schema is not None:
+            logger.info(f"Loaded {self._schema.num_column_tables} tables")
     
     def get_table(self, table_name: str) -> Optional[TableInfo]:
         """Get table info by name."""
         if not self._columns_loaded:
             self._load_columns()
-        return self._tables.get(table_name.upper()) or self._tables.get(table_name)
+        return self._build_table(table_name.upper()) or self._build_table(table_name)
     
     def get_tables(self, table_names: List[str]) -> List[TableInfo]:
         """Get multiple tables by name."""
@@ -164,102 +168,81 @@ class DDLExtractor:
         """Get list of all available table names."""
         if not self._columns_loaded:
             self._load_columns()
-        return sorted(self._tables.keys())
+        return sorted(self._table_names())
+    
+    def get_table_index(self) -> Optional[NameIndex]:
+        """Fuzzy index over all table/view names (for suggestions and near-miss fakes)."""
+        if not self._columns_loaded:
+            self._load_columns()
+        return table_index(self._schema) if self._schema is not None else None
     
     def get_tables_by_module(self, module: str) -> List[str]:
         """Get tables belonging to a specific module."""
         if not self._columns_loaded:
             self._load_columns()
         return [
-            name for name, table in self._tables.items()
-            if table.module.upper() == module.upper()
+            name for name in self._table_names()
+            if self._get_module(name).upper() == module.upper()
         ]
     
     def _load_columns(self) -> None:
-        """Load columns.json and build table structures."""
-        columns_file = self.metadata_dir / "columns.json"
-        
-        if not columns_file.exists():
-            logger.warning(f"columns.json not found at {columns_file}")
-            return
-        
-        logger.info(f"Loading columns from {columns_file}")
-        
-        with open(columns_file, "r", encoding="utf-8") as f:
-            columns_data = json.load(f)
-        
-        # Group columns by table
-        # VGPT2 columns.json uses: ObjectName, ColumnName, DataType, SchemaName, Module, etc.
-        # NOTE: In Vista, main data objects like ARTH, ARCM, APTD are VIEWS, not tables!
-        # We include both tables and views for SQL training purposes.
-        for col_data in columns_data:
-            table_name = col_data.get("ObjectName", "")
-            if not table_name:
-                continue
-            
-            # Include both Tables and Views (Vista's main objects are views)
-            obj_type = col_data.get("ObjectType", "Table").lower()
-            if obj_type not in ("table", "view"):
-                continue
-            
-            # Create table if not exists
-            if table_name not in self._tables:
-                self._tables[table_name] = TableInfo(
-                    name=table_name,
-                    schema=col_data.get("SchemaName", "dbo"),
-                    module=col_data.get("Module", self._infer_module(table_name))
-                )
-            
-            # Parse max_length - handle string values
-            max_length = col_data.get("MaxLength")
-            if isinstance(max_length, str):
-                max_length = int(max_length) if max_length.isdigit() else None
-            
-            # Parse precision
-            precision = col_data.get("Precision")
-            if isinstance(precision, str):
-                precision = int(precision) if precision.isdigit() else None
-            
-            # Parse scale
-            scale = col_data.get("Scale")
-            if isinstance(scale, str):
-                scale = int(scale) if scale.isdigit() else None
-            
-            # Add column
-            col = ColumnInfo(
-                name=col_data.get("ColumnName", ""),
-                data_type=col_data.get("DataType", ""),
-                is_nullable=col_data.get("IsNullable", "True") in ("True", "true", True, "YES", "1"),
-                max_length=max_length,
-                precision=precision,
-                scale=scale,
-            )
-            self._tables[table_name].columns.append(col)
-        
+        """Load the schema snapshot compiled from columns.json and foreign_keys.json."""
+        self._schema = load_metadata_schema(self.metadata_dir)
         self._columns_loaded = True
-        logger.info(f"Loaded columns for {len(self._tables)} tables")
     
-    def _load_foreign_keys(self) -> None:
-        """Load foreign_keys.json."""
-        fk_file = self.metadata_dir / "foreign_keys.json"
-        
-        if not fk_file.exists():
-            logger.warning(f"foreign_keys.json not found at {fk_file}")
-            return
-        
-        logger.info(f"Loading foreign keys from {fk_file}")
-        
-        with open(fk_file, "r", encoding="utf-8") as f:
-            fk_data = json.load(f)
+    def _table_names(self) -> List[str]:
+        """Names of all tables and views (Vista's main data objects like ARTH, ARCM, APTD are VIEWS)."""
+        if self._schema is None:
+            return []
+        return [name for name in self._schema.table_names() if self._get_object_type(name) in ("table", "view")]
+    
+    def _get_object_type(self, table_name: str) -> str:
+        return (self._schema.table_attributes(table_name)["object_type"] or "Table").lower()
+    
+    def _get_module(self, table_name: str) -> str:
+        return self._schema.table_attributes(table_name)["module"] or self._infer_module(table_name)
+    
+    def _build_table(self, table_name: str) -> Optional[TableInfo]:
+        """Materialize one table (columns, foreign keys, primary keys) from the snapshot."""
+        if table_name in self._tables:
+            return self._tables[table_name]
+        if self._schema is None or not self._schema.has_table(table_name):
+            return None
+        if self._get_object_type(table_name) not in ("table", "view"):
+            return None
         
-        for fk in fk_data:
-            parent_table = fk.get("ParentTable", "")
-            if parent_table in self._tables:
-                self._tables[parent_table].foreign_keys.append(fk)
+        table = TableInfo(
+            name=table_name,
+            schema=self._schema.table_attributes(table_name)["schema_name"] or "dbo",
+            module=self._get_module(table_name)
+        )
+        table.columns = [
+            ColumnInfo(
+                name=col.name,
+                data_type=col.data_type,
+                is_nullable=col.is_nullable is not False,
+                max_length=col.max_length,
+                precision=col.precision,
+                scale=col.scale,
+            )
+            for col in self._schema.columns(table_name)
+        ]
+        table.foreign_keys = [
+            {
+                "ParentTable": fk.parent_table,
+                "ParentColumns": list(fk.parent_columns),
+                "ReferencedTable": fk.referenced_table,
+                "ReferencedColumns": list(fk.referenced_columns),
+                "ConstraintName": fk.constraint_name,
+            }
+            for fk in self._schema.foreign_keys(table_name) if fk.parent_table == table_name
+        ]
+        self._infer_primary_keys(table)
         
-        self._fk_loaded = True
+        self._tables[table_name] = table
+        return table
     
-    def _infer_primary_keys(self) -> None:
+    def _infer_primary_keys(self, table: TableInfo) -> None:
         """
         Infer primary keys from Vista naming conventions.
         
@@ -268,46 +251,46 @@ class DDLExtractor:
         - Mth (for transactional tables)
         - {Table}Trans or KeyID
         """
-        for table_name, table in self._tables.items():
-            pk_candidates = []
-            col_names = {c.name.upper(): c.name for c in table.columns}
-            
-            # Check for common PK patterns
-            module = table.module.upper() if table.module else ""
-            
-            # Company columns
-            co_patterns = [f"{module}Co", "Co", "HQCo", "GLCo"]
-            for pattern in co_patterns:
-                if pattern.upper() in col_names:
-                    pk_candidates.append(col_names[pattern.upper()])
-                    break
-            
-            # Month column (transactional tables)
-            if "MTH" in col_names:
-                pk_candidates.append(col_names["MTH"])
-            
-            # Transaction ID patterns
-            trans_patterns = [
-                f"{table_name}Trans",
-                f"{module}Trans",
-                "Trans",
-                "KeyID",
-                f"{table_name}Id",
-            ]
-            for pattern in trans_patterns:
+        table_name = table.name
+        pk_candidates = []
+        col_names = {c.name.upper(): c.name for c in table.columns}
+        
+        # Check for common PK patterns
+        module = table.module.upper() if table.module else ""
+        
+        # Company columns
+        co_patterns = [f"{module}Co", "Co", "HQCo", "GLCo"]
+        for pattern in co_patterns:
+            if pattern.upper() in col_names:
+                pk_candidates.append(col_names[pattern.upper()])
+                break
+        
+        # Month column (transactional tables)
+        if "MTH" in col_names:
+            pk_candidates.append(col_names["MTH"])
+        
+        # Transaction ID patterns
+        trans_patterns = [
+            f"{table_name}Trans",
+            f"{module}Trans",
+            "Trans",
+            "KeyID",
+            f"{table_name}Id",
+        ]
+        for pattern in trans_patterns:
+            if pattern.upper() in col_names:
+                pk_candidates.append(col_names[pattern.upper()])
+                break
+        
+        # Line number for detail tables
+        if table_name.endswith("L") or "Line" in table_name:
+            line_patterns = [f"{module}Line", "Line", "APLine", "ARLine", "SLItem"]
+            for pattern in line_patterns:
                 if pattern.upper() in col_names:
                     pk_candidates.append(col_names[pattern.upper()])
                     break
-            
-            # Line number for detail tables
-            if table_name.endswith("L") or "Line" in table_name:
-                line_patterns = [f"{module}Line", "Line", "APLine", "ARLine", "SLItem"]
-                for pattern in line_patterns:
-                    if pattern.upper() in col_names:
-                        pk_candidates.append(col_names[pattern.upper()])
-                        break
-            
-            table.primary_keys = pk_candidates
+        
+        table.primary_keys = pk_candidates
     
     def _infer_module(self, table_name: str) -> str:
         """Infer module from table name prefix."""
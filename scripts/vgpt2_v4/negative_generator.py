@@ -9,6 +9,9 @@ These teach the model to:
 1. Reject queries for non-existent tables
 2. Reject queries for tables not in the provided schema
 3. Suggest correct alternatives when possible
+
+Besides the curated FAKE_TABLES, near-miss names (one edit away from a real
+table, e.g. APHT for APTH) are synthesized from the schema's fuzzy name index.
 """
 
 import logging
@@ -258,7 +261,7 @@ class NegativeExampleGenerator:
     Generate negative examples for hallucination prevention.
     
     Types of negative examples:
-    1. Fake table rejection - "ARAgingReport does not exist"
+    1. Fake table rejection - "ARAgingReport does not exist", "APHT does not exist, did you mean APTH?"
     2. Missing table in schema - "The requested table is not in the provided schema"
     3. Partial schema - Query asks about tables not included in DDL
     """
@@ -339,6 +342,55 @@ class NegativeExampleGenerator:
                     tables_used=[]
                 ))
         
+        # Fill the rest with near-miss names of real tables
+        if len(examples) < count:
+            examples.extend(self._generate_near_miss_examples(count - len(examples), question_templates))
+        
+        return examples
+    
+    def _generate_near_miss_examples(self, count: int, question_templates: List[str]) -> List[TrainingExample]:
+        """Generate examples for misspelled real tables (e.g. APHT instead of APTH)."""
+        index = self.ddl.get_table_index()
+        table_names = [name for name in self.ddl.get_all_table_names() if len(name) >= 4]
+        if index is None or not table_names:
+            return []
+        
+        # Synthesize all fakes first, then rank their suggestions in one batch
+        fakes: Dict[str, str] = {}
+        for source in random.choices(table_names, k=count * 2):
+            for fake_name in index.near_misses(source, 1):
+                fakes.setdefault(fake_name, source)
+            if len(fakes) >= count:
+                break
+        suggestions = index.suggest_many(fakes, k=4)
+        
+        examples = []
+        for fake_name, source in fakes.items():
+            similar = [name for name in suggestions[fake_name] if name != source][:3]
+            explanation = f"Did you mean {source}? Vista table names must match exactly."
+            if similar:
+                explanation += f" Other similar tables: {', '.join(similar)}."
+            fake = FakeTableDefinition(
+                name=fake_name,
+                description=f"Misspelling of {source}",
+                correct_alternative=source,
+                correct_explanation=explanation
+            )
+            
+            instruction = self.config.user_prompt_template.format(
+                question=random.choice(question_templates).format(table=fake_name),
+                ddl_statements=self.ddl.get_ddl([source] + similar[:1])
+            )
+            
+            examples.append(TrainingExample(
+                instruction=instruction,
+                input="",
+                output=self._format_rejection_response(fake),
+                category=TrainingCategory.NEGATIVE.value,
+                complexity="basic",
+                tables_used=[]
+            ))
+        
         return examples
     
     def _generate_schema_mismatch_examples(self, count: int) -> List[TrainingExample]:
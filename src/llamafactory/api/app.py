@@ -19,6 +19,7 @@ from functools import partial
 from typing import Annotated
 
 from ..chat import ChatModel
+from ..chat.metrics import REGISTRY
 from ..extras.constants import EngineName
 from ..extras.misc import torch_gc
 from ..extras.packages import is_fastapi_available, is_starlette_available, is_uvicorn_available
@@ -27,6 +28,7 @@ from .chat import (
     create_score_evaluation_response,
     create_stream_chat_completion_response,
 )
+from .media import get_media_fetcher
 from .protocol import (
     ChatCompletionRequest,
     ChatCompletionResponse,
@@ -35,11 +37,13 @@ from .protocol import (
     ScoreEvaluationRequest,
     ScoreEvaluationResponse,
 )
+from .response_cache import get_engine_fingerprint, get_response_cache
 
 
 if is_fastapi_available():
     from fastapi import Depends, FastAPI, HTTPException, status
     from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import PlainTextResponse
     from fastapi.security.http import HTTPAuthorizationCredentials, HTTPBearer
 
 
@@ -63,6 +67,10 @@ async def lifespan(app: "FastAPI", chat_model: "ChatModel"):  # collects GPU mem
         asyncio.create_task(sweeper())
 
     yield
+    await get_media_fetcher().aclose()
+    if get_response_cache() is not None:
+        get_response_cache().close()
+
     torch_gc()
 
 
@@ -76,6 +84,9 @@ def create_app(chat_model: "ChatModel") -> "FastAPI":
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    if get_response_cache() is not None:  # fingerprint the checkpoints as they were loaded
+        get_engine_fingerprint(chat_model.engine)
+
     api_key = os.getenv("API_KEY")
     security = HTTPBearer(auto_error=False)
 
@@ -90,8 +101,21 @@ def create_app(chat_model: "ChatModel") -> "FastAPI":
         dependencies=[Depends(verify_api_key)],
     )
     async def list_models():
-        model_card = ModelCard(id=os.getenv("API_MODEL_NAME", "gpt-3.5-turbo"))
-        return ModelList(data=[model_card])
+        model_cards = [ModelCard(id=os.getenv("API_MODEL_NAME", "gpt-3.5-turbo"))]
+        adapter_registry = getattr(chat_model.engine, "adapter_registry", None)
+        if adapter_registry is not None:  # the served adapters are selected by the model name
+            model_cards.extend(ModelCard(id=name) for name in adapter_registry.adapters)
+
+        return ModelList(data=model_cards)
+
+    @app.get(
+        "/metrics",
+        response_class=PlainTextResponse,
+        status_code=status.HTTP_200_OK,
+        dependencies=[Depends(verify_api_key)],
+    )
+    async def get_metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
     @app.post(
         "/v1/chat/completions",
@@ -12,21 +12,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import base64
-import io
+import asyncio
 import json
-import os
-import re
 import uuid
 from collections.abc import AsyncGenerator
-from typing import TYPE_CHECKING, Optional
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any, Optional
 
+from ..chat.base_engine import Response
 from ..data import Role as DataRole
 from ..extras import logging
 from ..extras.constants import AUDIO_PLACEHOLDER, IMAGE_PLACEHOLDER, VIDEO_PLACEHOLDER
 from ..extras.misc import is_env_enabled
-from ..extras.packages import is_fastapi_available, is_pillow_available, is_requests_available
-from .common import check_lfi_path, check_ssrf_url, dictify, jsonify
+from ..extras.packages import is_fastapi_available
+from .common import dictify, jsonify
+from .media import get_media_fetcher
 from .protocol import (
     ChatCompletionMessage,
     ChatCompletionResponse,
@@ -40,20 +40,13 @@ from .protocol import (
     Role,
     ScoreEvaluationResponse,
 )
+from .response_cache import get_cache_key, get_response_cache
 
 
 if is_fastapi_available():
     from fastapi import HTTPException, status
 
 
-if is_pillow_available():
-    from PIL import Image
-
-
-if is_requests_available():
-    import requests
-
-
 if TYPE_CHECKING:
     from ..chat import ChatModel
     from ..data.mm_plugin import AudioInput, ImageInput, VideoInput
@@ -70,7 +63,7 @@ ROLE_MAPPING = {
 }
 
 
-def _process_request(
+async def _process_request(
     request: "ChatCompletionRequest",
 ) -> tuple[
     list[dict[str, str]],
@@ -96,7 +89,7 @@ def _process_request(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only supports u/a/u/a/u...")
 
     input_messages = []
-    images, videos, audios = [], [], []
+    image_urls, video_urls, audio_urls = [], [], []
     for i, message in enumerate(request.messages):
         if i % 2 == 0 and message.role not in [Role.USER, Role.TOOL]:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid role")
@@ -117,43 +110,13 @@ def _process_request(
                     text_content += input_item.text
                 elif input_item.type == "image_url":
                     text_content += IMAGE_PLACEHOLDER
-                    image_url = input_item.image_url.url
-                    if re.match(r"^data:image\/(png|jpg|jpeg|gif|bmp);base64,(.+)$", image_url):  # base64 image
-                        image_stream = io.BytesIO(base64.b64decode(image_url.split(",", maxsplit=1)[1]))
-                    elif os.path.isfile(image_url):  # local file
-                        check_lfi_path(image_url)
-                        image_stream = open(image_url, "rb")
-                    else:  # web uri
-                        check_ssrf_url(image_url)
-                        image_stream = requests.get(image_url, stream=True).raw
-
-                    images.append(Image.open(image_stream).convert("RGB"))
+                    image_urls.append(input_item.image_url.url)
                 elif input_item.type == "video_url":
                     text_content += VIDEO_PLACEHOLDER
-                    video_url = input_item.video_url.url
-                    if re.match(r"^data:video\/(mp4|mkv|avi|mov);base64,(.+)$", video_url):  # base64 video
-                        video_stream = io.BytesIO(base64.b64decode(video_url.split(",", maxsplit=1)[1]))
-                    elif os.path.isfile(video_url):  # local file
-                        check_lfi_path(video_url)
-                        video_stream = video_url
-                    else:  # web uri
-                        check_ssrf_url(video_url)
-                        video_stream = requests.get(video_url, stream=True).raw
-
-                    videos.append(video_stream)
+                    video_urls.append(input_item.video_url.url)
                 elif input_item.type == "audio_url":
                     text_content += AUDIO_PLACEHOLDER
-                    audio_url = input_item.audio_url.url
-                    if re.match(r"^data:audio\/(mpeg|mp3|wav|ogg);base64,(.+)$", audio_url):  # base64 audio
-                        audio_stream = io.BytesIO(base64.b64decode(audio_url.split(",", maxsplit=1)[1]))
-                    elif os.path.isfile(audio_url):  # local file
-                        check_lfi_path(audio_url)
-                        audio_stream = audio_url
-                    else:  # web uri
-                        check_ssrf_url(audio_url)
-                        audio_stream = requests.get(audio_url, stream=True).raw
-
-                    audios.append(audio_stream)
+                    audio_urls.append(input_item.audio_url.url)
                 else:
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid input type {input_item.type}."
@@ -172,7 +135,33 @@ def _process_request(
     else:
         tools = None
 
-    return input_messages, system, tools, images or None, videos or None, audios or None
+    media_fetcher = get_media_fetcher()  # resolve the media concurrently without blocking the event loop
+    images, videos, audios = await asyncio.gather(
+        asyncio.gather(*(media_fetcher.load_image(url) for url in image_urls)),
+        asyncio.gather(*(media_fetcher.load_video(url) for url in video_urls)),
+        asyncio.gather(*(media_fetcher.load_audio(url) for url in audio_urls)),
+    )
+    return input_messages, system, tools, list(images) or None, list(videos) or None, list(audios) or None
+
+
+async def _lookup_response_cache(
+    request: "ChatCompletionRequest",
+    chat_model: "ChatModel",
+    messages: list[dict[str, str]],
+    system: Optional[str],
+    tools: Optional[str],
+    has_media: bool,
+) -> tuple[Optional[str], Optional[Any]]:
+    r"""Return the cache key and the cached value of the request, the key is None if the request is not cacheable."""
+    response_cache = get_response_cache()
+    if response_cache is None or has_media:
+        return None, None
+
+    cache_key = await asyncio.to_thread(get_cache_key, request, chat_model, messages, system, tools)
+    if cache_key is None:
+        return None, None
+
+    return cache_key, await asyncio.to_thread(response_cache.get, cache_key)
 
 
 def _create_stream_chat_completion_chunk(
@@ -191,22 +180,30 @@ async def create_chat_completion_response(
     request: "ChatCompletionRequest", chat_model: "ChatModel"
 ) -> "ChatCompletionResponse":
     completion_id = f"chatcmpl-{uuid.uuid4().hex}"
-    input_messages, system, tools, images, videos, audios = _process_request(request)
-    responses = await chat_model.achat(
-        input_messages,
-        system,
-        tools,
-        images,
-        videos,
-        audios,
-        do_sample=request.do_sample,
-        temperature=request.temperature,
-        top_p=request.top_p,
-        max_new_tokens=request.max_tokens,
-        num_return_sequences=request.n,
-        repetition_penalty=request.presence_penalty,
-        stop=request.stop,
-    )
+    input_messages, system, tools, images, videos, audios = await _process_request(request)
+    has_media = any(inputs is not None for inputs in (images, videos, audios))
+    cache_key, cached = await _lookup_response_cache(request, chat_model, input_messages, system, tools, has_media)
+    if cached is not None:
+        responses = [Response(**response) for response in cached]
+    else:
+        responses = await chat_model.achat(
+            input_messages,
+            system,
+            tools,
+            images,
+            videos,
+            audios,
+            adapter=request.model,
+            do_sample=request.do_sample,
+            temperature=request.temperature,
+            top_p=request.top_p,
+            max_new_tokens=request.max_tokens,
+            num_return_sequences=request.n,
+            repetition_penalty=request.presence_penalty,
+            stop=request.stop,
+        )
+        if cache_key is not None:
+            await asyncio.to_thread(get_response_cache().put, cache_key, [asdict(response) for response in responses])
 
     prompt_length, response_length = 0, 0
     choices = []
@@ -245,34 +242,48 @@ async def create_stream_chat_completion_response(
     request: "ChatCompletionRequest", chat_model: "ChatModel"
 ) -> AsyncGenerator[str, None]:
     completion_id = f"chatcmpl-{uuid.uuid4().hex}"
-    input_messages, system, tools, images, videos, audios = _process_request(request)
+    input_messages, system, tools, images, videos, audios = await _process_request(request)
     if tools:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot stream function calls.")
 
     if request.n > 1:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot stream multiple responses.")
 
+    has_media = any(inputs is not None for inputs in (images, videos, audios))
+    cache_key, cached = await _lookup_response_cache(request, chat_model, input_messages, system, tools, has_media)
     yield _create_stream_chat_completion_chunk(
         completion_id=completion_id, model=request.model, delta=ChatCompletionMessage(role=Role.ASSISTANT, content="")
     )
-    async for new_token in chat_model.astream_chat(
-        input_messages,
-        system,
-        tools,
-        images,
-        videos,
-        audios,
-        do_sample=request.do_sample,
-        temperature=request.temperature,
-        top_p=request.top_p,
-        max_new_tokens=request.max_tokens,
-        repetition_penalty=request.presence_penalty,
-        stop=request.stop,
-    ):
-        if len(new_token) != 0:
+    if cached is not None:  # replay the cached chunks
+        for new_token in cached:
             yield _create_stream_chat_completion_chunk(
                 completion_id=completion_id, model=request.model, delta=ChatCompletionMessage(content=new_token)
             )
+    else:
+        new_tokens = []
+        async for new_token in chat_model.astream_chat(
+            input_messages,
+            system,
+            tools,
+            images,
+            videos,
+            audios,
+            adapter=request.model,
+            do_sample=request.do_sample,
+            temperature=request.temperature,
+            top_p=request.top_p,
+            max_new_tokens=request.max_tokens,
+            repetition_penalty=request.presence_penalty,
+            stop=request.stop,
+        ):
+            if len(new_token) != 0:
+                new_tokens.append(new_token)
+                yield _create_stream_chat_completion_chunk(
+                    completion_id=completion_id, model=request.model, delta=ChatCompletionMessage(content=new_token)
+                )
+
+        if cache_key is not None:  # only the finished streams are cached
+            await asyncio.to_thread(get_response_cache().put, cache_key, new_tokens)
 
     yield _create_stream_chat_completion_chunk(
         completion_id=completion_id, model=request.model, delta=ChatCompletionMessage(), finish_reason=Finish.STOP
@@ -0,0 +1,160 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import base64
+import hashlib
+import io
+import os
+import re
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+import httpx
+
+from ..extras.packages import is_fastapi_available, is_pillow_available
+from .common import check_lfi_path, check_ssrf_url
+
+
+if is_fastapi_available():
+    from fastapi import HTTPException, status
+
+
+if is_pillow_available():
+    from PIL import Image
+
+
+if TYPE_CHECKING:
+    from PIL.Image import Image as ImageObject
+
+
+MEDIA_MAX_CONNECTIONS = int(os.getenv("MEDIA_MAX_CONNECTIONS", "16"))
+MEDIA_CACHE_SIZE = int(os.getenv("MEDIA_CACHE_SIZE", "256"))
+BASE64_PATTERNS = {
+    "image": r"^data:image\/(png|jpg|jpeg|gif|bmp);base64,(.+)$",
+    "video": r"^data:video\/(mp4|mkv|avi|mov);base64,(.+)$",
+    "audio": r"^data:audio\/(mpeg|mp3|wav|ogg);base64,(.+)$",
+}
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _decode_image(content: bytes) -> "ImageObject":
+    return Image.open(io.BytesIO(content)).convert("RGB")
+
+
+class MediaFetcher:
+    r"""Resolve the media urls of the requests without blocking the event loop.
+
+    The web resources are downloaded by a pooled async client with bounded concurrency, the images are
+    decoded in the thread pool and kept in an LRU cache keyed by the content hash, so that repeated
+    references to the same asset skip both the download and the decoding. The cached images are shared
+    between the requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_connections: int = MEDIA_MAX_CONNECTIONS, cache_size: int = MEDIA_CACHE_SIZE) -> None:
+        self.max_connections = max_connections
+        self.cache_size = cache_size
+        self.url_to_hash: OrderedDict[str, str] = OrderedDict()
+        self.image_cache: OrderedDict[str, ImageObject] = OrderedDict()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:  # create in the running event loop
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections),
+                timeout=httpx.Timeout(60.0, connect=10.0),
+                follow_redirects=True,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+
+        return self._client
+
+    async def fetch(self, url: str, media_type: str) -> bytes:
+        r"""Get the raw bytes of a base64 data url, a local file or a web uri."""
+        if re.match(BASE64_PATTERNS[media_type], url):
+            return await asyncio.to_thread(base64.b64decode, url.split(",", maxsplit=1)[1])
+        elif os.path.isfile(url):
+            check_lfi_path(url)
+            return await asyncio.to_thread(_read_file, url)
+
+        await asyncio.to_thread(check_ssrf_url, url)  # resolves the hostname
+        client = self._get_client()
+        async with self._semaphore:
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Failed to fetch {url}: {e}")
+
+            return response.content
+
+    def _put_cache(self, cache: OrderedDict, key: str, value: Any) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    async def load_image(self, url: str) -> "ImageObject":
+        is_web_uri = url.startswith(("http://", "https://"))
+        content_hash = self.url_to_hash.get(url) if is_web_uri else None
+        if content_hash is not None and content_hash in self.image_cache:
+            self.image_cache.move_to_end(content_hash)
+            return self.image_cache[content_hash]
+
+        content = await self.fetch(url, "image")
+        content_hash = hashlib.sha256(content).hexdigest()
+        if is_web_uri:
+            self._put_cache(self.url_to_hash, url, content_hash)
+
+        image = self.image_cache.get(content_hash)
+        if image is None:
+            image = await asyncio.to_thread(_decode_image, content)
+
+        self._put_cache(self.image_cache, content_hash, image)
+        return image
+
+    async def load_video(self, url: str) -> Union["io.BytesIO", str]:
+        if not re.match(BASE64_PATTERNS["video"], url) and os.path.isfile(url):
+            check_lfi_path(url)
+            return url  # decoded by the multimodal plugin
+
+        return io.BytesIO(await self.fetch(url, "video"))
+
+    async def load_audio(self, url: str) -> Union["io.BytesIO", str]:
+        if not re.match(BASE64_PATTERNS["audio"], url) and os.path.isfile(url):
+            check_lfi_path(url)
+            return url  # decoded by the multimodal plugin
+
+        return io.BytesIO(await self.fetch(url, "audio"))
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_media_fetcher: Optional[MediaFetcher] = None
+
+
+def get_media_fetcher() -> "MediaFetcher":
+    global _media_fetcher
+    if _media_fetcher is None:
+        _media_fetcher = MediaFetcher()
+
+    return _media_fetcher
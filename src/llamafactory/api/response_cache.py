@@ -0,0 +1,239 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Optional
+from weakref import WeakKeyDictionary
+
+from ..chat.metrics import REGISTRY
+from ..extras.constants import EngineName
+
+
+if TYPE_CHECKING:
+    from ..chat import ChatModel
+    from ..chat.base_engine import BaseEngine
+    from .protocol import ChatCompletionRequest
+
+
+RESPONSE_CACHE_SIZE = float(os.getenv("RESPONSE_CACHE_SIZE", "0"))  # MB in memory
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR")
+RESPONSE_CACHE_DISK_SIZE = float(os.getenv("RESPONSE_CACHE_DISK_SIZE", "1024"))  # MB on disk
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))  # seconds, 0 means no expiration
+RESPONSE_CACHE_REQUESTS = REGISTRY.counter(
+    "llamafactory_response_cache_requests_total", "Number of lookups of the response cache.", ("result",)
+)
+
+
+class ResponseCache:
+    r"""Exact-match cache of the deterministic chat completions.
+
+    The entries are JSON-serialized and kept in an in-memory LRU, optionally backed by a SQLite file that
+    survives restarts. Both tiers are bounded by their sizes in bytes and the entries expire after the TTL.
+    """
+
+    def __init__(
+        self,
+        max_size: float,
+        ttl: float,
+        cache_dir: Optional[str] = None,
+        max_disk_size: float = 1024.0,
+    ) -> None:
+        self.max_size = int(max_size * 1024**2)
+        self.ttl = ttl
+        self.max_disk_size = int(max_disk_size * 1024**2)
+        self.memory: OrderedDict[str, tuple[float, bytes]] = OrderedDict()  # key -> (creation time, value)
+        self.size = 0
+        self.lock = Lock()
+        self.db: Optional[sqlite3.Connection] = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.db = sqlite3.connect(os.path.join(cache_dir, "response_cache.sqlite"), check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, created REAL, accessed REAL, size INTEGER, value BLOB)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self.db.commit()
+
+    def _is_expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _put_memory(self, key: str, created: float, value: bytes) -> None:
+        if key in self.memory:
+            self.size -= len(self.memory.pop(key)[1])
+
+        if len(value) > self.max_size:
+            return
+
+        self.memory[key] = (created, value)
+        self.size += len(value)
+        while self.size > self.max_size:
+            self.size -= len(self.memory.popitem(last=False)[1][1])
+
+    def get(self, key: str) -> Optional[Any]:
+        r"""Return the cached value, or None if it is missing or expired. May block on the disk."""
+        with self.lock:
+            if key in self.memory:
+                created, value = self.memory[key]
+                if not self._is_expired(created):
+                    self.memory.move_to_end(key)
+                    RESPONSE_CACHE_REQUESTS.inc(result="hit")
+                    return json.loads(value)
+
+                self.size -= len(self.memory.pop(key)[1])
+
+            if self.db is not None:
+                row = self.db.execute("SELECT created, value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._is_expired(row[0]):
+                    self.db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self.db.commit()
+                    self._put_memory(key, row[0], row[1])
+                    RESPONSE_CACHE_REQUESTS.inc(result="hit")
+                    return json.loads(row[1])
+                elif row is not None:
+                    self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self.db.commit()
+
+        RESPONSE_CACHE_REQUESTS.inc(result="miss")
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        r"""Store a JSON-serializable value. May block on the disk."""
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        created = time.time()
+        with self.lock:
+            self._put_memory(key, created, data)
+            if self.db is not None and len(data) <= self.max_disk_size:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (key, created, created, len(data), data)
+                )
+                disk_size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                for old_key, size in self.db.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+                    if disk_size <= self.max_disk_size:
+                        break
+
+                    self.db.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                    disk_size -= size
+
+                self.db.commit()
+
+    def get_stats(self) -> dict[str, Any]:
+        r"""Return the number of entries and the memory usage."""
+        return {"entries": len(self.memory), "size_bytes": self.size}
+
+    def close(self) -> None:
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+_engine_fingerprints: "WeakKeyDictionary[BaseEngine, dict[str, Any]]" = WeakKeyDictionary()
+
+
+def _get_fingerprint(path: Optional[str]) -> Optional[str]:
+    r"""Identify a local checkpoint by its modification time, so that overwritten checkpoints miss the cache."""
+    if path is None or not os.path.isdir(path):
+        return path
+
+    mtimes = [os.path.getmtime(os.path.join(path, name)) for name in os.listdir(path)]
+    return f"{os.path.abspath(path)}@{max(mtimes, default=0.0)}"
+
+
+def get_engine_fingerprint(engine: "BaseEngine") -> dict[str, Any]:
+    r"""Fingerprint the checkpoints of the engine once per load, so that the entries match the weights in memory.
+
+    A checkpoint overwritten while serving is still running the old weights, it misses the cache after a reload.
+    """
+    if engine not in _engine_fingerprints:
+        model_args = engine.model_args
+        _engine_fingerprints[engine] = {
+            "model": _get_fingerprint(model_args.model_name_or_path),
+            "adapters": [_get_fingerprint(path) for path in model_args.adapter_name_or_path or []],
+            "served_adapters": {
+                name: _get_fingerprint(path) for name, path in (model_args.served_adapters or {}).items()
+            },
+        }
+
+    return _engine_fingerprints[engine]
+
+
+def _is_deterministic(request: "ChatCompletionRequest", chat_model: "ChatModel") -> bool:
+    if request.n > 1:
+        return False
+
+    generating_args = chat_model.engine.generating_args
+    temperature = request.temperature if request.temperature is not None else generating_args.get("temperature")
+    if not temperature:
+        return True
+
+    do_sample = request.do_sample if request.do_sample is not None else generating_args.get("do_sample")
+    return chat_model.engine.name == EngineName.HF and not do_sample  # the others sample by the temperature only
+
+
+def get_cache_key(
+    request: "ChatCompletionRequest",
+    chat_model: "ChatModel",
+    messages: list[dict[str, str]],
+    system: Optional[str] = None,
+    tools: Optional[str] = None,
+) -> Optional[str]:
+    r"""Return the cache key of a text-only deterministic request, or None if the request is not cacheable.
+
+    The key covers the model and adapter checkpoints, the rendered prompt token ids and the generation params.
+    """
+    if not _is_deterministic(request, chat_model):
+        return None
+
+    engine = chat_model.engine
+    fingerprint = get_engine_fingerprint(engine)
+    paired_messages = messages + [{"role": "assistant", "content": ""}]
+    prompt_ids, _ = engine.template.encode_oneturn(engine.tokenizer, paired_messages, system, tools)
+    identity = {
+        "engine": str(engine.name),
+        "model": fingerprint["model"],
+        "adapters": fingerprint["adapters"],
+        "served_adapter": fingerprint["served_adapters"].get(request.model),
+        "prompt_ids": prompt_ids,
+        "generating_args": engine.generating_args,
+        "params": {
+            "temperature": request.temperature,
+            "top_p": request.top_p,
+            "max_tokens": request.max_tokens,
+            "presence_penalty": request.presence_penalty,
+            "stop": request.stop,
+            "stream": request.stream,  # streams replay the chunks, the others need the finish reasons
+        },
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional["ResponseCache"]:
+    r"""Return the shared response cache, or None if it is disabled."""
+    global _response_cache
+    if _response_cache is None and (RESPONSE_CACHE_SIZE > 0 or RESPONSE_CACHE_DIR is not None):
+        _response_cache = ResponseCache(
+            RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_DIR, RESPONSE_CACHE_DISK_SIZE
+        )
+
+    return _response_cache
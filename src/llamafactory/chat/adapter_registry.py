@@ -0,0 +1,149 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from threading import Condition
+from typing import TYPE_CHECKING, Any, Optional
+
+from peft import PeftModel
+
+from ..extras import logging
+from .prefix_cache import generate_with_prefix_cache
+
+
+if TYPE_CHECKING:
+    from transformers import PreTrainedModel
+
+    from .prefix_cache import PrefixCache
+
+
+logger = logging.get_logger(__name__)
+
+
+class AdapterRegistry:
+    r"""Adapters served alongside the base model, addressed by the `model` field of the requests.
+
+    The Huggingface engine loads the adapters into the base model on their first request and switches the
+    active one between generations. The generations of the same adapter run concurrently, a switch waits
+    for the running ones to finish. The least recently used adapters are evicted when the number or the
+    memory footprint of the loaded adapters exceeds the limits. The vLLM engine only uses the adapter ids.
+    """
+
+    def __init__(self, adapters: dict[str, str], max_loaded: int, max_size: float = 0.0) -> None:
+        self.adapters = adapters
+        self.adapter_ids = {name: index for index, name in enumerate(adapters, start=2)}  # 1 is the startup adapter
+        self.max_loaded = max_loaded
+        self.max_size = int(max_size * 1024**3)
+        self.loaded: OrderedDict[str, int] = OrderedDict()  # adapter name -> size in bytes
+        self.size = 0
+        self.active: Optional[str] = None  # None stands for the base model
+        self.num_active = 0
+        self.num_waiting = 0
+        self.num_loads = 0
+        self.num_evictions = 0
+        self.condition = Condition()
+
+    def resolve(self, name: Optional[str]) -> Optional[str]:
+        r"""Return the adapter name if it is served, otherwise the request goes to the base model."""
+        return name if name in self.adapters else None
+
+    @staticmethod
+    def _get_adapter_size(model: "PreTrainedModel", name: str) -> int:
+        return sum(
+            param.numel() * param.element_size()
+            for param_name, param in model.named_parameters()
+            if f".{name}." in param_name
+        )
+
+    def _load(self, model: "PreTrainedModel", name: str) -> None:
+        while len(self.loaded) >= self.max_loaded:
+            self._evict(model, next(iter(self.loaded)))
+
+        model.load_adapter(self.adapters[name], adapter_name=name)
+        self.loaded[name] = self._get_adapter_size(model, name)
+        self.size += self.loaded[name]
+        self.num_loads += 1
+        logger.info_rank0(f"Loaded adapter {name} from {self.adapters[name]}.")
+        while self.max_size > 0 and self.size > self.max_size and len(self.loaded) > 1:
+            self._evict(model, next(iter(self.loaded)))
+
+    def _evict(self, model: "PreTrainedModel", name: str) -> None:
+        model.delete_adapter(name)
+        self.size -= self.loaded.pop(name)
+        self.num_evictions += 1
+        logger.info_rank0(f"Evicted adapter {name}.")
+
+    def _switch(self, model: "PreTrainedModel", name: Optional[str]) -> None:
+        if name is not None:
+            if name in self.loaded:
+                self.loaded.move_to_end(name)
+            else:
+                self._load(model, name)
+
+        if isinstance(model, PeftModel):  # the startup adapter is not merged, e.g., quantized models
+            model.set_adapter(name if name is not None else "default")
+        elif name is not None:
+            model.enable_adapters()
+            model.set_adapter(name)
+        elif self.loaded:
+            model.disable_adapters()
+
+        self.active = name
+
+    @contextmanager
+    def activate(self, model: "PreTrainedModel", name: Optional[str]) -> Iterator[None]:
+        r"""Hold the adapter active during the generation, which should be called in the worker thread."""
+        with self.condition:
+            if self.active != name or self.num_waiting > 0:  # do not starve the pending switches
+                self.num_waiting += 1
+                self.condition.wait_for(lambda: self.num_active == 0)
+                self.num_waiting -= 1
+                if self.active != name:
+                    self._switch(model, name)
+
+            self.num_active += 1
+
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.num_active -= 1
+                if self.num_active == 0:
+                    self.condition.notify_all()
+
+    def get_stats(self) -> dict[str, Any]:
+        r"""Return the loaded adapters and the memory usage."""
+        return {
+            "loaded": list(self.loaded.keys()),
+            "size_bytes": self.size,
+            "loads": self.num_loads,
+            "evictions": self.num_evictions,
+        }
+
+
+def generate_with_adapter(
+    model: "PreTrainedModel",
+    gen_kwargs: dict[str, Any],
+    prefix_cache: Optional["PrefixCache"] = None,
+    adapter_registry: Optional["AdapterRegistry"] = None,
+    adapter: Optional[str] = None,
+) -> Any:
+    r"""Call `model.generate` with the adapter activated, the prefix cache only holds the base model states."""
+    if adapter_registry is None:
+        return generate_with_prefix_cache(model, gen_kwargs, prefix_cache)
+
+    with adapter_registry.activate(model, adapter):
+        return generate_with_prefix_cache(model, gen_kwargs, prefix_cache if adapter is None else None)
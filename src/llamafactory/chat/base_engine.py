@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import time
 from abc import ABC, abstractmethod
 from collections.abc import AsyncGenerator
 from dataclasses import dataclass
@@ -36,6 +38,12 @@ class Response:
     finish_reason: Literal["stop", "length"]
 
 
+@dataclass
+class ChatResult:
+    responses: list[Response]
+    latency: float
+
+
 class BaseEngine(ABC):
     r"""Base class for inference engine of chat models.
 
@@ -48,6 +56,7 @@ class BaseEngine(ABC):
     can_generate: bool
     template: "Template"
     generating_args: dict[str, Any]
+    model_args: "ModelArguments"
 
     @abstractmethod
     def __init__(
@@ -96,3 +105,20 @@ class BaseEngine(ABC):
     ) -> list[float]:
         r"""Get a list of scores of the reward model."""
         ...
+
+    async def batch_chat(
+        self,
+        batch_inputs: list[dict[str, Any]],
+        **input_kwargs,
+    ) -> list["ChatResult"]:
+        r"""Get the responses of a batch of conversations, each input holds the arguments of `chat()`.
+
+        Runs the conversations concurrently by default, the engines may override it to generate in one batch.
+        """
+
+        async def _chat(inputs: dict[str, Any]) -> "ChatResult":
+            start_time = time.perf_counter()
+            responses = await self.chat(**inputs, **input_kwargs)
+            return ChatResult(responses=responses, latency=time.perf_counter() - start_time)
+
+        return list(await asyncio.gather(*(_chat(inputs) for inputs in batch_inputs)))
@@ -17,18 +17,29 @@
 
 import asyncio
 import os
+import time
 from collections.abc import AsyncGenerator, Generator
 from threading import Thread
-from typing import TYPE_CHECKING, Any, Optional
+from typing import TYPE_CHECKING, Any, Optional, Union
 
 from ..extras.constants import EngineName
 from ..extras.misc import torch_gc
 from ..hparams import get_infer_args
+from .metrics import (
+    COMPLETION_TOKENS,
+    E2E_LATENCY,
+    INTER_TOKEN_LATENCY,
+    PROMPT_TOKENS,
+    REQUESTS_IN_FLIGHT,
+    REQUESTS_TOTAL,
+    TIME_TO_FIRST_TOKEN,
+    get_engine_label,
+)
 
 
 if TYPE_CHECKING:
     from ..data.mm_plugin import AudioInput, ImageInput, VideoInput
-    from .base_engine import BaseEngine, Response
+    from .base_engine import BaseEngine, ChatResult, Response
 
 
 def _start_background_loop(loop: "asyncio.AbstractEventLoop") -> None:
@@ -115,7 +126,16 @@ class ChatModel:
         **input_kwargs,
     ) -> list["Response"]:
         r"""Asynchronously get a list of responses of the chat model."""
-        return await self.engine.chat(messages, system, tools, images, videos, audios, **input_kwargs)
+        engine = get_engine_label(self.engine.name)
+        start_time = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc(engine=engine)
+        try:
+            responses = await self.engine.chat(messages, system, tools, images, videos, audios, **input_kwargs)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(engine=engine)
+
+        self._record_responses(responses, time.perf_counter() - start_time, method="chat")
+        return responses
 
     def stream_chat(
         self,
@@ -147,10 +167,120 @@ class ChatModel:
         **input_kwargs,
     ) -> AsyncGenerator[str, None]:
         r"""Asynchronously get the response token-by-token of the chat model."""
-        async for new_token in self.engine.stream_chat(
-            messages, system, tools, images, videos, audios, **input_kwargs
-        ):
-            yield new_token
+        engine = get_engine_label(self.engine.name)
+        start_time = last_time = time.perf_counter()
+        chunks: list[str] = []
+        REQUESTS_IN_FLIGHT.inc(engine=engine)
+        try:
+            async for new_token in self.engine.stream_chat(
+                messages, system, tools, images, videos, audios, **input_kwargs
+            ):
+                current_time = time.perf_counter()
+                if len(chunks) == 0:
+                    TIME_TO_FIRST_TOKEN.observe(current_time - start_time, engine=engine)
+                else:
+                    INTER_TOKEN_LATENCY.observe(current_time - last_time, engine=engine)
+
+                last_time = current_time
+                chunks.append(new_token)
+                yield new_token
+        finally:
+            REQUESTS_IN_FLIGHT.dec(engine=engine)
+
+        E2E_LATENCY.observe(time.perf_counter() - start_time, engine=engine)
+        REQUESTS_TOTAL.inc(engine=engine, method="stream_chat")
+        prompt_length, response_length = await asyncio.to_thread(
+            self._get_stream_lengths, {"messages": messages, "system": system, "tools": tools}, "".join(chunks)
+        )
+        PROMPT_TOKENS.inc(prompt_length, engine=engine)
+        COMPLETION_TOKENS.inc(response_length, engine=engine)
+
+    def batch_chat(
+        self,
+        batch_messages: list[list[dict[str, str]]],
+        system: Optional[Union[str, list[Optional[str]]]] = None,
+        tools: Optional[str] = None,
+        max_batch_size: int = 16,
+        max_batch_tokens: int = 16384,
+        **input_kwargs,
+    ) -> list["ChatResult"]:
+        r"""Get the responses and the latency of each conversation, in the input order."""
+        task = asyncio.run_coroutine_threadsafe(
+            self.abatch_chat(batch_messages, system, tools, max_batch_size, max_batch_tokens, **input_kwargs),
+            self._loop,
+        )
+        return task.result()
+
+    async def abatch_chat(
+        self,
+        batch_messages: list[list[dict[str, str]]],
+        system: Optional[Union[str, list[Optional[str]]]] = None,
+        tools: Optional[str] = None,
+        max_batch_size: int = 16,
+        max_batch_tokens: int = 16384,
+        **input_kwargs,
+    ) -> list["ChatResult"]:
+        r"""Asynchronously get the responses and the latency of each conversation, in the input order.
+
+        The conversations are sorted by the prompt length and grouped into batches, bounded by the batch size
+        and the token budget of the padded prompts plus the new tokens.
+        """
+        systems = system if isinstance(system, list) else [system] * len(batch_messages)
+        if len(systems) != len(batch_messages):
+            raise ValueError("The number of system prompts should match the number of conversations.")
+
+        batch_inputs = [
+            {"messages": messages, "system": system, "tools": tools}
+            for messages, system in zip(batch_messages, systems)
+        ]
+        lengths = await asyncio.to_thread(self._get_prompt_lengths, batch_inputs)
+        max_new_tokens = input_kwargs.get("max_new_tokens") or self.engine.generating_args.get("max_new_tokens") or 0
+        results: list[Optional[ChatResult]] = [None] * len(batch_inputs)
+
+        async def run_batch(indices: list[int]) -> None:
+            batch_results = await self.engine.batch_chat([batch_inputs[i] for i in indices], **input_kwargs)
+            for index, result in zip(indices, batch_results):
+                results[index] = result
+                self._record_responses(result.responses, result.latency, method="batch_chat")
+
+        batch: list[int] = []
+        for index in sorted(range(len(batch_inputs)), key=lambda i: lengths[i], reverse=True):
+            padded_length = lengths[batch[0]] + max_new_tokens if batch else 0  # the first one is the longest
+            if batch and (len(batch) >= max_batch_size or (len(batch) + 1) * padded_length > max_batch_tokens):
+                await run_batch(batch)
+                batch = []
+
+            batch.append(index)
+
+        if batch:
+            await run_batch(batch)
+
+        return results
+
+    def _record_responses(self, responses: list["Response"], latency: float, method: str) -> None:
+        engine = get_engine_label(self.engine.name)
+        E2E_LATENCY.observe(latency, engine=engine)
+        REQUESTS_TOTAL.inc(engine=engine, method=method)
+        if len(responses) != 0:
+            PROMPT_TOKENS.inc(responses[0].prompt_length, engine=engine)
+            COMPLETION_TOKENS.inc(sum(response.response_length for response in responses), engine=engine)
+
+    def _get_prompt_lengths(self, batch_inputs: list[dict[str, Any]]) -> list[int]:
+        lengths = []
+        for inputs in batch_inputs:
+            paired_messages = inputs["messages"] + [{"role": "assistant", "content": ""}]
+            prompt_ids, _ = self.engine.template.encode_oneturn(
+                self.engine.tokenizer, paired_messages, inputs["system"], inputs["tools"]
+            )
+            lengths.append(len(prompt_ids))
+
+        return lengths
+
+    def _get_stream_lengths(self, inputs: dict[str, Any], response: str) -> tuple[int, int]:
+        r"""Count the prompt and response tokens of a stream, the engines only stream the decoded text."""
+        prompt_length = self._get_prompt_lengths([inputs])[0]
+        response_length = len(self.engine.tokenizer.encode(response, add_special_tokens=False))
+        return prompt_length, response_length
 
     def get_scores(
         self,
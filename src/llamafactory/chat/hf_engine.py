@@ -14,6 +14,7 @@
 
 import asyncio
 import os
+import time
 from collections.abc import AsyncGenerator, Callable
 from threading import Thread
 from typing import TYPE_CHECKING, Any, Optional, Union
@@ -25,8 +26,14 @@ from typing_extensions import override
 from ..data import get_template_and_fix_tokenizer
 from ..extras import logging
 from ..extras.constants import AUDIO_PLACEHOLDER, IMAGE_PLACEHOLDER, VIDEO_PLACEHOLDER, EngineName
+from ..hparams import ModelArguments
 from ..model import load_model, load_tokenizer
-from .base_engine import BaseEngine, Response
+from .adapter_registry import AdapterRegistry, generate_with_adapter
+from .base_engine import BaseEngine, ChatResult, Response
+from .hf_scheduler import BatchScheduler, GenerationRequest, ScoreScheduler, generate_batch
+from .metrics import track_queue
+from .prefix_cache import PrefixCache
+from .speculative import prepare_speculative_kwargs, track_acceptance_rate
 
 
 if TYPE_CHECKING:
@@ -35,7 +42,7 @@ if TYPE_CHECKING:
 
     from ..data import Template
     from ..data.mm_plugin import AudioInput, ImageInput, VideoInput
-    from ..hparams import DataArguments, FinetuningArguments, GeneratingArguments, ModelArguments
+    from ..hparams import DataArguments, FinetuningArguments, GeneratingArguments
 
 
 logger = logging.get_logger(__name__)
@@ -50,6 +57,7 @@ class HuggingfaceEngine(BaseEngine):
         generating_args: "GeneratingArguments",
     ) -> None:
         self.name = EngineName.HF
+        self.model_args = model_args
         self.can_generate = finetuning_args.stage == "sft"
         tokenizer_module = load_tokenizer(model_args)
         self.tokenizer = tokenizer_module["tokenizer"]
@@ -60,6 +68,19 @@ class HuggingfaceEngine(BaseEngine):
             self.tokenizer, model_args, finetuning_args, is_trainable=False, add_valuehead=(not self.can_generate)
         )  # must after fixing tokenizer to resize vocab
         self.generating_args = generating_args.to_dict()
+        self.assistant_model: Optional[PreTrainedModel] = None
+        if self.can_generate and model_args.hf_draft_model is not None:
+            if generating_args.prompt_lookup_num_tokens is not None:
+                raise ValueError("`hf_draft_model` and `prompt_lookup_num_tokens` cannot be used together.")
+
+            draft_model_args = ModelArguments.copyfrom(
+                model_args, model_name_or_path=model_args.hf_draft_model, adapter_name_or_path=None
+            )
+            self.assistant_model = load_model(self.tokenizer, draft_model_args, finetuning_args, is_trainable=False)
+
+        if self.assistant_model is not None or generating_args.prompt_lookup_num_tokens is not None:
+            track_acceptance_rate(self.model)
+
         try:
             asyncio.get_event_loop()
         except RuntimeError:
@@ -68,6 +89,39 @@ class HuggingfaceEngine(BaseEngine):
             asyncio.set_event_loop(loop)
 
         self.semaphore = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT", "1")))
+        self.prefix_cache: Optional[PrefixCache] = None
+        if self.can_generate and model_args.hf_prefix_cache_size > 0:
+            self.prefix_cache = PrefixCache(model_args.hf_prefix_cache_size)
+
+        self.adapter_registry: Optional[AdapterRegistry] = None
+        if self.can_generate and model_args.served_adapters:
+            self.adapter_registry = AdapterRegistry(
+                model_args.served_adapters, model_args.max_loaded_adapters, model_args.hf_adapter_cache_size
+            )
+
+        self.scheduler: Optional[BatchScheduler] = None
+        self.score_scheduler: Optional[ScoreScheduler] = None
+        if self.can_generate and model_args.hf_batch_size > 1:
+            self.scheduler = BatchScheduler(
+                self.model,
+                self.tokenizer,
+                max_batch_size=model_args.hf_batch_size,
+                max_batch_tokens=model_args.hf_batch_max_tokens,
+                max_wait_ms=model_args.hf_batch_wait_ms,
+                prefix_cache=self.prefix_cache,
+                assistant_model=self.assistant_model,
+                adapter_registry=self.adapter_registry,
+            )
+        elif model_args.hf_batch_size > 1:
+            self.score_scheduler = ScoreScheduler(
+                self.model,
+                self.tokenizer,
+                max_batch_tokens=model_args.hf_batch_max_tokens,
+                max_wait_ms=model_args.hf_batch_wait_ms,
+            )
+
+    def _resolve_adapter(self, name: Optional[str]) -> Optional[str]:
+        return self.adapter_registry.resolve(name) if self.adapter_registry is not None else None
 
     @staticmethod
     def _process_args(
@@ -222,6 +276,10 @@ class HuggingfaceEngine(BaseEngine):
         videos: Optional[list["VideoInput"]] = None,
         audios: Optional[list["AudioInput"]] = None,
         input_kwargs: Optional[dict[str, Any]] = {},
+        prefix_cache: Optional["PrefixCache"] = None,
+        assistant_model: Optional["PreTrainedModel"] = None,
+        adapter_registry: Optional["AdapterRegistry"] = None,
+        adapter: Optional[str] = None,
     ) -> list["Response"]:
         gen_kwargs, prompt_length = HuggingfaceEngine._process_args(
             model,
@@ -237,7 +295,8 @@ class HuggingfaceEngine(BaseEngine):
             audios,
             input_kwargs,
         )
-        generate_output = model.generate(**gen_kwargs)
+        prepare_speculative_kwargs(gen_kwargs, assistant_model)
+        generate_output = generate_with_adapter(model, gen_kwargs, prefix_cache, adapter_registry, adapter)
         if isinstance(generate_output, tuple):
             generate_output = generate_output[1][0]  # post-process the minicpm_o output
 
@@ -277,6 +336,10 @@ class HuggingfaceEngine(BaseEngine):
         videos: Optional[list["VideoInput"]] = None,
         audios: Optional[list["AudioInput"]] = None,
         input_kwargs: Optional[dict[str, Any]] = {},
+        prefix_cache: Optional["PrefixCache"] = None,
+        assistant_model: Optional["PreTrainedModel"] = None,
+        adapter_registry: Optional["AdapterRegistry"] = None,
+        adapter: Optional[str] = None,
     ) -> Callable[[], str]:
         gen_kwargs, _ = HuggingfaceEngine._process_args(
             model,
@@ -298,7 +361,12 @@ class HuggingfaceEngine(BaseEngine):
             skip_special_tokens=getattr(gen_kwargs["generation_config"], "skip_special_tokens", True),
         )
         gen_kwargs["streamer"] = streamer
-        thread = Thread(target=model.generate, kwargs=gen_kwargs, daemon=True)
+        prepare_speculative_kwargs(gen_kwargs, assistant_model)
+        thread = Thread(
+            target=generate_with_adapter,
+            args=(model, gen_kwargs, prefix_cache, adapter_registry, adapter),
+            daemon=True,
+        )
         thread.start()
 
         def stream():
@@ -345,6 +413,7 @@ class HuggingfaceEngine(BaseEngine):
         if not self.can_generate:
             raise ValueError("The current model does not support `chat`.")
 
+        adapter = self._resolve_adapter(input_kwargs.pop("adapter", None))
         input_args = (
             self.model,
             self.tokenizer,
@@ -359,8 +428,14 @@ class HuggingfaceEngine(BaseEngine):
             audios,
             input_kwargs,
         )
-        async with self.semaphore:
-            return await asyncio.to_thread(self._chat, *input_args)
+        if self.scheduler is not None:
+            gen_kwargs, prompt_length = await asyncio.to_thread(self._process_args, *input_args)
+            return await self.scheduler.chat(gen_kwargs, prompt_length, adapter)
+
+        async with track_queue(self.semaphore, self.name):
+            return await asyncio.to_thread(
+                self._chat, *input_args, self.prefix_cache, self.assistant_model, self.adapter_registry, adapter
+            )
 
     @override
     async def stream_chat(
@@ -376,6 +451,7 @@ class HuggingfaceEngine(BaseEngine):
         if not self.can_generate:
             raise ValueError("The current model does not support `stream_chat`.")
 
+        adapter = self._resolve_adapter(input_kwargs.pop("adapter", None))
         input_args = (
             self.model,
             self.tokenizer,
@@ -390,14 +466,81 @@ class HuggingfaceEngine(BaseEngine):
             audios,
             input_kwargs,
         )
-        async with self.semaphore:
-            stream = self._stream_chat(*input_args)
+        if self.scheduler is not None:
+            gen_kwargs, prompt_length = await asyncio.to_thread(self._process_args, *input_args)
+            async for new_text in self.scheduler.stream_chat(gen_kwargs, prompt_length, adapter):
+                yield new_text
+
+            return
+
+        async with track_queue(self.semaphore, self.name):
+            stream = self._stream_chat(
+                *input_args, self.prefix_cache, self.assistant_model, self.adapter_registry, adapter
+            )
             while True:
                 try:
                     yield await asyncio.to_thread(stream)
                 except StopAsyncIteration:
                     break
 
+    @override
+    async def batch_chat(
+        self,
+        batch_inputs: list[dict[str, Any]],
+        **input_kwargs,
+    ) -> list["ChatResult"]:
+        if not self.can_generate:
+            raise ValueError("The current model does not support `batch_chat`.")
+
+        if self.scheduler is not None:  # the scheduler batches the concurrent requests
+            return await super().batch_chat(batch_inputs, **input_kwargs)
+
+        adapter = self._resolve_adapter(input_kwargs.pop("adapter", None))
+        loop = asyncio.get_running_loop()
+        requests: list[GenerationRequest] = []
+        for inputs in batch_inputs:
+            input_args = (
+                self.model,
+                self.tokenizer,
+                self.processor,
+                self.template,
+                self.generating_args,
+                inputs["messages"],
+                inputs.get("system"),
+                inputs.get("tools"),
+                inputs.get("images"),
+                inputs.get("videos"),
+                inputs.get("audios"),
+                dict(input_kwargs),
+            )
+            gen_kwargs, prompt_length = await asyncio.to_thread(self._process_args, *input_args)
+            requests.append(
+                GenerationRequest(gen_kwargs, prompt_length, future=loop.create_future(), loop=loop, adapter=adapter)
+            )
+
+        batches: dict[Union[str, int], list[GenerationRequest]] = {}
+        for request in requests:  # the requests with different generation configs cannot be batched
+            batch_key = request.batch_key if request.batch_key is not None else id(request)
+            batches.setdefault(batch_key, []).append(request)
+
+        latencies: dict[int, float] = {}
+        async with track_queue(self.semaphore, self.name):
+            start_time = time.perf_counter()
+            for batch in batches.values():
+                await asyncio.to_thread(
+                    generate_batch,
+                    self.model,
+                    self.tokenizer,
+                    batch,
+                    self.prefix_cache,
+                    self.assistant_model,
+                    self.adapter_registry,
+                )
+                for request in batch:
+                    latencies[id(request)] = time.perf_counter() - start_time
+
+        return [ChatResult(responses=await request.future, latency=latencies[id(request)]) for request in requests]
+
     @override
     async def get_scores(
         self,
@@ -407,6 +550,11 @@ class HuggingfaceEngine(BaseEngine):
         if self.can_generate:
             raise ValueError("Cannot get scores using an auto-regressive model.")
 
+        if self.score_scheduler is not None:
+            max_length = input_kwargs.pop("max_length", None)
+            max_length = max_length or getattr(self.model.config, "max_position_embeddings", 1024)
+            return await self.score_scheduler.get_scores(batch_input, max_length)
+
         input_args = (self.model, self.tokenizer, batch_input, input_kwargs)
-        async with self.semaphore:
+        async with track_queue(self.semaphore, self.name):
             return await asyncio.to_thread(self._get_scores, *input_args)
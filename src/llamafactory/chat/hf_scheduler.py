@@ -0,0 +1,528 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+
+from ..extras import logging
+from .adapter_registry import generate_with_adapter
+from .base_engine import Response
+from .metrics import REQUESTS_QUEUED
+from .speculative import prepare_speculative_kwargs
+
+
+if TYPE_CHECKING:
+    from transformers import PreTrainedModel, PreTrainedTokenizer
+    from trl import PreTrainedModelWrapper
+
+    from .adapter_registry import AdapterRegistry
+    from .prefix_cache import PrefixCache
+
+
+logger = logging.get_logger(__name__)
+
+
+_BATCHABLE_KEYS = {"inputs", "attention_mask", "generation_config"}
+
+
+@dataclass
+class GenerationRequest:
+    r"""A queued generation request, produced by `HuggingfaceEngine._process_args`."""
+
+    gen_kwargs: dict[str, Any]
+    prompt_length: int
+    stream: bool = False
+    future: Optional["asyncio.Future"] = None
+    queue: Optional["asyncio.Queue"] = None
+    loop: Optional["asyncio.AbstractEventLoop"] = None
+    adapter: Optional[str] = None
+    cancelled: bool = False
+    batch_key: Optional[str] = field(default=None, init=False)
+
+    def __post_init__(self) -> None:
+        if set(self.gen_kwargs.keys()) <= _BATCHABLE_KEYS:  # multimodal inputs are generated alone
+            self.batch_key = self.gen_kwargs["generation_config"].to_json_string(use_diff=True)
+            if self.adapter is not None:
+                self.batch_key = f"{self.adapter}:{self.batch_key}"
+
+    @property
+    def prompt_ids(self) -> list[int]:
+        return self.gen_kwargs["inputs"][0].tolist()
+
+    def emit(self, value: Union[str, Exception, None]) -> None:
+        r"""Send a stream chunk, an exception or the end-of-stream marker from the worker thread."""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, value)
+
+    def resolve(self, value: Union[list["Response"], Exception]) -> None:
+        r"""Resolve the non-streaming future from the worker thread."""
+
+        def _set() -> None:
+            if self.future.done():
+                return
+
+            if isinstance(value, Exception):
+                self.future.set_exception(value)
+            else:
+                self.future.set_result(value)
+
+        self.loop.call_soon_threadsafe(_set)
+
+
+class _CancelledCriteria(StoppingCriteria):
+    r"""Stop generating the rows whose requests have been cancelled by the callers."""
+
+    def __init__(self, requests: list["GenerationRequest"], num_return_sequences: int) -> None:
+        self.requests = requests
+        self.num_return_sequences = num_return_sequences
+
+    def __call__(self, input_ids: "torch.LongTensor", scores: "torch.FloatTensor", **kwargs) -> "torch.BoolTensor":
+        cancelled = [request.cancelled for request in self.requests for _ in range(self.num_return_sequences)]
+        return torch.tensor(cancelled, dtype=torch.bool, device=input_ids.device)
+
+
+class _BatchStreamer(BaseStreamer):
+    r"""Demultiplex the tokens of a batched generation to the stream of each request."""
+
+    def __init__(
+        self,
+        tokenizer: "PreTrainedTokenizer",
+        requests: list["GenerationRequest"],
+        num_return_sequences: int,
+        stop_token_ids: list[int],
+        skip_special_tokens: bool,
+    ) -> None:
+        self.tokenizer = tokenizer
+        self.requests = requests
+        self.num_return_sequences = num_return_sequences
+        self.stop_token_ids = set(stop_token_ids)
+        self.skip_special_tokens = skip_special_tokens
+        self.token_cache: list[list[int]] = [[] for _ in requests]
+        self.print_len = [0] * len(requests)
+        self.finished = [not request.stream for request in requests]
+        self.next_tokens_are_prompt = True
+
+    def _flush(self, index: int, final: bool = False) -> None:
+        text = self.tokenizer.decode(self.token_cache[index], skip_special_tokens=self.skip_special_tokens)
+        if final or text.endswith("\n"):
+            printable_text = text[self.print_len[index] :]
+            self.token_cache[index], self.print_len[index] = [], 0
+        elif text.endswith("\ufffd"):  # wait for the remaining bytes of the character
+            printable_text = ""
+        else:
+            printable_text = text[self.print_len[index] :]
+            self.print_len[index] = len(text)
+
+        if printable_text:
+            self.requests[index].emit(printable_text)
+
+    def _finish(self, index: int) -> None:
+        if not self.finished[index]:
+            self._flush(index, final=True)
+            self.requests[index].emit(None)
+            self.finished[index] = True
+
+    def put(self, value: "torch.Tensor") -> None:
+        if self.next_tokens_are_prompt:
+            self.next_tokens_are_prompt = False
+            return
+
+        num_rows = len(self.requests) * self.num_return_sequences
+        for row, token_ids in enumerate(value.reshape(num_rows, -1).tolist()):  # assisted decoding puts many
+            index, seq_idx = divmod(row, self.num_return_sequences)
+            if seq_idx != 0:  # only the first sequence is streamed
+                continue
+
+            for token_id in token_ids:
+                if self.finished[index]:
+                    break
+
+                if self.requests[index].cancelled:
+                    self.finished[index] = True
+                elif token_id in self.stop_token_ids:
+                    self._finish(index)
+                else:
+                    self.token_cache[index].append(token_id)
+
+            if not self.finished[index]:
+                self._flush(index)
+
+    def end(self) -> None:
+        for index in range(len(self.requests)):
+            self._finish(index)
+
+
+class BatchScheduler:
+    r"""Collect the concurrent requests within a time window and generate them in left-padded batches.
+
+    The generation runs in a single worker thread, so the next batch is collected while the current one is running.
+    Requests with the same generation config and adapter are batched together, multimodal requests are generated alone.
+    """
+
+    def __init__(
+        self,
+        model: "PreTrainedModel",
+        tokenizer: "PreTrainedTokenizer",
+        max_batch_size: int,
+        max_batch_tokens: int,
+        max_wait_ms: float,
+        prefix_cache: Optional["PrefixCache"] = None,
+        assistant_model: Optional["PreTrainedModel"] = None,
+        adapter_registry: Optional["AdapterRegistry"] = None,
+    ) -> None:
+        self.model = model
+        self.prefix_cache = prefix_cache
+        self.assistant_model = assistant_model
+        self.adapter_registry = adapter_registry
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait_ms / 1000.0
+        self.pending: deque[GenerationRequest] = deque()
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.num_running = 0
+        self.num_batches = 0
+        self.num_requests = 0
+
+    @property
+    def num_queued(self) -> int:
+        return len(self.pending) + (self.queue.qsize() if self.queue is not None else 0)
+
+    def get_stats(self) -> dict[str, Union[int, float]]:
+        r"""Return the queue depth and the batching statistics."""
+        return {
+            "queued": self.num_queued,
+            "running": self.num_running,
+            "batches": self.num_batches,
+            "requests": self.num_requests,
+            "avg_batch_size": self.num_requests / max(self.num_batches, 1),
+        }
+
+    def _ensure_started(self) -> None:
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue()
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def chat(
+        self, gen_kwargs: dict[str, Any], prompt_length: int, adapter: Optional[str] = None
+    ) -> list["Response"]:
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        request = GenerationRequest(gen_kwargs, prompt_length, future=loop.create_future(), loop=loop, adapter=adapter)
+        REQUESTS_QUEUED.inc(engine="hf")
+        await self.queue.put(request)
+        try:
+            return await request.future
+        finally:
+            request.cancelled = True
+
+    async def stream_chat(
+        self, gen_kwargs: dict[str, Any], prompt_length: int, adapter: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        request = GenerationRequest(
+            gen_kwargs, prompt_length, stream=True, queue=asyncio.Queue(), loop=loop, adapter=adapter
+        )
+        REQUESTS_QUEUED.inc(engine="hf")
+        await self.queue.put(request)
+        try:
+            while True:
+                value = await request.queue.get()
+                if value is None:
+                    break
+                elif isinstance(value, Exception):
+                    raise value
+
+                yield value
+        finally:
+            request.cancelled = True
+
+    def _select_batch(self) -> list["GenerationRequest"]:
+        r"""Pop the oldest request and the compatible ones within the batch size and the token budget."""
+        first = self.pending.popleft()
+        batch, max_length, remaining = [first], first.prompt_length, deque()
+        while self.pending:
+            request = self.pending.popleft()
+            new_max_length = max(max_length, request.prompt_length)
+            if (
+                first.batch_key is not None
+                and request.batch_key == first.batch_key
+                and len(batch) < self.max_batch_size
+                and (len(batch) + 1) * new_max_length <= self.max_batch_tokens
+            ):
+                batch.append(request)
+                max_length = new_max_length
+            else:
+                remaining.append(request)
+
+        self.pending = remaining
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.pending:
+                self.pending.append(await self.queue.get())
+
+            deadline = loop.time() + self.max_wait
+            while len(self.pending) < self.max_batch_size:
+                try:
+                    self.pending.append(await asyncio.wait_for(self.queue.get(), deadline - loop.time()))
+                except TimeoutError:
+                    break
+
+            while not self.queue.empty():
+                self.pending.append(self.queue.get_nowait())
+
+            num_pending = len(self.pending)
+            self.pending = deque(request for request in self.pending if not request.cancelled)
+            REQUESTS_QUEUED.dec(num_pending - len(self.pending), engine="hf")  # the cancelled requests are dropped
+            if not self.pending:
+                continue
+
+            batch = self._select_batch()
+            REQUESTS_QUEUED.dec(len(batch), engine="hf")
+            self.num_running = len(batch)
+            self.num_batches += 1
+            self.num_requests += len(batch)
+            logger.debug(f"Generating a batch of {len(batch)} requests, {self.num_queued} requests queued.")
+            await asyncio.to_thread(
+                generate_batch,
+                self.model,
+                self.tokenizer,
+                batch,
+                self.prefix_cache,
+                self.assistant_model,
+                self.adapter_registry,
+            )
+            self.num_running = 0
+
+
+def collate_requests(tokenizer: "PreTrainedTokenizer", batch: list["GenerationRequest"]) -> dict[str, Any]:
+    r"""Left-pad the prompts of the requests into a batch, the requests should share the same batch key."""
+    if len(batch) == 1:
+        return dict(batch[0].gen_kwargs)
+
+    max_length = max(request.prompt_length for request in batch)
+    input_ids = torch.full((len(batch), max_length), tokenizer.pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(batch), max_length), dtype=torch.long)
+    for i, request in enumerate(batch):  # left padding
+        input_ids[i, max_length - request.prompt_length :] = torch.tensor(request.prompt_ids)
+        attention_mask[i, max_length - request.prompt_length :] = 1
+
+    device = batch[0].gen_kwargs["inputs"].device
+    return dict(
+        inputs=input_ids.to(device),
+        attention_mask=attention_mask.to(device),
+        generation_config=batch[0].gen_kwargs["generation_config"],
+    )
+
+
+@torch.inference_mode()
+def generate_batch(
+    model: "PreTrainedModel",
+    tokenizer: "PreTrainedTokenizer",
+    batch: list["GenerationRequest"],
+    prefix_cache: Optional["PrefixCache"] = None,
+    assistant_model: Optional["PreTrainedModel"] = None,
+    adapter_registry: Optional["AdapterRegistry"] = None,
+) -> None:
+    r"""Generate the requests in one batch and send the results to their futures or streams."""
+    gen_kwargs = collate_requests(tokenizer, batch)
+    prepare_speculative_kwargs(gen_kwargs, assistant_model)
+    generation_config = gen_kwargs["generation_config"]
+    num_return_sequences = generation_config.num_return_sequences or 1
+    stop_token_ids = generation_config.eos_token_id
+    stop_token_ids = [stop_token_ids] if isinstance(stop_token_ids, int) else list(stop_token_ids or [])
+    skip_special_tokens = getattr(generation_config, "skip_special_tokens", True)
+    streamer = _BatchStreamer(tokenizer, batch, num_return_sequences, stop_token_ids, skip_special_tokens)
+    gen_kwargs["streamer"] = streamer
+    gen_kwargs["stopping_criteria"] = StoppingCriteriaList([_CancelledCriteria(batch, num_return_sequences)])
+    try:
+        generate_output = generate_with_adapter(model, gen_kwargs, prefix_cache, adapter_registry, batch[0].adapter)
+    except Exception as e:
+        logger.warning_rank0(f"Batched generation failed: {e}.")
+        for request in batch:
+            if request.stream:
+                request.emit(e)
+            else:
+                request.resolve(e)
+
+        return
+
+    if isinstance(generate_output, tuple):
+        generate_output = generate_output[1][0]  # post-process the minicpm_o output
+
+    response_ids = generate_output[:, gen_kwargs["inputs"].size(-1) :]
+    response = tokenizer.batch_decode(
+        response_ids, skip_special_tokens=skip_special_tokens, clean_up_tokenization_spaces=True
+    )
+    for index, request in enumerate(batch):
+        if request.stream:
+            continue
+
+        results = []
+        for row in range(index * num_return_sequences, (index + 1) * num_return_sequences):
+            eos_index = (response_ids[row] == tokenizer.eos_token_id).nonzero()
+            response_length = (eos_index[0].item() + 1) if len(eos_index) else len(response_ids[row])
+            results.append(
+                Response(
+                    response_text=response[row],
+                    response_length=response_length,
+                    prompt_length=request.prompt_length,
+                    finish_reason="stop" if len(eos_index) else "length",
+                )
+            )
+
+        request.resolve(results)
+
+
+@dataclass
+class ScoreRequest:
+    r"""A queued scoring request of the reward model."""
+
+    batch_input: list[str]
+    max_length: int
+    future: "asyncio.Future"
+    loop: "asyncio.AbstractEventLoop"
+
+    def resolve(self, value: Union[list[float], Exception]) -> None:
+        def _set() -> None:
+            if self.future.done():
+                return
+
+            if isinstance(value, Exception):
+                self.future.set_exception(value)
+            else:
+                self.future.set_result(value)
+
+        self.loop.call_soon_threadsafe(_set)
+
+
+@torch.inference_mode()
+def score_batch(
+    model: "PreTrainedModelWrapper",
+    tokenizer: "PreTrainedTokenizer",
+    requests: list["ScoreRequest"],
+    max_batch_tokens: int,
+) -> None:
+    r"""Score the inputs of the requests in length-sorted padded batches and split the scores back per request."""
+    try:
+        device = getattr(model.pretrained_model, "device", "cuda")
+        results = [[0.0] * len(request.batch_input) for request in requests]
+        max_lengths = sorted({request.max_length for request in requests})
+        for max_length in max_lengths:  # the inputs are truncated to different lengths
+            owners = [
+                (i, j)
+                for i, request in enumerate(requests)
+                if request.max_length == max_length
+                for j in range(len(request.batch_input))
+            ]
+            input_ids = tokenizer(
+                [requests[i].batch_input[j] for i, j in owners],
+                truncation=True,
+                max_length=max_length,
+                add_special_tokens=False,
+            )["input_ids"]
+            order = sorted(range(len(owners)), key=lambda k: len(input_ids[k]))
+            start = 0
+            while start < len(order):
+                end = start + 1  # the longest one is the last in the sorted chunk
+                while end < len(order) and (end - start + 1) * len(input_ids[order[end]]) <= max_batch_tokens:
+                    end += 1
+
+                chunk = order[start:end]
+                inputs = tokenizer.pad({"input_ids": [input_ids[k] for k in chunk]}, return_tensors="pt").to(device)
+                values: torch.Tensor = model(**inputs, return_dict=True, use_cache=False)[-1]
+                scores = values.gather(dim=-1, index=(inputs["attention_mask"].sum(dim=-1, keepdim=True) - 1))
+                for k, score in zip(chunk, scores.squeeze(-1).tolist()):
+                    i, j = owners[k]
+                    results[i][j] = score
+
+                start = end
+    except Exception as e:
+        logger.warning_rank0(f"Batched scoring failed: {e}.")
+        for request in requests:
+            request.resolve(e)
+
+        return
+
+    for request, result in zip(requests, results):
+        request.resolve(result)
+
+
+class ScoreScheduler:
+    r"""Merge the concurrent scoring requests within a time window into padded batches of the reward model."""
+
+    def __init__(
+        self,
+        model: "PreTrainedModelWrapper",
+        tokenizer: "PreTrainedTokenizer",
+        max_batch_tokens: int,
+        max_wait_ms: float,
+    ) -> None:
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.num_batches = 0
+        self.num_requests = 0
+
+    def get_stats(self) -> dict[str, Union[int, float]]:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "batches": self.num_batches,
+            "requests": self.num_requests,
+            "avg_batch_size": self.num_requests / max(self.num_batches, 1),
+        }
+
+    async def get_scores(self, batch_input: list[str], max_length: int) -> list[float]:
+        if self.task is None or self.task.done():
+            self.queue = asyncio.Queue()
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+        loop = asyncio.get_running_loop()
+        request = ScoreRequest(batch_input, max_length, future=loop.create_future(), loop=loop)
+        await self.queue.put(request)
+        return await request.future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self.queue.get()]
+            num_inputs = len(requests[0].batch_input)
+            deadline = loop.time() + self.max_wait
+            while num_inputs < self.max_batch_tokens:  # every input holds at least one token
+                try:
+                    request = await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                except TimeoutError:
+                    break
+
+                requests.append(request)
+                num_inputs += len(request.batch_input)
+
+            self.num_batches += 1
+            self.num_requests += len(requests)
+            logger.debug(f"Scoring {num_inputs} inputs of {len(requests)} requests.")
+            await asyncio.to_thread(score_batch, self.model, self.tokenizer, requests, self.max_batch_tokens)
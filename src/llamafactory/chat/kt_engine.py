@@ -27,6 +27,7 @@ from ..extras import logging
 from ..extras.constants import EngineName
 from ..model import load_model, load_tokenizer
 from .base_engine import BaseEngine, Response
+from .metrics import track_queue
 
 
 if TYPE_CHECKING:
@@ -57,6 +58,7 @@ class KTransformersEngine(BaseEngine):
         generating_args: "GeneratingArguments",
     ) -> None:
         self.name = EngineName.KT
+        self.model_args = model_args
         self.can_generate = finetuning_args.stage == "sft"
 
         tok_mod = load_tokenizer(model_args)
@@ -229,7 +231,7 @@ class KTransformersEngine(BaseEngine):
     ) -> list["Response"]:
         if not self.can_generate:
             raise ValueError("The current model does not support `chat`.")
-        async with self.semaphore:
+        async with track_queue(self.semaphore, self.name):
             produced = ""
             final_text = ""
             async for t in self._generate(messages, system, tools, **input_kwargs):
@@ -263,7 +265,7 @@ class KTransformersEngine(BaseEngine):
     ) -> AsyncGenerator[str, None]:
         if not self.can_generate:
             raise ValueError("The current model does not support `stream_chat`.")
-        async with self.semaphore:
+        async with track_queue(self.semaphore, self.name):
             produced = ""
             async for t in self._generate(messages, system, tools, **input_kwargs):
                 delta = t[len(produced) :] if t.startswith(produced) else t
@@ -280,5 +282,5 @@ class KTransformersEngine(BaseEngine):
         if self.can_generate:
             raise ValueError("Cannot get scores using an auto-regressive model.")
         args = (self.model, self.tokenizer, batch_input, input_kwargs)
-        async with self.semaphore:
+        async with track_queue(self.semaphore, self.name):
             return await asyncio.to_thread(self._get_scores, *args)
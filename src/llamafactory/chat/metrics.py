@@ -0,0 +1,221 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import bisect
+import time
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager
+from threading import Lock
+from typing import Union
+
+from ..extras.constants import EngineName
+
+
+ENGINE_LABELS = {
+    EngineName.HF: "hf",
+    EngineName.VLLM: "vllm",
+    EngineName.SGLANG: "sglang",
+    EngineName.KT: "kt",
+}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: tuple[str, ...], extra: str = "") -> str:
+    labels = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        labels.append(extra)
+
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _render_samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"] + (
+            self._render_samples()
+        )
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, value: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def _render_samples(self) -> list[str]:
+        with self.lock:
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in self.values.items()
+            ]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, value: float = 1.0, **labels: str) -> None:
+        self.inc(-value, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}  # bucket counts, [sum, count]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self.lock:
+            bucket_counts, total = self.values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+            total[1] += 1
+
+    def get_count(self, **labels: str) -> int:
+        return self.values[self._key(labels)][1][1] if self._key(labels) in self.values else 0
+
+    def _render_samples(self) -> list[str]:
+        samples = []
+        with self.lock:
+            for key, (bucket_counts, (total_sum, count)) in self.values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                    samples.append(f"{self.name}_bucket{labels} {cumulative}")
+
+                samples.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total_sum)}")
+                samples.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+
+        return samples
+
+
+class MetricsRegistry:
+    r"""In-process metrics registry rendered in the Prometheus text exposition format."""
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: "_Metric") -> "_Metric":
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} has been registered.")
+
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> "Counter":
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> "Gauge":
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> "Histogram":
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "llamafactory_time_to_first_token_seconds", "Time from the request to the first streamed token.", ("engine",)
+)
+INTER_TOKEN_LATENCY = REGISTRY.histogram(
+    "llamafactory_inter_token_latency_seconds", "Time between two consecutive streamed tokens.", ("engine",)
+)
+E2E_LATENCY = REGISTRY.histogram(
+    "llamafactory_e2e_request_latency_seconds", "Time from the request to the last token.", ("engine",)
+)
+QUEUE_WAIT = REGISTRY.histogram(
+    "llamafactory_queue_wait_seconds", "Time spent waiting for the concurrency limit of the engine.", ("engine",)
+)
+PROMPT_TOKENS = REGISTRY.counter("llamafactory_prompt_tokens_total", "Number of prefilled prompt tokens.", ("engine",))
+COMPLETION_TOKENS = REGISTRY.counter(
+    "llamafactory_completion_tokens_total", "Number of generated tokens (re-tokenized for streams).", ("engine",)
+)
+REQUESTS_TOTAL = REGISTRY.counter("llamafactory_requests_total", "Number of finished requests.", ("engine", "method"))
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "llamafactory_requests_in_flight", "Number of requests being processed, including the queued ones.", ("engine",)
+)
+REQUESTS_QUEUED = REGISTRY.gauge(
+    "llamafactory_requests_queued", "Number of requests waiting for the engine to be scheduled.", ("engine",)
+)
+
+
+def get_engine_label(engine_name: Union["EngineName", str]) -> str:
+    return ENGINE_LABELS.get(engine_name, str(engine_name))
+
+
+@asynccontextmanager
+async def track_queue(semaphore: "asyncio.Semaphore", engine_name: "EngineName") -> AsyncIterator[None]:
+    r"""Acquire the semaphore of the engine, recording the queued requests and the waiting time."""
+    engine = get_engine_label(engine_name)
+    start_time = time.perf_counter()
+    REQUESTS_QUEUED.inc(engine=engine)
+    try:
+        await semaphore.acquire()
+    finally:
+        REQUESTS_QUEUED.dec(engine=engine)
+
+    QUEUE_WAIT.observe(time.perf_counter() - start_time, engine=engine)
+    try:
+        yield
+    finally:
+        semaphore.release()
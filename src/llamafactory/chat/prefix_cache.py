@@ -0,0 +1,204 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+from collections import OrderedDict
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Optional
+
+from transformers import DynamicCache
+
+
+if TYPE_CHECKING:
+    from transformers import PreTrainedModel
+
+
+_CACHEABLE_KEYS = {"inputs", "attention_mask", "generation_config", "streamer", "stopping_criteria"}
+
+
+def _get_cache_size(cache: "DynamicCache") -> int:
+    r"""Return the memory footprint of the key-value cache in bytes."""
+    if hasattr(cache, "layers"):  # transformers>=4.56
+        tensors = [tensor for layer in cache.layers for tensor in (layer.keys, layer.values) if tensor is not None]
+    else:
+        tensors = list(cache.key_cache) + list(cache.value_cache)
+
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors if tensor is not None)
+
+
+class _RadixNode:
+    __slots__ = ("children", "entry", "parent", "tokens")
+
+    def __init__(self, tokens: tuple[int, ...] = (), parent: Optional["_RadixNode"] = None) -> None:
+        self.tokens = tokens  # the label of the edge from the parent
+        self.parent = parent
+        self.children: dict[int, _RadixNode] = {}
+        self.entry: Optional[DynamicCache] = None
+
+
+class PrefixCache:
+    r"""Key-value cache store of the prompt prefixes, indexed by a radix tree over the token ids.
+
+    Each finished prompt stores its key-value cache at the node where it ends. A new prompt reuses the
+    cache of any stored prompt sharing its longest prefix, cropped to the matched length, so only the
+    remaining tokens are prefilled. The stored caches are evicted in LRU order under a memory budget.
+    """
+
+    def __init__(self, max_size: float, min_prefix_length: int = 16) -> None:
+        self.max_size = int(max_size * 1024**3)
+        self.min_prefix_length = min_prefix_length
+        self.root = _RadixNode()
+        self.lru: OrderedDict[_RadixNode, int] = OrderedDict()  # node -> cache size in bytes
+        self.size = 0
+        self.num_hits = 0
+        self.num_lookups = 0
+        self.num_reused_tokens = 0
+        self.lock = Lock()
+
+    def _match(self, input_ids: list[int]) -> tuple["_RadixNode", int]:
+        r"""Return the deepest node on the matched path and the matched length."""
+        node, length = self.root, 0
+        while length < len(input_ids) and input_ids[length] in node.children:
+            child = node.children[input_ids[length]]
+            common = 0
+            while (
+                common < len(child.tokens)
+                and length + common < len(input_ids)
+                and child.tokens[common] == input_ids[length + common]
+            ):
+                common += 1
+
+            node, length = child, length + common
+            if common < len(child.tokens):
+                break
+
+        return node, length
+
+    @staticmethod
+    def _find_entry(node: "_RadixNode") -> "_RadixNode":
+        while node.entry is None:  # every leaf holds an entry
+            node = next(iter(node.children.values()))
+
+        return node
+
+    def lookup(self, input_ids: list[int]) -> tuple[Optional["DynamicCache"], int]:
+        r"""Return a copy of the cache of the longest cached prefix (excluding the last token) and its length."""
+        with self.lock:
+            self.num_lookups += 1
+            node, length = self._match(input_ids[:-1])  # at least one token should be prefilled
+            if length < self.min_prefix_length:
+                return None, 0
+
+            node = self._find_entry(node)
+            self.lru.move_to_end(node)
+            self.num_hits += 1
+            self.num_reused_tokens += length
+            cache = copy.deepcopy(node.entry)
+
+        cache.crop(length)
+        return cache, length
+
+    def insert(self, input_ids: list[int], cache: "DynamicCache") -> None:
+        r"""Store the cache of the prompt, which should be cropped to the prompt length."""
+        cache_size = _get_cache_size(cache)
+        if cache_size > self.max_size:
+            return
+
+        with self.lock:
+            node, length = self.root, 0
+            while length < len(input_ids):
+                child = node.children.get(input_ids[length])
+                if child is None:
+                    child = _RadixNode(tuple(input_ids[length:]), node)
+                    node.children[input_ids[length]] = child
+                    node, length = child, len(input_ids)
+                    break
+
+                common = 0
+                while (
+                    common < len(child.tokens)
+                    and length + common < len(input_ids)
+                    and child.tokens[common] == input_ids[length + common]
+                ):
+                    common += 1
+
+                if common < len(child.tokens):  # split the edge
+                    middle = _RadixNode(child.tokens[:common], node)
+                    node.children[input_ids[length]] = middle
+                    child.tokens, child.parent = child.tokens[common:], middle
+                    middle.children[child.tokens[0]] = child
+                    child = middle
+
+                node, length = child, length + common
+
+            if node.entry is not None:
+                self.size -= self.lru.pop(node)
+
+            node.entry = cache
+            self.lru[node] = cache_size
+            self.size += cache_size
+            while self.size > self.max_size:
+                self._evict(next(iter(self.lru)))
+
+    def _evict(self, node: "_RadixNode") -> None:
+        self.size -= self.lru.pop(node)
+        node.entry = None
+        while node.parent is not None and node.entry is None and not node.children:  # prune the empty branch
+            del node.parent.children[node.tokens[0]]
+            node = node.parent
+
+    def clear(self) -> None:
+        with self.lock:
+            self.root = _RadixNode()
+            self.lru.clear()
+            self.size = 0
+
+    def get_stats(self) -> dict[str, Any]:
+        r"""Return the hit rate and the memory usage."""
+        return {
+            "entries": len(self.lru),
+            "size_bytes": self.size,
+            "hit_rate": self.num_hits / max(self.num_lookups, 1),
+            "reused_tokens": self.num_reused_tokens,
+        }
+
+
+def is_prefix_cacheable(model: "PreTrainedModel", gen_kwargs: dict[str, Any]) -> bool:
+    r"""Check whether the generation can reuse the prefix cache: text-only, single-row and dynamic cache."""
+    generation_config = gen_kwargs["generation_config"]
+    return (
+        set(gen_kwargs.keys()) <= _CACHEABLE_KEYS
+        and gen_kwargs["inputs"].size(0) == 1
+        and (generation_config.num_return_sequences or 1) == 1
+        and (generation_config.num_beams or 1) == 1
+        and generation_config.use_cache is not False
+        and generation_config.cache_implementation is None
+        and getattr(model, "_supports_default_dynamic_cache", lambda: True)()
+    )
+
+
+def generate_with_prefix_cache(
+    model: "PreTrainedModel", gen_kwargs: dict[str, Any], prefix_cache: Optional["PrefixCache"]
+) -> Any:
+    r"""Call `model.generate`, reusing and updating the prefix cache if possible."""
+    if prefix_cache is None or not is_prefix_cacheable(model, gen_kwargs):
+        return model.generate(**gen_kwargs)
+
+    input_ids = gen_kwargs["inputs"][0].tolist()
+    past_key_values, _ = prefix_cache.lookup(input_ids)
+    past_key_values = past_key_values if past_key_values is not None else DynamicCache()
+    generate_output = model.generate(**gen_kwargs, past_key_values=past_key_values)
+    past_key_values.crop(len(input_ids))  # drop the response
+    prefix_cache.insert(input_ids, past_key_values)
+    return generate_output
@@ -12,9 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import asyncio
 import atexit
-import json
 from collections.abc import AsyncGenerator, AsyncIterator, Sequence
 from typing import TYPE_CHECKING, Any, Optional, Union
 
@@ -30,6 +28,7 @@ from ..hparams import DataArguments, FinetuningArguments, GeneratingArguments, M
 from ..model import load_config, load_tokenizer
 from ..model.model_utils.quantization import QuantizationMethod
 from .base_engine import BaseEngine, Response
+from .sse_client import AsyncSSEClient
 
 
 if is_sglang_available():
@@ -113,6 +112,7 @@ class SGLangEngine(BaseEngine):
 
             logger.info_rank0(f"Waiting for SGLang server to be ready at {self.base_url}")
             wait_for_server(self.base_url, timeout=300)
+            self.client = AsyncSSEClient(self.base_url, max_connections=model_args.sglang_max_connections)
             logger.info_rank0(f"SGLang server initialized successfully at {self.base_url}")
             try:
                 response = requests.get(f"{self.base_url}/get_model_info", timeout=5)
@@ -128,7 +128,13 @@ class SGLangEngine(BaseEngine):
             raise RuntimeError(f"SGLang server initialization failed: {str(e)}.")
 
     def _cleanup_server(self):
-        r"""Clean up the server process when the engine is destroyed."""
+        r"""Clean up the pooled connections and the server process when the engine is destroyed."""
+        if getattr(self, "client", None) is not None:
+            try:
+                self.client.close()
+            except Exception as e:
+                logger.warning(f"Error closing SGLang client: {str(e)}")
+
         if hasattr(self, "server_process") and self.server_process:
             try:
                 logger.info("Terminating SGLang server process")
@@ -206,27 +212,16 @@ class SGLangEngine(BaseEngine):
             else self.generating_args["skip_special_tokens"],
         }
 
-        def stream_request():
-            json_data = {
-                "input_ids": prompt_ids,
-                "sampling_params": sampling_params,
-                "stream": True,
-            }
-            if self.lora_request:
-                json_data["lora_request"] = ["lora0"]
-            response = requests.post(f"{self.base_url}/generate", json=json_data, stream=True)
-            if response.status_code != 200:
-                raise RuntimeError(f"SGLang server error: {response.status_code}, {response.text}")
-
-            for chunk in response.iter_lines(decode_unicode=False):
-                chunk = str(chunk.decode("utf-8"))
-                if chunk == "data: [DONE]":
-                    break
-
-                if chunk and chunk.startswith("data:"):
-                    yield json.loads(chunk[5:].strip("\n"))
+        json_data = {
+            "input_ids": prompt_ids,
+            "sampling_params": sampling_params,
+            "stream": True,
+        }
+        if self.lora_request:
+            json_data["lora_request"] = ["lora0"]
 
-        return await asyncio.to_thread(stream_request)
+        async for request_output in self.client.stream("/generate", json_data):
+            yield request_output
 
     @override
     async def chat(
@@ -240,8 +235,7 @@ class SGLangEngine(BaseEngine):
         **input_kwargs,
     ) -> list["Response"]:
         final_output = None
-        generator = await self._generate(messages, system, tools, images, videos, audios, **input_kwargs)
-        for request_output in generator:
+        async for request_output in self._generate(messages, system, tools, images, videos, audios, **input_kwargs):
             final_output = request_output
 
         results = [
@@ -266,8 +260,7 @@ class SGLangEngine(BaseEngine):
         **input_kwargs,
     ) -> AsyncGenerator[str, None]:
         generated_text = ""
-        generator = await self._generate(messages, system, tools, images, videos, audios, **input_kwargs)
-        for result in generator:
+        async for result in self._generate(messages, system, tools, images, videos, audios, **input_kwargs):
             delta_text = result["text"][len(generated_text) :]
             generated_text = result["text"]
             yield delta_text
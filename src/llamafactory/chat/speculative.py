@@ -0,0 +1,81 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+from typing import TYPE_CHECKING, Any, Optional
+
+from .metrics import REGISTRY
+
+
+if TYPE_CHECKING:
+    from transformers import PreTrainedModel
+
+
+DRAFT_TOKENS = REGISTRY.counter(
+    "llamafactory_speculative_draft_tokens_total", "Number of tokens proposed by the draft.", ("engine",)
+)
+ACCEPTED_TOKENS = REGISTRY.counter(
+    "llamafactory_speculative_accepted_tokens_total", "Number of draft tokens accepted by the model.", ("engine",)
+)
+
+
+def get_acceptance_rate(engine: str = "hf") -> float:
+    r"""Return the ratio of the accepted draft tokens to the proposed ones."""
+    return ACCEPTED_TOKENS.get(engine=engine) / max(DRAFT_TOKENS.get(engine=engine), 1.0)
+
+
+def track_acceptance_rate(model: "PreTrainedModel", engine: str = "hf") -> None:
+    r"""Count the proposed and accepted tokens of the candidate generators used in assisted decoding.
+
+    Works for both the draft model and the prompt lookup, the methods are patched on the instances so that
+    the type checks in `generate` still hold.
+    """
+    get_candidate_generator = model._get_candidate_generator
+
+    def _get_candidate_generator(*args, **kwargs):
+        candidate_generator = get_candidate_generator(*args, **kwargs)
+        get_candidates = candidate_generator.get_candidates
+        update_candidate_strategy = candidate_generator.update_candidate_strategy
+
+        def _get_candidates(input_ids, *args, **kwargs):
+            candidate_ids, candidate_logits = get_candidates(input_ids, *args, **kwargs)
+            DRAFT_TOKENS.inc(candidate_ids.shape[-1] - input_ids.shape[-1], engine=engine)
+            return candidate_ids, candidate_logits
+
+        def _update_candidate_strategy(input_ids, scores, num_matches, *args, **kwargs):
+            ACCEPTED_TOKENS.inc(int(num_matches), engine=engine)
+            return update_candidate_strategy(input_ids, scores, num_matches, *args, **kwargs)
+
+        candidate_generator.get_candidates = _get_candidates
+        candidate_generator.update_candidate_strategy = _update_candidate_strategy
+        return candidate_generator
+
+    model._get_candidate_generator = _get_candidate_generator
+
+
+def prepare_speculative_kwargs(gen_kwargs: dict[str, Any], assistant_model: Optional["PreTrainedModel"]) -> None:
+    r"""Enable the assisted decoding in place if possible, which only supports a single sequence."""
+    generation_config = gen_kwargs["generation_config"]
+    is_supported = (
+        gen_kwargs["inputs"].size(0) == 1
+        and (generation_config.num_return_sequences or 1) == 1
+        and (generation_config.num_beams or 1) == 1
+    )
+    if is_supported:
+        if assistant_model is not None:
+            gen_kwargs["assistant_model"] = assistant_model
+    elif getattr(generation_config, "prompt_lookup_num_tokens", None) is not None:  # fall back to plain decoding
+        generation_config = copy.deepcopy(generation_config)
+        generation_config.prompt_lookup_num_tokens = None
+        gen_kwargs["generation_config"] = generation_config
@@ -0,0 +1,109 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from typing import Any, Optional
+
+import httpx
+
+
+async def iter_sse_data(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    r"""Yield the data field of each server-sent event, the data lines of one event are joined by newlines."""
+    data_lines: list[str] = []
+    async for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:  # an empty line dispatches the event
+            if data_lines:
+                yield "\n".join(data_lines)
+                data_lines = []
+        elif line.startswith("data:"):
+            data = line[5:]
+            data_lines.append(data[1:] if data.startswith(" ") else data)
+        # comments (`:`) and other fields (`event`, `id`, `retry`) are ignored
+
+    if data_lines:
+        yield "\n".join(data_lines)
+
+
+class AsyncSSEClient:
+    r"""Pooled asynchronous HTTP client that streams the JSON events of a server-sent event response.
+
+    The connections are kept alive and shared between the requests, and at most `max_connections` requests
+    are in flight at the same time, the others wait on the event loop instead of holding a worker thread.
+    """
+
+    def __init__(self, base_url: str, max_connections: int = 64, connect_timeout: float = 10.0) -> None:
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:  # create in the running event loop
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+                ),
+                timeout=httpx.Timeout(None, connect=self.connect_timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+            self._loop = asyncio.get_running_loop()
+
+        return self._client
+
+    async def stream(self, path: str, json_data: dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+        r"""Post the request and yield the decoded events until the `[DONE]` marker."""
+        client = self._get_client()
+        async with self._semaphore:
+            async with client.stream("POST", path, json=json_data) as response:
+                if response.status_code != 200:
+                    content = await response.aread()
+                    raise RuntimeError(f"Server error: {response.status_code}, {content.decode('utf-8', 'replace')}")
+
+                async for data in iter_sse_data(response.aiter_lines()):
+                    if data == "[DONE]":
+                        break
+
+                    yield json.loads(data)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def close(self, timeout: float = 5.0) -> None:
+        r"""Close the pooled connections from synchronous code, on the event loop the client was created in."""
+        if self._client is None or self._loop is None:
+            return
+
+        if self._loop.is_closed():  # the connections were dropped with their event loop
+            self._client = None
+            return
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self._loop:
+            self._loop.create_task(self.aclose())
+        elif self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result(timeout=timeout)
+        else:
+            self._loop.run_until_complete(self.aclose())
@@ -27,6 +27,7 @@ from ..extras.packages import is_vllm_available
 from ..model import load_config, load_tokenizer
 from ..model.model_utils.quantization import QuantizationMethod
 from ..model.model_utils.visual import LlavaMultiModalProjectorForYiVLForVLLM
+from .adapter_registry import AdapterRegistry
 from .base_engine import BaseEngine, Response
 
 
@@ -68,6 +69,9 @@ class VllmEngine(BaseEngine):
         self.template = get_template_and_fix_tokenizer(self.tokenizer, data_args)
         self.template.mm_plugin.expand_mm_tokens = False  # for vllm generate
         self.generating_args = generating_args.to_dict()
+        self.adapter_registry: Optional[AdapterRegistry] = None
+        if model_args.served_adapters:
+            self.adapter_registry = AdapterRegistry(model_args.served_adapters, model_args.max_loaded_adapters)
 
         engine_args = {
             "model": model_args.model_name_or_path,
@@ -79,9 +83,11 @@ class VllmEngine(BaseEngine):
             "gpu_memory_utilization": model_args.vllm_gpu_util,
             "disable_log_stats": True,
             "enforce_eager": model_args.vllm_enforce_eager,
-            "enable_lora": model_args.adapter_name_or_path is not None,
+            "enable_lora": model_args.adapter_name_or_path is not None or self.adapter_registry is not None,
             "max_lora_rank": model_args.vllm_max_lora_rank,
         }
+        if self.adapter_registry is not None:  # the adapters of a batch share the lora slots of the base model
+            engine_args["max_loras"] = model_args.max_loaded_adapters
 
         import vllm
 
@@ -108,6 +114,13 @@ class VllmEngine(BaseEngine):
         else:
             self.lora_request = None
 
+        self.lora_requests: dict[str, LoRARequest] = {}
+        if self.adapter_registry is not None:  # loaded lazily and evicted in LRU order by vllm
+            self.lora_requests = {
+                name: LoRARequest(name, self.adapter_registry.adapter_ids[name], path)
+                for name, path in self.adapter_registry.adapters.items()
+            }
+
     async def _generate(
         self,
         messages: list[dict[str, str]],
@@ -145,6 +158,7 @@ class VllmEngine(BaseEngine):
         max_length: Optional[int] = input_kwargs.pop("max_length", None)
         max_new_tokens: Optional[int] = input_kwargs.pop("max_new_tokens", None)
         stop: Optional[Union[str, list[str]]] = input_kwargs.pop("stop", None)
+        adapter: Optional[str] = input_kwargs.pop("adapter", None)
 
         if length_penalty is not None:
             logger.warning_rank0("Length penalty is not supported by the vllm engine yet.")
@@ -211,7 +225,7 @@ class VllmEngine(BaseEngine):
             {"prompt_token_ids": prompt_ids, "multi_modal_data": multi_modal_data},
             sampling_params=sampling_params,
             request_id=request_id,
-            lora_request=self.lora_request,
+            lora_request=self.lora_requests.get(adapter, self.lora_request),
         )
         return result_generator
 
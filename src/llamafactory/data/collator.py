@@ -16,6 +16,7 @@
 # limitations under the License.
 
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import TYPE_CHECKING, Any, Literal, Optional
 
 import numpy as np
@@ -25,7 +26,7 @@ from peft import PeftModel
 from transformers import DataCollatorForSeq2Seq
 
 from ..extras.constants import AUDIO_PLACEHOLDER, IGNORE_INDEX, IMAGE_PLACEHOLDER
-from ..extras.packages import is_pillow_available
+from ..extras.packages import is_pillow_available, is_transformers_version_greater_than
 
 
 if is_pillow_available():
@@ -38,6 +39,15 @@ if TYPE_CHECKING:
     from .template import Template
 
 
+@lru_cache(maxsize=4)
+def _get_causal_mask(seq_len: int, device: "torch.device") -> "torch.Tensor":
+    r"""Return the lower triangular boolean mask on the device, cached by sequence length and device.
+
+    The cache is small, packed batches share a few sequence lengths and each mask takes seq_len^2 bytes.
+    """
+    return torch.tril(torch.ones((seq_len, seq_len), dtype=torch.bool, device=device))
+
+
 def prepare_4d_attention_mask(attention_mask_with_indices: "torch.Tensor", dtype: "torch.dtype") -> "torch.Tensor":
     r"""Expand 2d attention mask to 4d attention mask.
 
@@ -64,21 +74,52 @@ def prepare_4d_attention_mask(attention_mask_with_indices: "torch.Tensor", dtype
     ```
     where `o` equals to `0.0`, `x` equals to `min_dtype`.
     """
-    _, seq_len = attention_mask_with_indices.size()
+    bsz, seq_len = attention_mask_with_indices.size()
     min_dtype = torch.finfo(dtype).min
-    zero_tensor = torch.tensor(0, dtype=dtype)
 
     # Create a non-padding mask.
     non_padding_mask = (attention_mask_with_indices != 0).unsqueeze(1).unsqueeze(2)
     # Create indices for comparison.
     indices = attention_mask_with_indices.unsqueeze(1).unsqueeze(2)  # [bsz, 1, 1, seq_len]
     indices_t = attention_mask_with_indices.unsqueeze(1).unsqueeze(3)  # [bsz, 1, seq_len, 1]
-    # Create a lower triangular mask.
-    tril_mask = torch.tril(torch.ones((seq_len, seq_len), dtype=torch.bool))
+    # Reuse the cached lower triangular mask.
+    tril_mask = _get_causal_mask(seq_len, attention_mask_with_indices.device)
     attention_mask_4d = (indices == indices_t) & non_padding_mask & tril_mask
-    # Invert the attention mask.
-    attention_mask_4d = torch.where(attention_mask_4d, zero_tensor, min_dtype)
-    return attention_mask_4d
+    # Invert the attention mask in place.
+    return torch.zeros(
+        (bsz, 1, seq_len, seq_len), dtype=dtype, device=attention_mask_with_indices.device
+    ).masked_fill_(~attention_mask_4d, min_dtype)
+
+
+def prepare_varlen_attention_kwargs(attention_mask_with_indices: "torch.Tensor") -> dict[str, Any]:
+    r"""Compute the cumulative sequence lengths of the packed sequences for the flash attention varlen function.
+
+    The batch is flattened into a single row, each run of the same index (including padding) forms a sequence.
+
+    e.g.
+    ```python
+    # input
+    [
+        [1, 1, 2, 2, 2, 0],
+        [1, 2, 2, 3, 3, 3],
+    ]
+    # output
+    cu_seq_lens: [0, 2, 5, 6, 7, 9, 12]
+    max_length: 3
+    ```
+    """
+    is_start = torch.ones_like(attention_mask_with_indices, dtype=torch.bool)
+    is_start[:, 1:] = attention_mask_with_indices[:, 1:] != attention_mask_with_indices[:, :-1]
+    starts = is_start.flatten().nonzero().squeeze(-1)
+    total_length = torch.tensor([attention_mask_with_indices.numel()], device=starts.device)
+    cu_seq_lens = torch.cat((starts, total_length)).to(torch.int32)
+    max_length = (cu_seq_lens[1:] - cu_seq_lens[:-1]).max().item()
+    return {
+        "cu_seq_lens_q": cu_seq_lens,
+        "cu_seq_lens_k": cu_seq_lens,
+        "max_length_q": max_length,
+        "max_length_k": max_length,
+    }
 
 
 @dataclass
@@ -253,6 +294,11 @@ class SFTDataCollatorWith4DAttentionMask(MultiModalDataCollatorForSeq2Seq):
         features = super().__call__(features)
         if self.block_diag_attn and self.attn_implementation != "flash_attention_2":
             features["attention_mask"] = prepare_4d_attention_mask(features["attention_mask"], self.compute_dtype)
+        elif self.block_diag_attn and is_transformers_version_greater_than("4.53.0"):  # flatten for varlen attn
+            features.update(prepare_varlen_attention_kwargs(features.pop("attention_mask")))
+            for key in ("input_ids", "labels", "position_ids"):
+                if key in features:
+                    features[key] = features[key].reshape(*features[key].shape[:-2], 1, -1)
 
         for key, value in features.items():  # cast data dtype for paligemma
             if torch.is_tensor(value) and torch.is_floating_point(value):
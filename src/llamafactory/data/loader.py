@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import os
+from functools import partial
 from typing import TYPE_CHECKING, Literal, Optional, Union
 
 import numpy as np
@@ -20,6 +21,7 @@ from datasets import Dataset, DatasetDict, load_dataset, load_from_disk
 
 from ..extras import logging
 from ..extras.constants import FILEEXT2TYPE
+from ..extras.json_stream import generate_json_records, get_json_file_stats, is_json_array
 from ..extras.misc import check_version, has_tokenized_data
 from .converter import align_dataset
 from .data_utils import get_dataset_module, merge_dataset, read_cloud_json, split_dataset
@@ -32,6 +34,18 @@ from .processor import (
     SupervisedDatasetProcessor,
     UnsupervisedDatasetProcessor,
 )
+from .template import PREFIX_CACHE
+from .tokenized_cache import (
+    ROW_HASH_COLUMN,
+    add_row_hashes,
+    get_row_cache_key,
+    get_tokenized_cache_key,
+    load_row_cache,
+    load_tokenized_cache,
+    preprocess_with_row_cache,
+    save_row_cache,
+    save_tokenized_cache,
+)
 
 
 if TYPE_CHECKING:
@@ -48,6 +62,31 @@ if TYPE_CHECKING:
 logger = logging.get_logger(__name__)
 
 
+def _load_json_arrays(
+    data_files: list[str],
+    dataset_attr: "DatasetAttr",
+    model_args: "ModelArguments",
+    data_args: "DataArguments",
+) -> "Dataset":
+    r"""Load local JSON array files by parsing the records incrementally into Arrow, with bounded memory."""
+    try:
+        return Dataset.from_generator(
+            generate_json_records,
+            gen_kwargs={"data_files": get_json_file_stats(data_files)},  # file stats invalidate the cache
+            cache_dir=model_args.cache_dir,
+            split=dataset_attr.split,
+        )
+    except Exception as err:  # e.g., the schema inferred from the first records mismatches
+        logger.warning_rank0(f"Failed to stream JSON files of {dataset_attr}: {err}. Loading them at once.")
+        return load_dataset(
+            "json",
+            data_files=data_files,
+            split=dataset_attr.split,
+            cache_dir=model_args.cache_dir,
+            num_proc=data_args.preprocessing_num_workers,
+        )
+
+
 def _load_single_dataset(
     dataset_attr: "DatasetAttr",
     model_args: "ModelArguments",
@@ -127,6 +166,10 @@ def _load_single_dataset(
         )
     elif dataset_attr.load_from == "cloud_file":
         dataset = Dataset.from_list(read_cloud_json(data_path), split=dataset_attr.split)
+    elif dataset_attr.load_from == "file" and data_path == "json" and all(map(is_json_array, data_files)):
+        dataset = _load_json_arrays(data_files, dataset_attr, model_args, data_args)
+        if data_args.streaming:
+            dataset = dataset.to_iterable_dataset(num_shards=training_args.dataloader_num_workers)
     else:
         dataset = load_dataset(
             path=data_path,
@@ -226,9 +269,20 @@ def _get_dataset_processor(
     return dataset_processor_class(template=template, tokenizer=tokenizer, processor=processor, data_args=data_args)
 
 
+def _is_row_wise(dataset_processor: "DatasetProcessor", data_args: "DataArguments") -> bool:
+    r"""Whether the processor maps each example to at most one row independently of the other examples."""
+    if isinstance(dataset_processor, PackedSupervisedDatasetProcessor):
+        return data_args.packing_scope == "global"  # packing happens after tokenization
+
+    return isinstance(
+        dataset_processor, (SupervisedDatasetProcessor, PairwiseDatasetProcessor, UnsupervisedDatasetProcessor)
+    )
+
+
 def _get_preprocessed_dataset(
     dataset: Union["Dataset", "IterableDataset"] | None,
     data_args: "DataArguments",
+    model_args: "ModelArguments",
     training_args: "Seq2SeqTrainingArguments",
     stage: Literal["pt", "sft", "rm", "ppo", "kto"],
     template: "Template",
@@ -252,14 +306,52 @@ def _get_preprocessed_dataset(
             desc="Running tokenizer on dataset",
         )
 
+    preprocess_func = dataset_processor.preprocess_dataset
+    row_cache_name = None
+    use_row_cache = data_args.tokenized_cache_dir is not None and not data_args.streaming
+    if use_row_cache and _is_row_wise(dataset_processor, data_args):
+        row_cache_key = get_row_cache_key(data_args, model_args, dataset_processor)
+        row_cache_name = "rows-{}-{}".format(row_cache_key[:32], "eval" if is_eval else "train")
+        dataset = add_row_hashes(dataset, row_cache_key, **kwargs)
+        column_names.append(ROW_HASH_COLUMN)
+        cached_dataset = load_row_cache(data_args.tokenized_cache_dir, row_cache_name)
+        hash2index = {}
+        if cached_dataset is not None:
+            hash2index = {row_hash: index for index, row_hash in enumerate(cached_dataset[ROW_HASH_COLUMN])}
+            num_cached = sum(row_hash in hash2index for row_hash in dataset[ROW_HASH_COLUMN])
+            logger.info_rank0(f"Reusing token ids of {num_cached}/{len(dataset)} unchanged examples.")
+
+        preprocess_func = partial(
+            preprocess_with_row_cache,
+            preprocess_func=preprocess_func,
+            cached_dataset=cached_dataset,
+            hash2index=hash2index,
+        )
+
+    prefix_stats = PREFIX_CACHE.get_stats()
     dataset = dataset.map(
-        dataset_processor.preprocess_dataset,
+        preprocess_func,
         batched=True,
         batch_size=data_args.preprocessing_batch_size,
         remove_columns=column_names,
         **kwargs,
     )
 
+    if row_cache_name is not None:
+        if training_args.should_save:
+            save_row_cache(dataset, data_args.tokenized_cache_dir, row_cache_name, data_args.tokenized_cache_size)
+
+        dataset = dataset.remove_columns(ROW_HASH_COLUMN)
+
+    if isinstance(dataset_processor, PackedSupervisedDatasetProcessor) and data_args.packing_scope == "global":
+        kwargs["desc"] = "Packing dataset"
+        dataset = dataset_processor.pack_dataset(dataset, seed=training_args.seed, **kwargs)
+
+    hits = PREFIX_CACHE.hits - prefix_stats["hits"]
+    misses = PREFIX_CACHE.misses - prefix_stats["misses"]
+    if hits + misses > 0:  # not available in the worker processes or streaming mode
+        logger.info_rank0(f"Prefix token cache: {hits} hits, {misses} misses.")
+
     if training_args.should_log:
         try:
             print("eval example:" if is_eval else "training example:")
@@ -298,6 +390,14 @@ def get_dataset(
         if data_args.streaming:
             raise ValueError("Turn off `streaming` when saving dataset to disk.")
 
+    # Load tokenized dataset from the automatic cache if the key matches
+    cache_key = None
+    if data_args.tokenized_path is None and data_args.tokenized_cache_dir is not None and not data_args.streaming:
+        cache_key = get_tokenized_cache_key(data_args, model_args, training_args, stage, tokenizer, processor)
+        tokenized_data = load_tokenized_cache(data_args.tokenized_cache_dir, cache_key)
+        if tokenized_data is not None:
+            return get_dataset_module(tokenized_data)
+
     # Load and preprocess dataset
     with training_args.main_process_first(desc="load dataset", local=(not data_args.data_shared_file_system)):
         dataset = _get_merged_dataset(data_args.dataset, model_args, data_args, training_args, stage)
@@ -316,12 +416,28 @@ def get_dataset(
 
         if "train" in train_dict:
             train_dict["train"] = _get_preprocessed_dataset(
-                train_dict["train"], data_args, training_args, stage, template, tokenizer, processor, is_eval=False
+                train_dict["train"],
+                data_args,
+                model_args,
+                training_args,
+                stage,
+                template,
+                tokenizer,
+                processor,
+                is_eval=False,
             )
 
         for key in eval_dict:
             eval_dict[key] = _get_preprocessed_dataset(
-                eval_dict[key], data_args, training_args, stage, template, tokenizer, processor, is_eval=True
+                eval_dict[key],
+                data_args,
+                model_args,
+                training_args,
+                stage,
+                template,
+                tokenizer,
+                processor,
+                is_eval=True,
             )
 
         # Combine train and eval dictionaries
@@ -333,4 +449,9 @@ def get_dataset(
                 logger.info_rank0(f"Tokenized dataset is saved at {data_args.tokenized_path}.")
                 logger.info_rank0(f"Please launch the training with `tokenized_path: {data_args.tokenized_path}`.")
 
+        if cache_key is not None and training_args.should_save:
+            save_tokenized_cache(
+                dataset_dict, data_args.tokenized_cache_dir, cache_key, max_size=data_args.tokenized_cache_size
+            )
+
         return get_dataset_module(dataset_dict)
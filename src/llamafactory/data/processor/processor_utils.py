@@ -14,6 +14,8 @@
 
 import bisect
 from abc import ABC, abstractmethod
+from collections import defaultdict
+from collections.abc import Callable
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any, Optional
 
@@ -45,6 +47,33 @@ class DatasetProcessor(ABC):
         ...
 
 
+class BatchEncodingTokenizer:
+    r"""A tokenizer wrapper that answers `encode` from the results of a single batched tokenizer call.
+
+    Fast tokenizers encode a list of strings in parallel without the per-call python overhead. Strings not in
+    the batch fall back to the wrapped tokenizer, so the token ids are identical to those of the tokenizer.
+    """
+
+    def __init__(self, tokenizer: "PreTrainedTokenizer", texts: list[str]) -> None:
+        self.__wrapped__ = tokenizer
+        texts = list(dict.fromkeys(texts))  # deduplicate while keeping the order
+        self._token_ids: dict[str, list[int]] = {}
+        if len(texts) != 0:
+            self._token_ids = dict(zip(texts, tokenizer(texts, add_special_tokens=False)["input_ids"]))
+
+    def encode(self, text: str, add_special_tokens: bool = True, **kwargs) -> list[int]:
+        if not add_special_tokens and len(kwargs) == 0 and text in self._token_ids:
+            return list(self._token_ids[text])
+
+        return self.__wrapped__.encode(text, add_special_tokens=add_special_tokens, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__") or name == "_token_ids":  # avoid recursion when unpickling
+            raise AttributeError(name)
+
+        return getattr(self.__wrapped__, name)
+
+
 def search_for_fit(numbers: list[int], capacity: int) -> int:
     r"""Find the index of largest number that fits into the knapsack with the given capacity."""
     index = bisect.bisect(numbers, capacity)
@@ -73,6 +102,102 @@ def greedy_knapsack(numbers: list[int], capacity: int) -> list[list[int]]:
     return knapsacks
 
 
+class MaxSegmentTree:
+    r"""A segment tree maintaining the maximum value, which finds the leftmost position above a threshold."""
+
+    def __init__(self, size: int) -> None:
+        self.size = 1
+        while self.size < size:
+            self.size *= 2
+
+        self.tree = [0] * (2 * self.size)
+
+    def update(self, index: int, value: int) -> None:
+        r"""Set the value at the given position."""
+        index += self.size
+        self.tree[index] = value
+        while index > 1:
+            index //= 2
+            self.tree[index] = max(self.tree[2 * index], self.tree[2 * index + 1])
+
+    def get(self, index: int) -> int:
+        r"""Get the value at the given position."""
+        return self.tree[index + self.size]
+
+    def find_first(self, threshold: int, start: int = 0) -> int:
+        r"""Find the leftmost position not less than start whose value is at least threshold, -1 if not found."""
+        return self._find_first(1, 0, self.size - 1, threshold, start)
+
+    def _find_first(self, node: int, left: int, right: int, threshold: int, start: int) -> int:
+        if right < start or self.tree[node] < threshold:
+            return -1
+
+        if left == right:
+            return left
+
+        mid = (left + right) // 2
+        index = self._find_first(2 * node, left, mid, threshold, start)
+        if index == -1:
+            index = self._find_first(2 * node + 1, mid + 1, right, threshold, start)
+
+        return index
+
+
+def first_fit_decreasing(numbers: list[int], capacity: int) -> list[list[int]]:
+    r"""Implement the first-fit decreasing algorithm for bin packing in O(n log n).
+
+    The remaining capacities of the knapsacks are kept in a segment tree indexed by the knapsack id.
+    """
+    numbers = sorted(numbers, reverse=True)
+    remaining_tree = MaxSegmentTree(len(numbers))
+    knapsacks = []
+    for number in numbers:
+        index = remaining_tree.find_first(number)
+        if index == -1:  # open a new knapsack
+            index = len(knapsacks)
+            knapsacks.append([])
+            remaining_tree.update(index, capacity)
+
+        knapsacks[index].append(number)
+        remaining_tree.update(index, remaining_tree.get(index) - number)
+
+    return knapsacks
+
+
+def best_fit_decreasing(numbers: list[int], capacity: int) -> list[list[int]]:
+    r"""Implement the best-fit decreasing algorithm for bin packing in O(n log capacity).
+
+    The knapsacks are grouped by their remaining capacities, and a segment tree indexed by the remaining capacity
+    finds the fullest knapsack that fits each number.
+    """
+    numbers = sorted(numbers, reverse=True)
+    count_tree = MaxSegmentTree(capacity + 1)
+    remaining2indexes = defaultdict(list)
+    knapsacks = []
+    for number in numbers:
+        remaining = count_tree.find_first(1, start=number)
+        if remaining == -1:  # open a new knapsack
+            index, remaining = len(knapsacks), capacity
+            knapsacks.append([])
+        else:
+            index = remaining2indexes[remaining].pop()
+            count_tree.update(remaining, len(remaining2indexes[remaining]))
+
+        knapsacks[index].append(number)
+        remaining -= number
+        remaining2indexes[remaining].append(index)
+        count_tree.update(remaining, len(remaining2indexes[remaining]))
+
+    return knapsacks
+
+
+PACKING_ALGORITHMS: dict[str, Callable[[list[int], int], list[list[int]]]] = {
+    "greedy": greedy_knapsack,
+    "ffd": first_fit_decreasing,
+    "bfd": best_fit_decreasing,
+}
+
+
 def infer_seqlen(source_len: int, target_len: int, cutoff_len: int) -> tuple[int, int]:
     r"""Compute the real sequence length after truncation by the cutoff_len."""
     if target_len * 2 < cutoff_len:  # truncate source
@@ -12,16 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import random
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, Optional
+from functools import partial
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+import numpy as np
+import pyarrow.compute as pc
+from datasets import Dataset
 
 from ...extras import logging
 from ...extras.constants import IGNORE_INDEX
-from .processor_utils import DatasetProcessor, greedy_knapsack, infer_seqlen
+from .processor_utils import PACKING_ALGORITHMS, BatchEncodingTokenizer, DatasetProcessor, infer_seqlen
 
 
 if TYPE_CHECKING:
+    from numpy.typing import NDArray
+    from transformers import PreTrainedTokenizer
+
     from ..mm_plugin import AudioInput, ImageInput, VideoInput
 
 
@@ -39,12 +48,13 @@ class SupervisedDatasetProcessor(DatasetProcessor):
         images: list["ImageInput"],
         videos: list["VideoInput"],
         audios: list["AudioInput"],
+        tokenizer: Optional["PreTrainedTokenizer"] = None,
     ) -> tuple[list[int], list[int]]:
         messages = self.template.mm_plugin.process_messages(prompt + response, images, videos, audios, self.processor)
         input_ids, labels = self.template.mm_plugin.process_token_ids(
             [], [], images, videos, audios, self.tokenizer, self.processor
         )
-        encoded_pairs = self.template.encode_multiturn(self.tokenizer, messages, system, tools)
+        encoded_pairs = self.template.encode_multiturn(tokenizer or self.tokenizer, messages, system, tools)
         total_length = len(input_ids) + (1 if self.template.efficient_eos else 0)
         if self.data_args.mask_history:
             encoded_pairs = encoded_pairs[::-1]  # high priority for last turns
@@ -85,10 +95,24 @@ class SupervisedDatasetProcessor(DatasetProcessor):
 
         return input_ids, labels
 
+    def _get_batch_tokenizer(self, examples: dict[str, list[Any]]) -> "PreTrainedTokenizer":
+        r"""Return a tokenizer that has encoded all the texts of the examples in one call."""
+        if not self.data_args.batch_tokenize or not getattr(self.tokenizer, "is_fast", False):
+            return self.tokenizer
+
+        texts = []
+        for i in range(len(examples["_prompt"])):
+            texts += self.template.get_text_elements(
+                examples["_prompt"][i] + examples["_response"][i], examples["_system"][i], examples["_tools"][i]
+            )
+
+        return BatchEncodingTokenizer(self.tokenizer, texts)
+
     def preprocess_dataset(self, examples: dict[str, list[Any]]) -> dict[str, list[Any]]:
         # build inputs with format `<bos> X Y <eos>` and labels with format `<ignore> ... <ignore> Y <eos>`
         # for multiturn examples, we only mask the prompt part in each prompt-response pair.
         model_inputs = defaultdict(list)
+        tokenizer = self._get_batch_tokenizer(examples)
         for i in range(len(examples["_prompt"])):
             if len(examples["_prompt"][i]) % 2 != 1 or len(examples["_response"][i]) != 1:
                 logger.warning_rank0(
@@ -104,6 +128,7 @@ class SupervisedDatasetProcessor(DatasetProcessor):
                 images=examples["_images"][i] or [],
                 videos=examples["_videos"][i] or [],
                 audios=examples["_audios"][i] or [],
+                tokenizer=tokenizer,
             )
             model_inputs["input_ids"].append(input_ids)
             model_inputs["attention_mask"].append([1] * len(input_ids))
@@ -124,14 +149,68 @@ class SupervisedDatasetProcessor(DatasetProcessor):
 
 @dataclass
 class PackedSupervisedDatasetProcessor(SupervisedDatasetProcessor):
+    def _get_packed_example(
+        self,
+        batch_input_ids: list[Union[list[int], "NDArray"]],
+        batch_labels: list[Union[list[int], "NDArray"]],
+        batch_images: list[list["ImageInput"]],
+        batch_videos: list[list["VideoInput"]],
+        batch_audios: list[list["AudioInput"]],
+    ) -> dict[str, Any]:
+        r"""Concatenate the examples in one knapsack and pad them to the cutoff length.
+
+        Each field is a preallocated int32 array filled by slice assignment, avoiding the per-token list operations.
+        """
+        seq_length = self.data_args.cutoff_len + 1  # avoid flash_attn drops attn mask
+        total_length = sum(len(input_ids) for input_ids in batch_input_ids)
+        if total_length > seq_length:
+            raise ValueError("The length of packed example should be identical to the cutoff length.")
+
+        packed_input_ids = np.full(seq_length, self.tokenizer.pad_token_id, dtype=np.int32)
+        packed_position_ids = np.zeros(seq_length, dtype=np.int32)  # NOTE: pad_to_multiple_of ignore this
+        packed_labels = np.full(seq_length, IGNORE_INDEX, dtype=np.int32)
+        if self.data_args.neat_packing:
+            packed_attention_masks = np.zeros(seq_length, dtype=np.int32)
+        else:
+            packed_attention_masks = np.ones(seq_length, dtype=np.int32)  # more efficient flash_attn
+
+        offset = 0
+        packed_images, packed_videos, packed_audios = [], [], []
+        for i in range(len(batch_input_ids)):
+            length = len(batch_input_ids[i])
+            packed_input_ids[offset : offset + length] = batch_input_ids[i]
+            packed_position_ids[offset : offset + length] = np.arange(length, dtype=np.int32)
+            packed_labels[offset : offset + length] = batch_labels[i]
+            if self.data_args.neat_packing:
+                packed_attention_masks[offset : offset + length] = i + 1  # start from 1
+
+            packed_images += batch_images[i]
+            packed_videos += batch_videos[i]
+            packed_audios += batch_audios[i]
+            offset += length
+
+        return {
+            "input_ids": packed_input_ids,
+            "attention_mask": packed_attention_masks,
+            "position_ids": packed_position_ids,
+            "labels": packed_labels,
+            "images": packed_images or None,
+            "videos": packed_videos or None,
+            "audios": packed_audios or None,
+        }
+
     def preprocess_dataset(self, examples: dict[str, list[Any]]) -> dict[str, list[Any]]:
         # TODO: use `position_ids` to achieve packing
         # build inputs with format `<bos> X1 Y1 <eos> <bos> X2 Y2 <eos>`
         # and labels with format `<ignore> ... <ignore> Y1 <eos> <ignore> ... <ignore> Y2 <eos>`
+        if self.data_args.packing_scope == "global":  # only tokenize here, pack later in `pack_dataset`
+            return super().preprocess_dataset(examples)
+
         valid_num = 0
         batch_input_ids, batch_labels, batch_images, batch_videos, batch_audios = [], [], [], [], []
         lengths = []
         length2indexes = defaultdict(list)
+        tokenizer = self._get_batch_tokenizer(examples)
         for i in range(len(examples["_prompt"])):
             if len(examples["_prompt"][i]) % 2 != 1 or len(examples["_response"][i]) != 1:
                 logger.warning_rank0(
@@ -147,6 +226,7 @@ class PackedSupervisedDatasetProcessor(SupervisedDatasetProcessor):
                 images=examples["_images"][i] or [],
                 videos=examples["_videos"][i] or [],
                 audios=examples["_audios"][i] or [],
+                tokenizer=tokenizer,
             )
             length = len(input_ids)
             if length > self.data_args.cutoff_len:
@@ -162,42 +242,84 @@ class PackedSupervisedDatasetProcessor(SupervisedDatasetProcessor):
                 valid_num += 1
 
         model_inputs = defaultdict(list)
-        knapsacks = greedy_knapsack(lengths, self.data_args.cutoff_len)
+        num_examples, num_tokens = len(lengths), sum(lengths)
+        knapsacks = PACKING_ALGORITHMS[self.data_args.packing_algorithm](lengths, self.data_args.cutoff_len)
+        if len(knapsacks) != 0:
+            efficiency = num_tokens / (len(knapsacks) * self.data_args.cutoff_len)
+            logger.info_rank0(
+                f"Packed {num_examples} examples into {len(knapsacks)} rows, efficiency: {efficiency:.2%}."
+            )
+
         for knapsack in knapsacks:
-            packed_input_ids, packed_attention_masks, packed_position_ids, packed_labels = [], [], [], []
-            packed_images, packed_videos, packed_audios = [], [], []
-            for i, length in enumerate(knapsack):
-                index = length2indexes[length].pop()
-                packed_input_ids += batch_input_ids[index]
-                packed_position_ids += list(range(len(batch_input_ids[index])))  # NOTE: pad_to_multiple_of ignore this
-                packed_labels += batch_labels[index]
-                packed_images += batch_images[index]
-                packed_videos += batch_videos[index]
-                packed_audios += batch_audios[index]
-                if self.data_args.neat_packing:
-                    packed_attention_masks += [i + 1] * len(batch_input_ids[index])  # start from 1
-                else:
-                    packed_attention_masks += [1] * len(batch_input_ids[index])
-
-            if len(packed_input_ids) < self.data_args.cutoff_len + 1:  # avoid flash_attn drops attn mask
-                pad_length = self.data_args.cutoff_len - len(packed_input_ids) + 1
-                packed_input_ids += [self.tokenizer.pad_token_id] * pad_length
-                packed_position_ids += [0] * pad_length
-                packed_labels += [IGNORE_INDEX] * pad_length
-                if self.data_args.neat_packing:
-                    packed_attention_masks += [0] * pad_length
-                else:
-                    packed_attention_masks += [1] * pad_length  # more efficient flash_attn
-
-            if len(packed_input_ids) != self.data_args.cutoff_len + 1:
-                raise ValueError("The length of packed example should be identical to the cutoff length.")
-
-            model_inputs["input_ids"].append(packed_input_ids)
-            model_inputs["attention_mask"].append(packed_attention_masks)
-            model_inputs["position_ids"].append(packed_position_ids)
-            model_inputs["labels"].append(packed_labels)
-            model_inputs["images"].append(packed_images or None)
-            model_inputs["videos"].append(packed_videos or None)
-            model_inputs["audios"].append(packed_audios or None)
+            indexes = [length2indexes[length].pop() for length in knapsack]
+            packed_example = self._get_packed_example(
+                [batch_input_ids[index] for index in indexes],
+                [batch_labels[index] for index in indexes],
+                [batch_images[index] for index in indexes],
+                [batch_videos[index] for index in indexes],
+                [batch_audios[index] for index in indexes],
+            )
+            for key, value in packed_example.items():
+                model_inputs[key].append(value)
+
+        return model_inputs
+
+    def get_packing_plan(self, lengths: list[int], seed: int) -> list[list[int]]:
+        r"""Pack the examples of the whole dataset by their lengths.
+
+        Returns the row ids of the examples in each knapsack.
+        """
+        row_ids = [row_id for row_id, length in enumerate(lengths) if length <= self.data_args.cutoff_len]
+        if len(row_ids) != len(lengths):
+            logger.warning_rank0(
+                f"Dropped {len(lengths) - len(row_ids)} lengthy examples with length > {self.data_args.cutoff_len}."
+            )
+
+        random.Random(seed).shuffle(row_ids)  # examples of equal length are assigned by seed
+        length2row_ids = defaultdict(list)
+        for row_id in row_ids:
+            length2row_ids[lengths[row_id]].append(row_id)
+
+        valid_lengths = [lengths[row_id] for row_id in row_ids]
+        knapsacks = PACKING_ALGORITHMS[self.data_args.packing_algorithm](valid_lengths, self.data_args.cutoff_len)
+        if len(knapsacks) != 0:
+            efficiency = sum(valid_lengths) / (len(knapsacks) * self.data_args.cutoff_len)
+            logger.info_rank0(
+                f"Packed {len(valid_lengths)} examples into {len(knapsacks)} rows, efficiency: {efficiency:.2%}."
+            )
+
+        return [[length2row_ids[length].pop() for length in knapsack] for knapsack in knapsacks]
+
+    def pack_dataset(self, dataset: "Dataset", seed: int, **kwargs) -> "Dataset":
+        r"""Pack the tokenized dataset globally, i.e., across the pre-processing batches.
+
+        The packing plan only holds the row ids, the token ids are copied when the packed rows are built.
+        """
+        lengths = pc.list_value_length(dataset.data.column("input_ids")).to_pylist()
+        plan = Dataset.from_dict({"packed_row_ids": self.get_packing_plan(lengths, seed)})
+        return plan.map(
+            partial(self._materialize_packed_dataset, dataset=dataset),
+            batched=True,
+            batch_size=self.data_args.preprocessing_batch_size,
+            remove_columns=["packed_row_ids"],
+            **kwargs,
+        )
+
+    def _materialize_packed_dataset(self, plan: dict[str, list[Any]], dataset: "Dataset") -> dict[str, list[Any]]:
+        row_ids = sorted({row_id for knapsack in plan["packed_row_ids"] for row_id in knapsack})
+        examples = dataset.with_format("numpy", columns=["input_ids", "labels"], output_all_columns=True)[row_ids]
+        row_id2index = {row_id: index for index, row_id in enumerate(row_ids)}
+        model_inputs = defaultdict(list)
+        for knapsack in plan["packed_row_ids"]:
+            indexes = [row_id2index[row_id] for row_id in knapsack]
+            packed_example = self._get_packed_example(
+                [examples["input_ids"][index] for index in indexes],
+                [examples["labels"][index] for index in indexes],
+                [examples["images"][index] or [] for index in indexes],
+                [examples["videos"][index] or [] for index in indexes],
+                [examples["audios"][index] or [] for index in indexes],
+            )
+            for key, value in packed_example.items():
+                model_inputs[key].append(value)
 
         return model_inputs
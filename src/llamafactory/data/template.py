@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import re
+import threading
+from collections import OrderedDict
 from copy import deepcopy
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Optional, Union
@@ -37,6 +39,61 @@ if TYPE_CHECKING:
 logger = logging.get_logger(__name__)
 
 
+class PrefixTokenCache:
+    r"""A bounded LRU cache for the token ids of the turn-0 prefix (prefix + system + tools).
+
+    Most datasets share the same system prompt and tools across examples, so we tokenize them once per
+    distinct value instead of once per example. Entries are keyed on the identity of the template and the
+    tokenizer, thus the cache should be cleared whenever either of them is modified. It is shared by the
+    worker threads of the HF scheduler, so every access holds a lock.
+    """
+
+    def __init__(self, maxsize: int = 64) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[tuple[int, int, str, Optional[str]], list[int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[int, int, str, Optional[str]]) -> Optional[list[int]]:
+        r"""Return the cached token ids and mark them as recently used, or None if missing."""
+        with self._lock:
+            token_ids = self._cache.get(key)
+            if token_ids is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return token_ids
+
+    def put(self, key: tuple[int, int, str, Optional[str]], token_ids: list[int]) -> None:
+        r"""Add token ids to the cache, evicting the least recently used entry if it is full."""
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._cache[key] = token_ids
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def clear(self) -> None:
+        r"""Remove all entries and reset the counters."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> dict[str, int]:
+        r"""Return the hit and miss counters."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+
+PREFIX_CACHE = PrefixTokenCache()
+
+
 @dataclass
 class Template:
     format_user: "Formatter"
@@ -127,6 +184,62 @@ class Template:
 
         return token_ids
 
+    def _get_prefix_ids(self, tokenizer: "PreTrainedTokenizer", system: str, tools: Optional[str]) -> list[int]:
+        r"""Return the token ids of prefix + system + tools, which are memoized in the prefix cache.
+
+        Since the elements are tokenized one by one, this is identical to tokenizing them with the first query.
+        """
+        key = (id(self), id(getattr(tokenizer, "__wrapped__", tokenizer)), system, tools)
+        prefix_ids = PREFIX_CACHE.get(key)
+        if prefix_ids is None:
+            prefix_ids = self._convert_elements_to_ids(tokenizer, self._get_prefix_elements(system, tools))
+            PREFIX_CACHE.put(key, prefix_ids)
+
+        return prefix_ids
+
+    def _get_prefix_elements(self, system: str, tools: Optional[str]) -> "SLOTS":
+        r"""Return the formatted elements of prefix + system + tools."""
+        elements = []
+        elements += self.format_prefix.apply()
+        if system or tools:
+            tool_text = self.format_tools.apply(content=tools)[0] if tools else ""
+            elements += self.format_system.apply(content=(system + tool_text))
+
+        return elements
+
+    def _get_message_elements(self, i: int, message: dict[str, str]) -> "SLOTS":
+        r"""Return the formatted elements of the i-th message."""
+        if message["role"] == Role.USER:
+            return self.format_user.apply(content=message["content"], idx=str(i // 2))
+        elif message["role"] == Role.ASSISTANT:
+            return self.format_assistant.apply(content=message["content"])
+        elif message["role"] == Role.OBSERVATION:
+            return self.format_observation.apply(content=message["content"])
+        elif message["role"] == Role.FUNCTION:
+            return self.format_function.apply(
+                content=message["content"], thought_words=self.thought_words, tool_call_words=self.tool_call_words
+            )
+        else:
+            raise NotImplementedError("Unexpected role: {}".format(message["role"]))
+
+    def get_text_elements(
+        self,
+        messages: list[dict[str, str]],
+        system: Optional[str] = None,
+        tools: Optional[str] = None,
+    ) -> list[str]:
+        r"""Return the strings that will be passed to `tokenizer.encode` when encoding the messages.
+
+        It is used to tokenize many examples in one batched call. Missing strings are still encoded one by one,
+        thus the result only affects the speed.
+        """
+        system = system or self.default_system
+        elements = self._get_prefix_elements(system, tools)
+        for i, message in enumerate(messages):
+            elements += self._get_message_elements(i, message)
+
+        return [elem for elem in elements if isinstance(elem, str) and len(elem) != 0]
+
     def _encode(
         self,
         tokenizer: "PreTrainedTokenizer",
@@ -142,28 +255,11 @@ class Template:
         system = system or self.default_system
         encoded_messages = []
         for i, message in enumerate(messages):
-            elements = []
-
+            token_ids = self._convert_elements_to_ids(tokenizer, self._get_message_elements(i, message))
             if i == 0:
-                elements += self.format_prefix.apply()
-                if system or tools:
-                    tool_text = self.format_tools.apply(content=tools)[0] if tools else ""
-                    elements += self.format_system.apply(content=(system + tool_text))
-
-            if message["role"] == Role.USER:
-                elements += self.format_user.apply(content=message["content"], idx=str(i // 2))
-            elif message["role"] == Role.ASSISTANT:
-                elements += self.format_assistant.apply(content=message["content"])
-            elif message["role"] == Role.OBSERVATION:
-                elements += self.format_observation.apply(content=message["content"])
-            elif message["role"] == Role.FUNCTION:
-                elements += self.format_function.apply(
-                    content=message["content"], thought_words=self.thought_words, tool_call_words=self.tool_call_words
-                )
-            else:
-                raise NotImplementedError("Unexpected role: {}".format(message["role"]))
+                token_ids = self._get_prefix_ids(tokenizer, system, tools) + token_ids
 
-            encoded_messages.append(self._convert_elements_to_ids(tokenizer, elements))
+            encoded_messages.append(token_ids)
 
         return encoded_messages
 
@@ -458,6 +554,20 @@ class ReasoningTemplate(Template):
 
         return [(encoded_messages[i], encoded_messages[i + 1]) for i in range(0, len(encoded_messages), 2)]
 
+    @override
+    def get_text_elements(
+        self,
+        messages: list[dict[str, str]],
+        system: Optional[str] = None,
+        tools: Optional[str] = None,
+    ) -> list[str]:
+        if self.enable_thinking is False:  # remove all cot
+            messages = deepcopy(messages)
+            for i in range(1, len(messages), 2):
+                messages[i]["content"] = self.remove_thought(messages[i]["content"])
+
+        return super().get_text_elements(messages, system, tools) + [self.add_thought()]
+
 
 TEMPLATES: dict[str, "Template"] = {}
 
@@ -635,6 +745,7 @@ def get_template_and_fix_tokenizer(tokenizer: "PreTrainedTokenizer", data_args:
 
     template.fix_special_tokens(tokenizer)
     template.fix_jinja_template(tokenizer)
+    PREFIX_CACHE.clear()  # the template or the tokenizer may have been modified
     return template
 
 
@@ -0,0 +1,332 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from dataclasses import asdict, fields
+from functools import partial
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from datasets import load_from_disk
+
+from ..extras import logging
+from ..extras.misc import has_tokenized_data
+from .parser import get_dataset_list
+
+
+if TYPE_CHECKING:
+    from datasets import Dataset, DatasetDict
+    from transformers import PreTrainedTokenizer, ProcessorMixin, Seq2SeqTrainingArguments
+
+    from ..hparams import DataArguments, ModelArguments
+    from .processor import DatasetProcessor
+
+
+logger = logging.get_logger(__name__)
+
+
+CACHE_VERSION = "1"
+
+LAST_USED_FILE = ".last_used"
+
+ROW_HASH_COLUMN = "_row_hash"
+
+ROW_ARGS_KEYS = [
+    "template",
+    "cutoff_len",
+    "train_on_prompt",
+    "mask_history",
+    "tool_format",
+    "default_system",
+    "enable_thinking",
+]
+
+DATA_ARGS_KEYS = ROW_ARGS_KEYS + [
+    "dataset",
+    "eval_dataset",
+    "mix_strategy",
+    "interleave_probs",
+    "max_samples",
+    "val_size",
+    "eval_on_each_dataset",
+    "packing",
+    "neat_packing",
+    "packing_algorithm",
+    "packing_scope",
+    "preprocessing_batch_size",  # the batches are the packing units of packing_scope=batch
+]
+
+
+def _hash_file(path: str, hasher: "hashlib._Hash") -> None:
+    r"""Update the hasher with the contents of a file, reading it in chunks."""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+
+
+def _hash_datasets(dataset_names: Optional[list[str]], data_args: "DataArguments", hasher: "hashlib._Hash") -> None:
+    r"""Update the hasher with the dataset_info.json entries and the contents of the local dataset files."""
+    for dataset_attr in get_dataset_list(dataset_names, data_args.dataset_dir):
+        hasher.update(json.dumps(asdict(dataset_attr), sort_keys=True).encode("utf-8"))
+        if dataset_attr.load_from != "file":  # remote datasets are identified by their names
+            continue
+
+        local_path = os.path.join(data_args.dataset_dir, dataset_attr.dataset_name)
+        if os.path.isdir(local_path):
+            data_files = [os.path.join(local_path, file_name) for file_name in sorted(os.listdir(local_path))]
+        else:
+            data_files = [local_path]
+
+        for data_file in data_files:
+            if os.path.isfile(data_file):
+                hasher.update(os.path.basename(data_file).encode("utf-8"))
+                _hash_file(data_file, hasher)
+
+
+def _hash_tokenizer(tokenizer: "PreTrainedTokenizer", hasher: "hashlib._Hash") -> None:
+    r"""Update the hasher with the vocabulary, the special tokens and the chat template of the tokenizer."""
+    hasher.update(type(tokenizer).__name__.encode("utf-8"))
+    hasher.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode("utf-8"))
+    hasher.update(json.dumps(tokenizer.special_tokens_map, sort_keys=True, default=str).encode("utf-8"))
+    hasher.update(str(tokenizer.chat_template).encode("utf-8"))
+
+
+def _hash_config(
+    keys: list[str],
+    data_args: "DataArguments",
+    model_args: "ModelArguments",
+    processor: Optional["ProcessorMixin"],
+    hasher: "hashlib._Hash",
+    **extra_config,
+) -> None:
+    r"""Update the hasher with the given data arguments and the multimodal arguments."""
+    config: dict[str, Any] = {key: getattr(data_args, key) for key in keys}
+    config.update(extra_config)
+    if processor is not None:  # the number of multimodal tokens depends on the processor
+        config["processor"] = type(processor).__name__
+        for field in fields(model_args):
+            if field.name.startswith(("image_", "video_", "audio_")):
+                config[field.name] = getattr(model_args, field.name)
+
+    hasher.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+
+
+def get_tokenized_cache_key(
+    data_args: "DataArguments",
+    model_args: "ModelArguments",
+    training_args: "Seq2SeqTrainingArguments",
+    stage: str,
+    tokenizer: "PreTrainedTokenizer",
+    processor: Optional["ProcessorMixin"] = None,
+) -> str:
+    r"""Compute the content-addressed key of the tokenized datasets.
+
+    The key covers the dataset files and their dataset_info.json entries, the tokenizer and the data arguments
+    that affect the tokenized results, other arguments can be changed freely without invalidating the cache.
+    """
+    hasher = hashlib.sha256(CACHE_VERSION.encode("utf-8"))
+    _hash_datasets(data_args.dataset, data_args, hasher)
+    _hash_datasets(data_args.eval_dataset, data_args, hasher)
+    _hash_tokenizer(tokenizer, hasher)
+    _hash_config(
+        DATA_ARGS_KEYS,
+        data_args,
+        model_args,
+        processor,
+        hasher,
+        stage=stage,
+        seed=training_args.seed,
+        predict_with_generate=training_args.predict_with_generate,
+    )
+    return hasher.hexdigest()
+
+
+def get_row_cache_key(
+    data_args: "DataArguments",
+    model_args: "ModelArguments",
+    dataset_processor: "DatasetProcessor",
+) -> str:
+    r"""Compute the key of the per-row token ids, which only depends on how a single example is tokenized."""
+    hasher = hashlib.sha256(CACHE_VERSION.encode("utf-8"))
+    _hash_tokenizer(dataset_processor.tokenizer, hasher)
+    _hash_config(
+        ROW_ARGS_KEYS,
+        data_args,
+        model_args,
+        dataset_processor.processor,
+        hasher,
+        dataset_processor=type(dataset_processor).__name__,
+    )
+    return hasher.hexdigest()
+
+
+def _add_row_hashes(examples: dict[str, list[Any]], key: str) -> dict[str, list[str]]:
+    row_hashes = []
+    for i in range(len(examples["_prompt"])):
+        row = {column: values[i] for column, values in examples.items()}
+        row_bytes = json.dumps(row, sort_keys=True, default=str).encode("utf-8")
+        row_hashes.append(hashlib.blake2b(row_bytes, key=key.encode("utf-8")[:64], digest_size=16).hexdigest())
+
+    return {ROW_HASH_COLUMN: row_hashes}
+
+
+def add_row_hashes(dataset: "Dataset", key: str, **kwargs) -> "Dataset":
+    r"""Add a column holding the content hash of each aligned example."""
+    kwargs["desc"] = "Hashing dataset rows"
+    return dataset.map(partial(_add_row_hashes, key=key), batched=True, **kwargs)
+
+
+def load_row_cache(cache_dir: str, name: str) -> Optional["Dataset"]:
+    r"""Load the latest tokenized rows saved under the given name, or return None if missing."""
+    if not os.path.isdir(cache_dir):
+        return None
+
+    entries = sorted(entry for entry in os.listdir(cache_dir) if entry.startswith(f"{name}-"))
+    for entry in reversed(entries):
+        cache_path = os.path.join(cache_dir, entry)
+        if os.path.isfile(os.path.join(cache_path, LAST_USED_FILE)):
+            try:
+                dataset = load_from_disk(cache_path)
+            except Exception as err:
+                logger.warning_rank0(f"Failed to load tokenized rows {cache_path}: {err}.")
+                return None
+
+            _touch(cache_path)
+            return dataset
+
+    return None
+
+
+def save_row_cache(dataset: "Dataset", cache_dir: str, name: str, max_size: float) -> None:
+    r"""Save the tokenized rows under the given name, and remove the previous versions."""
+    entry = f"{name}-{time.time_ns():020d}"
+    save_tokenized_cache(dataset, cache_dir, entry, max_size)
+    for old_entry in os.listdir(cache_dir):
+        if old_entry.startswith(f"{name}-") and old_entry != entry:
+            shutil.rmtree(os.path.join(cache_dir, old_entry), ignore_errors=True)
+
+
+def preprocess_with_row_cache(
+    examples: dict[str, list[Any]],
+    preprocess_func: Callable[[dict[str, list[Any]]], dict[str, list[Any]]],
+    cached_dataset: Optional["Dataset"],
+    hash2index: dict[str, int],
+) -> dict[str, list[Any]]:
+    r"""Reuse the token ids of the cached rows and only tokenize the new or changed ones.
+
+    The processor should map each example to at most one output row. The outputs keep the row hashes so that
+    they can be saved as the cache of the next run.
+    """
+    row_hashes = examples.pop(ROW_HASH_COLUMN)
+    outputs: list[Optional[dict[str, Any]]] = [None] * len(row_hashes)
+    cached_indexes = [i for i, row_hash in enumerate(row_hashes) if row_hash in hash2index]
+    if len(cached_indexes) != 0:
+        cached_rows = cached_dataset[[hash2index[row_hashes[i]] for i in cached_indexes]]
+        cached_rows.pop(ROW_HASH_COLUMN)
+        for k, i in enumerate(cached_indexes):
+            outputs[i] = {column: values[k] for column, values in cached_rows.items()}
+
+    new_indexes = [i for i in range(len(row_hashes)) if outputs[i] is None]
+    if len(new_indexes) != 0:
+        new_rows = preprocess_func({column: [values[i] for i in new_indexes] for column, values in examples.items()})
+        if len(next(iter(new_rows.values()), [])) == len(new_indexes):
+            for k, i in enumerate(new_indexes):
+                outputs[i] = {column: values[k] for column, values in new_rows.items()}
+        else:  # some examples are dropped, process them one by one to align the outputs
+            for i in new_indexes:
+                new_row = preprocess_func({column: [values[i]] for column, values in examples.items()})
+                if len(next(iter(new_row.values()), [])) == 1:
+                    outputs[i] = {column: values[0] for column, values in new_row.items()}
+
+    model_inputs = defaultdict(list)
+    for row_hash, output in zip(row_hashes, outputs):
+        if output is not None:
+            for column, value in output.items():
+                model_inputs[column].append(value)
+
+            model_inputs[ROW_HASH_COLUMN].append(row_hash)
+
+    return model_inputs
+
+
+def load_tokenized_cache(cache_dir: str, key: str) -> Optional["DatasetDict"]:
+    r"""Load the memory-mapped tokenized datasets from the cache, or return None if missing."""
+    cache_path = os.path.join(cache_dir, key)
+    if not has_tokenized_data(cache_path) or not os.path.isfile(os.path.join(cache_path, LAST_USED_FILE)):
+        return None
+
+    try:
+        dataset_dict = load_from_disk(cache_path)
+    except Exception as err:
+        logger.warning_rank0(f"Failed to load tokenized cache {cache_path}: {err}.")
+        return None
+
+    _touch(cache_path)
+    logger.info_rank0(f"Loaded tokenized dataset from cache {cache_path}.")
+    return dataset_dict
+
+
+def save_tokenized_cache(
+    dataset_dict: Union["Dataset", "DatasetDict"], cache_dir: str, key: str, max_size: float
+) -> None:
+    r"""Save the tokenized datasets to the cache and evict the least recently used entries beyond max_size (GB)."""
+    cache_path = os.path.join(cache_dir, key)
+    tmp_path = cache_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    dataset_dict.save_to_disk(tmp_path)
+    _touch(tmp_path)  # the marker file indicates a complete entry
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp_path, cache_path)
+    logger.info_rank0(f"Tokenized dataset is cached at {cache_path}.")
+    _evict(cache_dir, max_size, keep=key)
+
+
+def _touch(cache_path: str) -> None:
+    with open(os.path.join(cache_path, LAST_USED_FILE), "w") as f:
+        f.write(str(time.time()))
+
+
+def _get_dir_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            size += os.path.getsize(os.path.join(root, file_name))
+
+    return size
+
+
+def _evict(cache_dir: str, max_size: float, keep: str) -> None:
+    r"""Remove the least recently used cache entries until the total size fits into max_size (GB)."""
+    entries = []
+    for key in os.listdir(cache_dir):
+        marker = os.path.join(cache_dir, key, LAST_USED_FILE)
+        if os.path.isfile(marker):
+            entries.append((os.path.getmtime(marker), key, _get_dir_size(os.path.join(cache_dir, key))))
+
+    total_size = sum(size for _, _, size in entries)
+    for _, key, size in sorted(entries):
+        if total_size <= max_size * (1024**3):
+            break
+
+        if key == keep:
+            continue
+
+        shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+        total_size -= size
+        logger.info_rank0(f"Evicted tokenized cache {key}.")
@@ -0,0 +1,116 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+from collections.abc import Iterator
+from typing import Any
+
+
+_WHITESPACE = " \t\n\r"
+
+
+def is_json_array(path: str) -> bool:
+    r"""Check whether the file holds a top-level JSON array."""
+    with open(path, encoding="utf-8-sig") as f:
+        while True:
+            char = f.read(1)
+            if char == "" or char not in _WHITESPACE:
+                return char == "["
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    r"""Yield the elements of a top-level JSON array one by one, reading the file in chunks.
+
+    The memory usage is bounded by the chunk size and the largest element instead of the file size.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8-sig") as f:
+        buffer, pos, eof = "", 0, False
+
+        def refill() -> None:
+            nonlocal buffer, pos, eof
+            chunk = f.read(max(chunk_size, len(buffer) - pos))  # double the buffer for large elements
+            eof = chunk == ""
+            buffer, pos = buffer[pos:] + chunk, 0
+
+        started = False
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+
+            if pos == len(buffer):
+                if eof:
+                    raise ValueError(f"Unexpected end of JSON array in {path}.")
+
+                refill()
+                continue
+
+            char = buffer[pos]
+            if not started:
+                if char != "[":
+                    raise ValueError(f"Expected a JSON array in {path}.")
+
+                started = True
+                pos += 1
+            elif char == ",":
+                pos += 1
+            elif char == "]":
+                return
+            else:
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+
+                    refill()
+                    continue
+
+                # a number cut by the chunk boundary decodes as its prefix (`1.` -> 1), so an element is only
+                # complete once a delimiter follows it
+                following = end
+                while following < len(buffer) and buffer[following] in _WHITESPACE:
+                    following += 1
+
+                if not eof and (following == len(buffer) or buffer[following] not in ",]"):
+                    refill()
+                    continue
+
+                yield element
+                pos = end
+                if pos >= chunk_size:  # drop the consumed text
+                    buffer, pos = buffer[pos:], 0
+
+
+def iter_json_records(path: str) -> Iterator[Any]:
+    r"""Yield the records of a JSON array or a JSON lines file with bounded memory."""
+    if is_json_array(path):
+        yield from iter_json_array(path)
+    else:
+        with open(path, encoding="utf-8-sig") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def get_json_file_stats(data_files: list[str]) -> list[tuple[str, int, int]]:
+    r"""Return the path, size and modification time of each file, used to invalidate the generator cache."""
+    return [(data_file, os.path.getsize(data_file), os.stat(data_file).st_mtime_ns) for data_file in data_files]
+
+
+def generate_json_records(data_files: list[tuple[str, int, int]]) -> Iterator[Any]:
+    r"""Generate the records of the JSON files, used in `Dataset.from_generator`."""
+    for data_file, _, _ in data_files:
+        yield from iter_json_records(data_file)
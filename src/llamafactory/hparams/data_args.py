@@ -79,6 +79,15 @@ class DataArguments:
         default=1000,
         metadata={"help": "The number of examples in one group in pre-processing."},
     )
+    batch_tokenize: bool = field(
+        default=True,
+        metadata={
+            "help": (
+                "Whether or not to tokenize all the texts of a pre-processing batch in one tokenizer call. "
+                "Only effective for fast tokenizers in supervised fine-tuning."
+            )
+        },
+    )
     preprocessing_num_workers: int | None = field(
         default=None,
         metadata={"help": "The number of processes to use for the pre-processing."},
@@ -111,6 +120,24 @@ class DataArguments:
         default=False,
         metadata={"help": "Enable sequence packing without cross-attention."},
     )
+    packing_algorithm: Literal["greedy", "ffd", "bfd"] = field(
+        default="greedy",
+        metadata={
+            "help": (
+                "Algorithm to use in sequences packing: greedy knapsack, first-fit decreasing (ffd) "
+                "or best-fit decreasing (bfd)."
+            )
+        },
+    )
+    packing_scope: Literal["batch", "global"] = field(
+        default="batch",
+        metadata={
+            "help": (
+                "Scope of sequences packing. `batch` packs the examples in each pre-processing batch, "
+                "`global` packs the examples of the whole dataset after tokenization."
+            )
+        },
+    )
     tool_format: str | None = field(
         default=None,
         metadata={"help": "Tool format to use for constructing function calling examples."},
@@ -133,6 +160,19 @@ class DataArguments:
             )
         },
     )
+    tokenized_cache_dir: str | None = field(
+        default=None,
+        metadata={
+            "help": (
+                "Path to the folder of the automatic tokenized dataset cache. The cache is keyed on the dataset "
+                "contents, the tokenizer and the pre-processing arguments. Disabled if None."
+            )
+        },
+    )
+    tokenized_cache_size: float = field(
+        default=50.0,
+        metadata={"help": "Maximum disk size (GB) of the tokenized dataset cache, evicting least recently used ones."},
+    )
     data_shared_file_system: bool = field(
         default=False,
         metadata={"help": "Whether or not to use a shared file system for the datasets."},
@@ -173,6 +213,9 @@ class DataArguments:
         if self.streaming and self.max_samples is not None:
             raise ValueError("`max_samples` is incompatible with `streaming`.")
 
+        if self.streaming and self.packing_scope == "global":
+            raise ValueError("Global packing is incompatible with `streaming`.")
+
         if self.mask_history and self.train_on_prompt:
             raise ValueError("`mask_history` is incompatible with `train_on_prompt`.")
 
@@ -510,6 +510,14 @@ class FinetuningArguments(
         default=False,
         metadata={"help": "Whether or not to disable the shuffling of the training set."},
     )
+    length_bucketing: bool = field(
+        default=False,
+        metadata={"help": "Whether or not to group examples of similar lengths into batches. Requires no packing."},
+    )
+    length_bucket_size: int = field(
+        default=64,
+        metadata={"help": "Number of global batches in each length bucket, larger buckets mean less padding."},
+    )
     early_stopping_steps: int | None = field(
         default=None,
         metadata={"help": "Number of steps to stop training if the `metric_for_best_model` does not improve."},
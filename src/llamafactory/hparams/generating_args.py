@@ -13,7 +13,7 @@
 # limitations under the License.
 
 from dataclasses import asdict, dataclass, field
-from typing import Any
+from typing import Any, Optional
 
 from transformers import GenerationConfig
 
@@ -62,6 +62,10 @@ class GeneratingArguments:
         default=1.0,
         metadata={"help": "Exponential penalty to the length that is used with beam-based generation."},
     )
+    prompt_lookup_num_tokens: Optional[int] = field(
+        default=None,
+        metadata={"help": "Number of tokens drafted by n-gram prompt lookup for assisted decoding (HF engine only)."},
+    )
     skip_special_tokens: bool = field(
         default=True,
         metadata={"help": "Whether or not to remove special tokens in the decoding."},
@@ -75,6 +79,7 @@ class GeneratingArguments:
             args.pop("max_new_tokens", None)
 
         if obey_generation_config:
+            args.pop("prompt_lookup_num_tokens", None)  # assisted decoding does not support batched generation
             generation_config = GenerationConfig()
             for key in list(args.keys()):
                 if not hasattr(generation_config, key):
@@ -53,6 +53,19 @@ class BaseModelArguments:
         default=None,
         metadata={"help": "The folder containing the adapter weights to load."},
     )
+    served_adapters: dict | str | None = field(
+        default=None,
+        metadata={
+            "help": (
+                "Adapters served alongside the base model and selected by the `model` field of the API requests. "
+                "Use a JSON string or `name=path` pairs separated by commas."
+            )
+        },
+    )
+    max_loaded_adapters: int = field(
+        default=4,
+        metadata={"help": "Maximum number of served adapters loaded at the same time, the LRU one is evicted."},
+    )
     cache_dir: str | None = field(
         default=None,
         metadata={"help": "Where to store the pre-trained models downloaded from huggingface.co or modelscope.cn."},
@@ -212,6 +225,17 @@ class BaseModelArguments:
         if self.adapter_name_or_path is not None:  # support merging multiple lora weights
             self.adapter_name_or_path = [path.strip() for path in self.adapter_name_or_path.split(",")]
 
+        if isinstance(self.served_adapters, str):
+            if self.served_adapters.startswith("{"):
+                self.served_adapters = json.loads(self.served_adapters)
+            else:
+                self.served_adapters = dict(
+                    [item.strip() for item in pair.split("=", maxsplit=1)] for pair in self.served_adapters.split(",")
+                )
+
+        if self.max_loaded_adapters < 1:
+            raise ValueError("`max_loaded_adapters` should be a positive integer.")
+
         if self.add_tokens is not None:  # support multiple tokens
             self.add_tokens = [token.strip() for token in self.add_tokens.split(",")]
 
@@ -416,6 +440,41 @@ class ExportArguments:
             raise ValueError("Quantization dataset is necessary for exporting.")
 
 
+@dataclass
+class HuggingfaceArguments:
+    r"""Arguments pertaining to the Huggingface inference engine."""
+
+    hf_batch_size: int = field(
+        default=1,
+        metadata={"help": "Maximum number of concurrent requests batched into one generation, 1 disables batching."},
+    )
+    hf_batch_max_tokens: int = field(
+        default=16384,
+        metadata={"help": "Maximum number of (padded) prompt tokens in a batch of the Huggingface engine."},
+    )
+    hf_batch_wait_ms: float = field(
+        default=10.0,
+        metadata={"help": "Time window in milliseconds to collect the concurrent requests into a batch."},
+    )
+
+    hf_draft_model: str | None = field(
+        default=None,
+        metadata={"help": "Path to the draft model for assisted decoding, should share the tokenizer of the model."},
+    )
+    hf_prefix_cache_size: float = field(
+        default=0.0,
+        metadata={"help": "Memory budget (GB) of the prompt prefix KV cache, 0 disables the prefix cache."},
+    )
+    hf_adapter_cache_size: float = field(
+        default=0.0,
+        metadata={"help": "Memory budget (GB) of the loaded served adapters, 0 means no limit."},
+    )
+
+    def __post_init__(self):
+        if self.hf_batch_size < 1:
+            raise ValueError("`hf_batch_size` should be a positive integer.")
+
+
 @dataclass
 class VllmArguments:
     r"""Arguments pertaining to the vLLM worker."""
@@ -466,6 +525,10 @@ class SGLangArguments:
         default=None,
         metadata={"help": "Config to initialize the SGLang engine. Please use JSON strings."},
     )
+    sglang_max_connections: int = field(
+        default=64,
+        metadata={"help": "Maximum number of pooled connections (and in-flight requests) to the SGLang server."},
+    )
     sglang_lora_backend: Literal["triton", "flashinfer"] = field(
         default="triton",
         metadata={
@@ -527,6 +590,7 @@ class KTransformersArguments:
 class ModelArguments(
     SGLangArguments,
     VllmArguments,
+    HuggingfaceArguments,
     KTransformersArguments,
     ExportArguments,
     ProcessorArguments,
@@ -563,6 +627,7 @@ class ModelArguments(
         BaseModelArguments.__post_init__(self)
         ProcessorArguments.__post_init__(self)
         ExportArguments.__post_init__(self)
+        HuggingfaceArguments.__post_init__(self)
         VllmArguments.__post_init__(self)
         SGLangArguments.__post_init__(self)
 
@@ -272,6 +272,19 @@ def get_train_args(args: dict[str, Any] | list[str] | None = None) -> _TRAIN_CLS
         if data_args.train_on_prompt or data_args.mask_history:
             raise ValueError("`train_on_prompt` or `mask_history` cannot be set as True except SFT.")
 
+    if finetuning_args.length_bucketing:
+        if finetuning_args.stage not in ["sft", "dpo"]:
+            raise ValueError("`length_bucketing` is only valid for SFT and DPO stages.")
+
+        if data_args.packing:
+            raise ValueError("`length_bucketing` is incompatible with `packing`.")
+
+        if finetuning_args.disable_shuffling:
+            raise ValueError("`length_bucketing` is incompatible with `disable_shuffling`.")
+
+        if data_args.streaming:
+            raise ValueError("`length_bucketing` is incompatible with `streaming`.")
+
     if finetuning_args.stage == "sft" and training_args.do_predict and not training_args.predict_with_generate:
         raise ValueError("Please enable `predict_with_generate` to save model predictions.")
 
@@ -356,8 +369,8 @@ def get_train_args(args: dict[str, Any] | list[str] | None = None) -> _TRAIN_CLS
     if model_args.use_kt and is_deepspeed_zero3_enabled():
         raise ValueError("KTransformers is incompatible with DeepSpeed ZeRO-3.")
 
-    if data_args.neat_packing and is_transformers_version_greater_than("4.53.0"):
-        raise ValueError("Neat packing is incompatible with transformers>=4.53.0.")
+    if data_args.neat_packing and is_transformers_version_greater_than("4.53.0") and model_args.flash_attn != "fa2":
+        raise ValueError("Neat packing requires `flash_attn: fa2` with transformers>=4.53.0.")
 
     _set_env_vars()
     _verify_model_args(model_args, data_args, finetuning_args)
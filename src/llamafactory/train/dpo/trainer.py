@@ -31,7 +31,13 @@ from typing_extensions import override
 from ...extras.constants import IGNORE_INDEX
 from ...extras.packages import is_transformers_version_greater_than
 from ..callbacks import SaveProcessorCallback
-from ..trainer_utils import create_custom_optimizer, create_custom_scheduler, get_batch_logps, nested_detach
+from ..trainer_utils import (
+    create_custom_optimizer,
+    create_custom_scheduler,
+    get_batch_logps,
+    get_length_bucket_sampler,
+    nested_detach,
+)
 
 
 if TYPE_CHECKING:
@@ -132,6 +138,10 @@ class CustomDPOTrainer(DPOTrainer):
         if self.finetuning_args.disable_shuffling:
             return torch.utils.data.SequentialSampler(self.train_dataset)
 
+        if self.finetuning_args.length_bucketing:
+            length_columns = ["chosen_input_ids", "rejected_input_ids"]
+            return get_length_bucket_sampler(self.train_dataset, self.args, self.finetuning_args, length_columns)
+
         return super()._get_train_sampler(*args, **kwargs)
 
     @override
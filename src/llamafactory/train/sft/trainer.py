@@ -30,7 +30,7 @@ from ...extras.constants import IGNORE_INDEX
 from ...extras.packages import is_transformers_version_greater_than
 from ..callbacks import SaveProcessorCallback
 from ..fp8_utils import configure_fp8_environment, verify_fp8_status
-from ..trainer_utils import create_custom_optimizer, create_custom_scheduler
+from ..trainer_utils import create_custom_optimizer, create_custom_scheduler, get_length_bucket_sampler
 
 
 if TYPE_CHECKING:
@@ -110,6 +110,9 @@ class CustomSeq2SeqTrainer(Seq2SeqTrainer):
         if self.finetuning_args.disable_shuffling:
             return torch.utils.data.SequentialSampler(self.train_dataset)
 
+        if self.finetuning_args.length_bucketing:
+            return get_length_bucket_sampler(self.train_dataset, self.args, self.finetuning_args, ["input_ids"])
+
         return super()._get_train_sampler(*args, **kwargs)
 
     @override
@@ -23,6 +23,8 @@ from collections.abc import Callable, Mapping
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, Optional, Union
 
+import numpy as np
+import pyarrow.compute as pc
 import torch
 from transformers import Trainer
 from transformers.integrations import is_deepspeed_zero3_enabled
@@ -54,6 +56,7 @@ if is_ray_available():
 
 
 if TYPE_CHECKING:
+    from datasets import Dataset
     from transformers import PreTrainedModel, TrainerCallback, TrainerState
     from trl import AutoModelForCausalLMWithValueHead
 
@@ -587,6 +590,89 @@ def create_custom_scheduler(
             param.register_post_accumulate_grad_hook(scheduler_hook)
 
 
+class LengthBucketSampler(torch.utils.data.Sampler[int]):
+    r"""A sampler that groups examples of similar lengths into the same batch to reduce padding.
+
+    Each epoch, the shuffled indices are split into buckets of `bucket_size` global batches, and sorted by length
+    inside each bucket. The global batches are then shuffled, so the randomness is kept at the bucket level. A global
+    batch holds one micro batch per process, thus all the processes receive examples of similar lengths.
+    """
+
+    def __init__(
+        self,
+        lengths: list[int],
+        batch_size: int,
+        num_processes: int = 1,
+        bucket_size: int = 64,
+        seed: int = 42,
+    ) -> None:
+        self.lengths = lengths
+        self.global_batch_size = batch_size * num_processes
+        self.bucket_size = bucket_size
+        self.seed = seed
+        self.epoch = 0
+        self.num_yielded = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def _get_indices(self) -> list[int]:
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        indices = torch.randperm(len(self.lengths), generator=generator).tolist()
+        bucket_length = self.global_batch_size * self.bucket_size
+        batches = []
+        for start in range(0, len(indices), bucket_length):
+            bucket = indices[start : start + bucket_length]
+            bucket.sort(key=lambda index: self.lengths[index], reverse=True)
+            for i in range(0, len(bucket), self.global_batch_size):
+                batches.append(bucket[i : i + self.global_batch_size])
+
+        order = torch.randperm(len(batches), generator=generator).tolist()
+        return [index for batch_index in order for index in batches[batch_index]]
+
+    def __iter__(self):
+        indices = self._get_indices()
+        start, self.num_yielded = self.num_yielded, 0  # resume from the state dict once
+        for index in indices[start:]:
+            self.num_yielded += 1
+            yield index
+
+        self.num_yielded = 0
+
+    def state_dict(self) -> dict[str, int]:
+        return {"epoch": self.epoch, "seed": self.seed, "num_yielded": self.num_yielded}
+
+    def load_state_dict(self, state_dict: dict[str, int]) -> None:
+        self.epoch = state_dict["epoch"]
+        self.seed = state_dict["seed"]
+        self.num_yielded = state_dict["num_yielded"]
+
+
+def get_length_bucket_sampler(
+    dataset: "Dataset",
+    training_args: "TrainingArguments",
+    finetuning_args: "FinetuningArguments",
+    length_columns: list[str],
+) -> "LengthBucketSampler":
+    r"""Create a length bucket sampler using the lengths of the token columns, i.e., without re-tokenization."""
+    lengths = None
+    for column in length_columns:
+        column_lengths = pc.list_value_length(dataset.with_format("arrow")[column]).to_numpy(zero_copy_only=False)
+        lengths = column_lengths if lengths is None else np.maximum(lengths, column_lengths)
+
+    return LengthBucketSampler(
+        lengths=lengths.tolist(),
+        batch_size=training_args.per_device_train_batch_size,
+        num_processes=training_args.world_size,
+        bucket_size=finetuning_args.length_bucket_size,
+        seed=training_args.data_seed if training_args.data_seed is not None else training_args.seed,
+    )
+
+
 def get_batch_logps(
     logits: "torch.Tensor",
     labels: "torch.Tensor",
@@ -17,8 +17,9 @@ import os
 import random
 from typing import Any, Literal
 
-from datasets import load_dataset
+from datasets import Dataset, IterableDataset, load_dataset
 
+from ....extras.json_stream import generate_json_records, get_json_file_stats, is_json_array
 from ...utils.plugin import BasePlugin
 from ...utils.types import DatasetInfo, HFDataset
 
@@ -56,6 +57,13 @@ def load_data_from_file(filepath: str, split: str, streaming: bool) -> HFDataset
         dataset = load_dataset(filetype, data_dir=filepath, split=split)
     elif os.path.isfile(filepath):
         filetype = _get_builder_name(filepath)
+        if filetype == "json" and is_json_array(filepath):  # parse top-level arrays incrementally
+            gen_kwargs = {"data_files": get_json_file_stats([filepath])}
+            if streaming:
+                return IterableDataset.from_generator(generate_json_records, gen_kwargs=gen_kwargs)
+
+            return Dataset.from_generator(generate_json_records, gen_kwargs=gen_kwargs, split=split)
+
         dataset = load_dataset(filetype, data_files=filepath, split=split)
     else:
         raise ValueError(f"Can not load dataset from {filepath}.")
@@ -0,0 +1,105 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import io
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from llamafactory.api import media
+from llamafactory.api.media import MediaFetcher
+
+
+def _png_bytes(color: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _stub_fetcher(requested: list[str]) -> MediaFetcher:
+    r"""Serve a red image on /red.png and a copy of it on /copy.png without touching the network."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        if request.url.path in ("/red.png", "/copy.png"):
+            return httpx.Response(200, content=_png_bytes("red"))
+
+        return httpx.Response(404)
+
+    fetcher = MediaFetcher(max_connections=2, cache_size=2)
+    fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    fetcher._semaphore = asyncio.Semaphore(fetcher.max_connections)
+    return fetcher
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_media_fetch(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(media, "check_ssrf_url", lambda url: None)
+    requested = []
+
+    async def run():
+        fetcher = _stub_fetcher(requested)
+        image = await fetcher.load_image("https://example.com/red.png")
+        with pytest.raises(HTTPException) as exc_info:
+            await fetcher.fetch("https://example.com/missing.png", "image")
+
+        await fetcher.aclose()
+        return image, exc_info.value
+
+    image, error = asyncio.run(run())
+    assert image.size == (4, 4)
+    assert image.getpixel((0, 0)) == (255, 0, 0)
+    assert error.status_code == 400
+    assert requested == ["/red.png", "/missing.png"]
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_media_cache_hit(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(media, "check_ssrf_url", lambda url: None)
+    requested = []
+
+    async def run():
+        fetcher = _stub_fetcher(requested)
+        first = await fetcher.load_image("https://example.com/red.png")
+        second = await fetcher.load_image("https://example.com/red.png")  # skips the download
+        copy = await fetcher.load_image("https://example.com/copy.png")  # same content, skips the decoding
+        await fetcher.aclose()
+        return fetcher, first, second, copy
+
+    fetcher, first, second, copy = asyncio.run(run())
+    assert first is second is copy
+    assert requested == ["/red.png", "/copy.png"]
+    assert len(fetcher.image_cache) == 1
+    assert list(fetcher.url_to_hash) == ["https://example.com/red.png", "https://example.com/copy.png"]
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+@pytest.mark.parametrize("url", ["http://127.0.0.1/red.png", "http://localhost/red.png", "file:///etc/passwd"])
+def test_media_ssrf(url: str):
+    requested = []
+
+    async def run():
+        fetcher = _stub_fetcher(requested)
+        with pytest.raises(HTTPException):
+            await fetcher.load_image(url)
+
+        await fetcher.aclose()
+        return fetcher
+
+    fetcher = asyncio.run(run())
+    assert requested == []
+    assert len(fetcher.url_to_hash) == 0
@@ -0,0 +1,161 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional
+
+import pytest
+
+from llamafactory.api import chat, response_cache
+from llamafactory.api.chat import create_stream_chat_completion_response
+from llamafactory.api.protocol import ChatCompletionRequest
+from llamafactory.api.response_cache import ResponseCache, get_cache_key
+from llamafactory.extras.constants import EngineName
+
+
+BYTE = 1 / 1024**2  # the sizes are in MB
+
+
+class StubTemplate:
+    r"""Encodes every character of the system prompt and the messages as its code point."""
+
+    def encode_oneturn(self, tokenizer, messages: list[dict[str, str]], system=None, tools=None):
+        text = (system or "") + "".join(message["content"] for message in messages)
+        return [ord(char) for char in text], []
+
+
+class StubEngine:
+    def __init__(self, model_name_or_path: str, served_adapters: Optional[dict[str, str]] = None) -> None:
+        self.name = EngineName.HF
+        self.model_args = SimpleNamespace(
+            model_name_or_path=model_name_or_path, adapter_name_or_path=None, served_adapters=served_adapters
+        )
+        self.generating_args = {"temperature": 0.0, "do_sample": False}
+        self.template = StubTemplate()
+        self.tokenizer = None
+
+
+class StubChatModel:
+    r"""Streams the characters of the reversed prompt and counts the generations."""
+
+    def __init__(self, engine: "StubEngine") -> None:
+        self.engine = engine
+        self.num_calls = 0
+
+    async def astream_chat(self, messages: list[dict[str, str]], *args, **kwargs):
+        self.num_calls += 1
+        for char in reversed(messages[-1]["content"]):
+            yield char
+
+
+def _request(content: str = "Hi", model: str = "test", **kwargs) -> "ChatCompletionRequest":
+    return ChatCompletionRequest(model=model, messages=[{"role": "user", "content": content}], **kwargs)
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_response_cache_ttl(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    clock = [1000.0]
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: clock[0]))
+    cache = ResponseCache(max_size=1.0, ttl=10.0, cache_dir=str(tmp_path))
+    cache.put("key", ["a", "b"])
+    clock[0] += 5.0
+    assert cache.get("key") == ["a", "b"]
+    clock[0] += 6.0
+    assert cache.get("key") is None
+    assert cache.get_stats() == {"entries": 0, "size_bytes": 0}
+    assert cache.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 0  # expired on disk as well
+    cache.close()
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_response_cache_memory_bound():
+    cache = ResponseCache(max_size=100 * BYTE, ttl=0.0)
+    for key in ("a", "b", "c"):
+        cache.put(key, key * 38)  # 40 bytes serialized
+
+    assert cache.get("a") is None  # evicted
+    assert cache.get("b") == "b" * 38
+    cache.put("d", "d" * 38)  # evicts c, the least recently used
+    assert cache.get("c") is None
+    assert cache.get("b") is not None and cache.get("d") is not None
+    cache.put("e", "e" * 200)  # larger than the cache
+    assert cache.get("e") is None
+    assert cache.get_stats() == {"entries": 2, "size_bytes": 80}
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_response_cache_disk_bound(tmp_path: Path):
+    cache = ResponseCache(max_size=0.0, ttl=0.0, cache_dir=str(tmp_path), max_disk_size=100 * BYTE)
+    for key in ("a", "b", "c"):
+        cache.put(key, key * 38)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "b" * 38
+    cache.put("d", "d" * 38)  # evicts c, the least recently accessed
+    cache.close()
+    cache = ResponseCache(max_size=0.0, ttl=0.0, cache_dir=str(tmp_path), max_disk_size=100 * BYTE)  # restart
+    assert cache.get("c") is None
+    assert cache.get("b") == "b" * 38
+    assert cache.get("d") == "d" * 38
+    assert cache.db.execute("SELECT SUM(size) FROM entries").fetchone()[0] == 80
+    cache.close()
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_response_cache_key(tmp_path: Path):
+    (tmp_path / "model").mkdir()
+    (tmp_path / "model" / "config.json").write_text("{}")
+    engine = StubEngine(str(tmp_path / "model"), served_adapters={"lora": str(tmp_path / "model")})
+    chat_model = SimpleNamespace(engine=engine)
+    key = get_cache_key(_request(), chat_model, [{"role": "user", "content": "Hi"}])
+    assert key == get_cache_key(_request(), chat_model, [{"role": "user", "content": "Hi"}])
+    assert key != get_cache_key(_request(), chat_model, [{"role": "user", "content": "Ho"}])
+    assert key != get_cache_key(_request(max_tokens=8), chat_model, [{"role": "user", "content": "Hi"}])
+    assert key != get_cache_key(_request(stream=True), chat_model, [{"role": "user", "content": "Hi"}])
+    assert key != get_cache_key(_request(), chat_model, [{"role": "user", "content": "Hi"}], system="Be brief.")
+    assert key != get_cache_key(_request(model="lora"), chat_model, [{"role": "user", "content": "Hi"}])
+    assert (
+        get_cache_key(_request(temperature=0.7, do_sample=True), chat_model, [{"role": "user", "content": "Hi"}])
+        is None
+    )
+    assert get_cache_key(_request(n=2), chat_model, [{"role": "user", "content": "Hi"}]) is None
+
+    mtime = os.path.getmtime(tmp_path / "model" / "config.json")
+    os.utime(tmp_path / "model" / "config.json", (mtime + 10, mtime + 10))  # overwrite the checkpoint
+    assert key == get_cache_key(_request(), chat_model, [{"role": "user", "content": "Hi"}])  # same weights in memory
+    reloaded = SimpleNamespace(engine=StubEngine(str(tmp_path / "model")))
+    assert key != get_cache_key(_request(), reloaded, [{"role": "user", "content": "Hi"}])
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_response_cache_stream_replay(monkeypatch: pytest.MonkeyPatch):
+    cache = ResponseCache(max_size=1.0, ttl=0.0)
+    monkeypatch.setattr(chat, "get_response_cache", lambda: cache)
+    chat_model = StubChatModel(StubEngine("stub-model"))
+
+    async def stream():
+        chunks = [chunk async for chunk in create_stream_chat_completion_response(_request("abc"), chat_model)]
+        assert chunks[-1] == "[DONE]"
+        return [json.loads(chunk)["choices"][0] for chunk in chunks[:-1]]
+
+    generated = asyncio.run(stream())
+    replayed = asyncio.run(stream())
+    assert chat_model.num_calls == 1
+    assert replayed == generated
+    assert "".join(choice["delta"].get("content") or "" for choice in replayed) == "cba"
+    assert replayed[-1]["finish_reason"] == "stop"
@@ -15,7 +15,12 @@
 
 import pytest
 
-from llamafactory.data.processor.processor_utils import infer_seqlen
+from llamafactory.data.processor.processor_utils import (
+    PACKING_ALGORITHMS,
+    best_fit_decreasing,
+    first_fit_decreasing,
+    infer_seqlen,
+)
 
 
 @pytest.mark.runs_on(["cpu", "mps"])
@@ -33,3 +38,20 @@ from llamafactory.data.processor.processor_utils import infer_seqlen
 )
 def test_infer_seqlen(test_input: tuple[int, int, int], test_output: tuple[int, int]):
     assert test_output == infer_seqlen(*test_input)
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+@pytest.mark.parametrize("algorithm", ["greedy", "ffd", "bfd"])
+def test_packing_algorithms(algorithm: str):
+    numbers = [7, 2, 5, 9, 1, 4, 3, 8, 6, 5]
+    knapsacks = PACKING_ALGORITHMS[algorithm](numbers.copy(), 10)
+    assert sorted(number for knapsack in knapsacks for number in knapsack) == sorted(numbers)
+    assert all(sum(knapsack) <= 10 for knapsack in knapsacks)
+    assert len(knapsacks) == 5
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_fit_decreasing():
+    assert first_fit_decreasing([3, 9, 1, 6], 10) == [[9, 1], [6, 3]]
+    assert best_fit_decreasing([3, 9, 1, 6], 10) == [[9], [6, 3, 1]]
+    assert best_fit_decreasing([5, 4, 3, 3], 8) == [[5, 3], [4, 3]]
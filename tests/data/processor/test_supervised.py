@@ -107,3 +107,24 @@ def test_supervised_mask_history(num_samples: int):
         ref_label_ids = [IGNORE_INDEX] * prompt_len + ref_input_ids[prompt_len:]
         assert train_dataset["input_ids"][index] == ref_input_ids
         assert train_dataset["labels"][index] == ref_label_ids
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+@pytest.mark.parametrize("packing_algorithm", ["greedy", "bfd"])
+def test_supervised_global_packing(packing_algorithm: str):
+    train_dataset = load_dataset_module(dataset_dir="ONLINE", dataset=TINY_DATA, **TRAIN_ARGS)["train_dataset"]
+    packed_dataset = load_dataset_module(
+        dataset_dir="ONLINE",
+        dataset=TINY_DATA,
+        packing=True,
+        packing_algorithm=packing_algorithm,
+        packing_scope="global",
+        overwrite_cache=True,
+        **TRAIN_ARGS,
+    )["train_dataset"]
+    real_tokens = sum(label != IGNORE_INDEX for labels in train_dataset["labels"] for label in labels)
+    packed_tokens = sum(label != IGNORE_INDEX for labels in packed_dataset["labels"] for label in labels)
+    assert real_tokens == packed_tokens
+    seq_length = TRAIN_ARGS["cutoff_len"] + 1  # packed rows carry one extra pad token for flash_attn
+    for column in ("input_ids", "labels", "attention_mask", "position_ids"):
+        assert all(len(row) == seq_length for row in packed_dataset[column])
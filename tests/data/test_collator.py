@@ -20,7 +20,12 @@ from PIL import Image
 from transformers import AutoConfig, AutoModelForVision2Seq
 
 from llamafactory.data import get_template_and_fix_tokenizer
-from llamafactory.data.collator import MultiModalDataCollatorForSeq2Seq, prepare_4d_attention_mask
+from llamafactory.data.collator import (
+    MultiModalDataCollatorForSeq2Seq,
+    _get_causal_mask,
+    prepare_4d_attention_mask,
+    prepare_varlen_attention_kwargs,
+)
 from llamafactory.extras.constants import IGNORE_INDEX
 from llamafactory.hparams import get_infer_args
 from llamafactory.model import load_tokenizer
@@ -168,6 +173,24 @@ def test_4d_attention_mask():
     assert list(attention_mask_computed.size()) == [2, 1, 6, 6]
     assert torch.all(attention_mask_computed == attention_mask_expected)
 
+    hits = _get_causal_mask.cache_info().hits
+    assert torch.all(prepare_4d_attention_mask(attention_mask_with_indices, torch.float16) == attention_mask_expected)
+    assert _get_causal_mask.cache_info().hits == hits + 1  # the causal mask is built once per length and device
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_varlen_attention_kwargs():
+    attention_mask_with_indices = torch.tensor(
+        [
+            [1, 1, 2, 2, 2, 0],
+            [1, 2, 2, 3, 3, 3],
+        ]
+    )
+    varlen_kwargs = prepare_varlen_attention_kwargs(attention_mask_with_indices)
+    assert varlen_kwargs["cu_seq_lens_q"].tolist() == [0, 2, 5, 6, 7, 9, 12]
+    assert varlen_kwargs["cu_seq_lens_q"].dtype == torch.int32
+    assert varlen_kwargs["max_length_q"] == 3
+
 
 if __name__ == "__main__":
     test_multimodal_collator()
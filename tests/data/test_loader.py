@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import os
 
 import pytest
@@ -59,3 +60,39 @@ def test_load_eval_data():
     dataset_module = load_dataset_module(eval_dataset=TINY_DATA, **TRAIN_ARGS)
     assert dataset_module.get("train_dataset") is not None
     assert dataset_module.get("eval_dataset") is not None
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_load_tokenized_cache(tmp_path):
+    cache_dir = str(tmp_path / "tokenized_cache")
+    dataset_module = load_dataset_module(tokenized_cache_dir=cache_dir, **TRAIN_ARGS)
+    assert len(os.listdir(cache_dir)) == 1
+    cached_module = load_dataset_module(tokenized_cache_dir=cache_dir, **TRAIN_ARGS)
+    assert cached_module["train_dataset"]["input_ids"] == dataset_module["train_dataset"]["input_ids"]
+    load_dataset_module(tokenized_cache_dir=cache_dir, **{**TRAIN_ARGS, "cutoff_len": 1024})
+    assert len(os.listdir(cache_dir)) == 2
+    load_dataset_module(tokenized_cache_dir=cache_dir, **{**TRAIN_ARGS, "preprocessing_batch_size": 2})
+    assert len(os.listdir(cache_dir)) == 3
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_load_incremental_tokenization(tmp_path):
+    examples = [{"instruction": f"Question {i}", "input": "", "output": f"Answer {i}"} for i in range(16)]
+    with open(tmp_path / "dataset_info.json", "w") as f:
+        json.dump({"tiny": {"file_name": "tiny.json"}}, f)
+
+    def load_tiny(examples: list[dict[str, str]], **kwargs):
+        with open(tmp_path / "tiny.json", "w") as f:
+            json.dump(examples, f)
+
+        train_args = {**TRAIN_ARGS, "dataset": "tiny", "dataset_dir": str(tmp_path), "overwrite_cache": True}
+        return load_dataset_module(**train_args, **kwargs)["train_dataset"]
+
+    cache_dir = str(tmp_path / "tokenized_cache")
+    load_tiny(examples, tokenized_cache_dir=cache_dir)
+    examples[3]["output"] = "A changed answer"
+    examples.append({"instruction": "A new question", "input": "", "output": "A new answer"})
+    incremental_dataset = load_tiny(examples, tokenized_cache_dir=cache_dir)
+    full_dataset = load_tiny(examples)
+    assert incremental_dataset["input_ids"] == full_dataset["input_ids"]
+    assert incremental_dataset["labels"] == full_dataset["labels"]
@@ -13,13 +13,15 @@
 # limitations under the License.
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import TYPE_CHECKING
 
 import pytest
 from transformers import AutoTokenizer
 
 from llamafactory.data import get_template_and_fix_tokenizer
-from llamafactory.data.template import parse_template
+from llamafactory.data.processor.processor_utils import BatchEncodingTokenizer
+from llamafactory.data.template import PREFIX_CACHE, PrefixTokenCache, parse_template
 from llamafactory.hparams import DataArguments
 
 
@@ -220,6 +222,59 @@ def test_get_stop_token_ids():
     assert set(template.get_stop_token_ids(tokenizer)) == {128008, 128009}
 
 
+@pytest.mark.runs_on(["cpu", "mps"])
+@pytest.mark.parametrize("use_fast", [True, False])
+def test_prefix_cache(use_fast: bool):
+    tokenizer = AutoTokenizer.from_pretrained(TINY_LLAMA3, use_fast=use_fast)
+    template = get_template_and_fix_tokenizer(tokenizer, DataArguments(template="llama3"))
+    system = "You are a helpful assistant."
+    prompt_ids, answer_ids = template.encode_oneturn(tokenizer, MESSAGES, system)
+    assert PREFIX_CACHE.get_stats() == {"hits": 0, "misses": 1, "size": 1}
+    for _ in range(2):
+        assert template.encode_oneturn(tokenizer, MESSAGES, system) == (prompt_ids, answer_ids)
+
+    assert PREFIX_CACHE.get_stats() == {"hits": 2, "misses": 1, "size": 1}
+    prompt_str = (
+        f"<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n\n{system}<|eot_id|>"
+        "<|start_header_id|>user<|end_header_id|>\n\nHow are you<|eot_id|>"
+        "<|start_header_id|>assistant<|end_header_id|>\n\nI am fine!<|eot_id|>"
+        "<|start_header_id|>user<|end_header_id|>\n\n你好<|eot_id|>"
+        "<|start_header_id|>assistant<|end_header_id|>\n\n"
+    )
+    _check_tokenization(tokenizer, (prompt_ids,), (prompt_str,))
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_prefix_cache_threads():
+    cache = PrefixTokenCache(maxsize=4)
+
+    def worker(offset: int) -> None:
+        for i in range(1000):
+            key = (0, 0, "", str((offset + i) % 8))
+            if cache.get(key) is None:
+                cache.put(key, [i])
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(worker, range(8)))
+
+    stats = cache.get_stats()
+    assert stats["hits"] + stats["misses"] == 8000
+    assert stats["size"] == 4
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+@pytest.mark.parametrize("template_name", ["llama3", "qwen3"])
+def test_batch_encoding_tokenizer(template_name: str):
+    tokenizer = AutoTokenizer.from_pretrained(TINY_LLAMA3)
+    template = get_template_and_fix_tokenizer(tokenizer, DataArguments(template=template_name))
+    texts = template.get_text_elements(MESSAGES, "You are a helpful assistant.")
+    batch_tokenizer = BatchEncodingTokenizer(tokenizer, texts)
+    assert batch_tokenizer.eos_token_id == tokenizer.eos_token_id
+    assert template.encode_multiturn(batch_tokenizer, MESSAGES, "You are a helpful assistant.") == (
+        template.encode_multiturn(tokenizer, MESSAGES, "You are a helpful assistant.")
+    )
+
+
 @pytest.mark.runs_on(["cpu", "mps"])
 @pytest.mark.skipif(not HF_TOKEN, reason="Gated model.")
 @pytest.mark.parametrize("use_fast", [True, False])
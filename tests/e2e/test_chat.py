@@ -12,15 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import os
+from types import SimpleNamespace
 
 import pytest
+import torch
+from transformers import BatchEncoding
 
 from llamafactory.chat import ChatModel
+from llamafactory.chat.hf_scheduler import ScoreScheduler
+from llamafactory.chat.metrics import COMPLETION_TOKENS, E2E_LATENCY, PROMPT_TOKENS, REGISTRY
+from llamafactory.chat.speculative import get_acceptance_rate
 
 
 TINY_LLAMA3 = os.getenv("TINY_LLAMA3", "llamafactory/tiny-random-Llama-3")
 
+TINY_LLAMA_ADAPTER = os.getenv("TINY_LLAMA_ADAPTER", "llamafactory/tiny-random-Llama-3-lora")
+
 INFER_ARGS = {
     "model_name_or_path": TINY_LLAMA3,
     "finetuning_type": "lora",
@@ -37,6 +46,32 @@ MESSAGES = [
 EXPECTED_RESPONSE = "_rho"
 
 
+class StubTokenizer:
+    r"""Encodes every character as its code point and pads with zeros on the right."""
+
+    def __call__(self, texts: list[str], truncation: bool, max_length: int, add_special_tokens: bool):
+        return {"input_ids": [[ord(char) for char in text][:max_length] for text in texts]}
+
+    def pad(self, encoded_inputs: dict[str, list[list[int]]], return_tensors: str) -> BatchEncoding:
+        input_ids = encoded_inputs["input_ids"]
+        length = max(len(ids) for ids in input_ids)
+        return BatchEncoding(
+            {
+                "input_ids": torch.tensor([ids + [0] * (length - len(ids)) for ids in input_ids]),
+                "attention_mask": torch.tensor([[1] * len(ids) + [0] * (length - len(ids)) for ids in input_ids]),
+            }
+        )
+
+
+class StubRewardModel:
+    r"""Value head whose value at each position is the sum of the token ids so far."""
+
+    pretrained_model = SimpleNamespace(device="cpu")
+
+    def __call__(self, input_ids: "torch.Tensor", attention_mask: "torch.Tensor", **kwargs):
+        return None, None, input_ids.cumsum(dim=-1).float()
+
+
 @pytest.mark.runs_on(["cpu", "mps"])
 def test_chat():
     chat_model = ChatModel(INFER_ARGS)
@@ -51,3 +86,107 @@ def test_stream_chat():
         response += token
 
     assert response == EXPECTED_RESPONSE
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_batch_chat():
+    chat_model = ChatModel(INFER_ARGS)
+    batch_messages = [MESSAGES, [{"role": "user", "content": "Hi " * 8}], MESSAGES]
+    results = chat_model.batch_chat(batch_messages, max_batch_size=2)
+    assert len(results) == 3
+    assert results[0].responses[0].response_text == EXPECTED_RESPONSE
+    assert results[2].responses[0].response_text == EXPECTED_RESPONSE
+    assert all(result.latency > 0 for result in results)
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_batched_chat():
+    chat_model = ChatModel({**INFER_ARGS, "hf_batch_size": 4})
+
+    async def run_concurrently():
+        return await asyncio.gather(*(chat_model.achat(MESSAGES) for _ in range(4)))
+
+    results = asyncio.run_coroutine_threadsafe(run_concurrently(), chat_model._loop).result()
+    assert all(result[0].response_text == EXPECTED_RESPONSE for result in results)
+    assert chat_model.engine.scheduler.get_stats()["requests"] == 4
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_batched_stream_chat():
+    chat_model = ChatModel({**INFER_ARGS, "hf_batch_size": 4})
+    response = ""
+    for token in chat_model.stream_chat(MESSAGES):
+        response += token
+
+    assert response == EXPECTED_RESPONSE
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_prefix_cache_chat():
+    chat_model = ChatModel({**INFER_ARGS, "hf_prefix_cache_size": 1.0})
+    system = "You are a helpful assistant. " * 8
+    response = chat_model.chat(MESSAGES, system=system)[0].response_text
+    assert chat_model.chat(MESSAGES, system=system)[0].response_text == response
+
+    stats = chat_model.engine.prefix_cache.get_stats()
+    assert stats["entries"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_chat_metrics():
+    chat_model = ChatModel(INFER_ARGS)
+    num_requests = E2E_LATENCY.get_count(engine="hf")
+    num_tokens = COMPLETION_TOKENS.get(engine="hf")
+    chat_model.chat(MESSAGES)
+    assert E2E_LATENCY.get_count(engine="hf") == num_requests + 1
+    assert COMPLETION_TOKENS.get(engine="hf") == num_tokens + 1
+    assert 'llamafactory_requests_total{engine="hf",method="chat"}' in REGISTRY.render()
+
+    num_prompt_tokens = PROMPT_TOKENS.get(engine="hf")
+    prompt_length = chat_model.chat(MESSAGES)[0].prompt_length
+    assert PROMPT_TOKENS.get(engine="hf") == num_prompt_tokens + prompt_length
+
+    num_prompt_tokens, num_tokens = PROMPT_TOKENS.get(engine="hf"), COMPLETION_TOKENS.get(engine="hf")
+    response = "".join(chat_model.stream_chat(MESSAGES))
+    assert PROMPT_TOKENS.get(engine="hf") == num_prompt_tokens + prompt_length  # same count as chat
+    assert COMPLETION_TOKENS.get(engine="hf") == num_tokens + len(
+        chat_model.engine.tokenizer.encode(response, add_special_tokens=False)
+    )
+    assert 'llamafactory_requests_total{engine="hf",method="stream_chat"}' in REGISTRY.render()
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_prompt_lookup_chat():
+    chat_model = ChatModel({**INFER_ARGS, "max_new_tokens": 8, "prompt_lookup_num_tokens": 4})
+    reference_model = ChatModel({**INFER_ARGS, "max_new_tokens": 8})
+    response = chat_model.chat(MESSAGES)[0].response_text
+    assert response == reference_model.chat(MESSAGES)[0].response_text  # lossless under greedy decoding
+    assert "".join(chat_model.stream_chat(MESSAGES)) == response
+    assert 0.0 <= get_acceptance_rate() <= 1.0
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_served_adapters_chat():
+    chat_model = ChatModel({**INFER_ARGS, "max_new_tokens": 4, "served_adapters": f"sft={TINY_LLAMA_ADAPTER}"})
+    reference_model = ChatModel({**INFER_ARGS, "max_new_tokens": 4, "adapter_name_or_path": TINY_LLAMA_ADAPTER})
+    base_model = ChatModel({**INFER_ARGS, "max_new_tokens": 4})
+    response = reference_model.chat(MESSAGES)[0].response_text
+    assert chat_model.chat(MESSAGES, adapter="sft")[0].response_text == response
+    assert "".join(chat_model.stream_chat(MESSAGES, adapter="sft")) == response
+    assert chat_model.chat(MESSAGES)[0].response_text == base_model.chat(MESSAGES)[0].response_text
+    assert chat_model.engine.adapter_registry.get_stats()["loaded"] == ["sft"]
+
+
+@pytest.mark.runs_on(["cpu", "mps"])
+def test_score_scheduler():
+    scheduler = ScoreScheduler(StubRewardModel(), StubTokenizer(), max_batch_tokens=8, max_wait_ms=100)
+    batch_inputs = [["a", "bbbbbb"], ["cc"], ["dddd", "e", "ffffffff"]]
+
+    async def score_concurrently():
+        return await asyncio.gather(*(scheduler.get_scores(batch_input, max_length=6) for batch_input in batch_inputs))
+
+    results = asyncio.run(score_concurrently())
+    assert results == [[float(sum(map(ord, text[:6]))) for text in batch_input] for batch_input in batch_inputs]
+    assert scheduler.get_stats()["batches"] == 1
+    assert scheduler.get_stats()["requests"] == 3
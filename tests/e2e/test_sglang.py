@@ -12,11 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import json
 import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
 
 import pytest
 
 from llamafactory.chat import ChatModel
+from llamafactory.chat.sse_client import AsyncSSEClient
 from llamafactory.extras.packages import is_sglang_available
 
 
@@ -63,6 +68,65 @@ def test_stream_chat():
     assert response, "Should receive a non-empty response"
 
 
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i in range(1, body["n"] + 1):
+            self.wfile.write(f"data: {json.dumps({'text': 'a' * i})}\n\n".encode())
+
+        self.wfile.write(b": keep-alive\n\ndata: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.runs_on(["cpu"])
+def test_sse_client():
+    r"""Test the pooled SSE client against a local stub server."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    client = AsyncSSEClient(f"http://127.0.0.1:{server.server_address[1]}", max_connections=2)
+
+    async def collect(n: int) -> list[str]:
+        return [event["text"] async for event in client.stream("/generate", {"n": n})]
+
+    async def run() -> list[list[str]]:
+        try:
+            return await asyncio.gather(*(collect(n) for n in range(1, 5)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+    server.shutdown()
+    assert results == [["a" * i for i in range(1, n + 1)] for n in range(1, 5)]
+
+
+@pytest.mark.runs_on(["cpu"])
+def test_sse_client_close():
+    r"""Test closing the pooled SSE client from another thread, like the engine cleanup does."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    client = AsyncSSEClient(f"http://127.0.0.1:{server.server_address[1]}")
+    loop = asyncio.new_event_loop()
+    Thread(target=loop.run_forever, daemon=True).start()
+
+    async def collect(n: int) -> list[str]:
+        return [event["text"] async for event in client.stream("/generate", {"n": n})]
+
+    assert asyncio.run_coroutine_threadsafe(collect(2), loop).result() == ["a", "aa"]
+    http_client = client._client
+    client.close()
+    assert http_client.is_closed
+    assert client._client is None
+    client.close()  # closing twice is a no-op
+
+    loop.call_soon_threadsafe(loop.stop)
+    server.shutdown()
+
+
 # Run tests if executed directly
 if __name__ == "__main__":
     if not is_sglang_available():
@@ -23,6 +23,7 @@ from llamafactory.data import get_dataset, get_template_and_fix_tokenizer
 from llamafactory.hparams import get_train_args
 from llamafactory.model import load_model, load_tokenizer
 from llamafactory.train.sft.trainer import CustomSeq2SeqTrainer
+from llamafactory.train.trainer_utils import LengthBucketSampler
 
 
 DEMO_DATA = os.getenv("DEMO_DATA", "llamafactory/demo_data")
@@ -87,3 +88,25 @@ def test_shuffle(disable_shuffling: bool):
         assert data_collator.verbose_list[0]["input_ids"] == dataset_module["train_dataset"][0]["input_ids"]
     else:
         assert data_collator.verbose_list[0]["input_ids"] != dataset_module["train_dataset"][0]["input_ids"]
+
+
+def test_length_bucket_sampler():
+    lengths = [(index * 37) % 100 for index in range(256)]
+    sampler = LengthBucketSampler(lengths, batch_size=4, num_processes=2, bucket_size=4, seed=42)
+    indices = list(sampler)
+    assert sorted(indices) == list(range(256))
+    for start in range(0, 256, 8):
+        batch_lengths = [lengths[index] for index in indices[start : start + 8]]
+        assert batch_lengths == sorted(batch_lengths, reverse=True)
+
+    assert list(sampler) == indices  # deterministic in the same epoch
+    sampler.set_epoch(1)
+    assert list(sampler) != indices
+
+    sampler.set_epoch(0)
+    iterator = iter(sampler)
+    consumed = [next(iterator) for _ in range(10)]
+    state_dict = sampler.state_dict()
+    resumed_sampler = LengthBucketSampler(lengths, batch_size=4, num_processes=2, bucket_size=4)
+    resumed_sampler.load_state_dict(state_dict)
+    assert consumed + list(resumed_sampler) == indices
@@ -0,0 +1,50 @@
+# Copyright 2025 the LlamaFactory team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import pytest
+
+from llamafactory.extras.json_stream import iter_json_array
+from llamafactory.v1.plugins.data_plugins.loader import load_data_from_file
+
+
+EXAMPLES = [{"instruction": f"Question {i}", "input": "", "output": "Answer ]}, [" * i} for i in range(32)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 16, 1 << 20])
+def test_iter_json_array(tmp_path, chunk_size: int):
+    filepath = tmp_path / "data.json"
+    filepath.write_text(json.dumps(EXAMPLES, indent=2), encoding="utf-8")
+    assert list(iter_json_array(str(filepath), chunk_size=chunk_size)) == EXAMPLES
+
+
+SCALARS = [1.5, 22.25, -3e-7, 10, 0, 1e10, True, None, "1.5", [2.0, -0.5], {"x": 12.75}]
+
+
+@pytest.mark.parametrize("separators", [(",", ":"), (", ", ": "), (" ,\n ", ":")])
+def test_iter_json_array_chunk_boundaries(tmp_path, separators: tuple[str, str]):
+    filepath = tmp_path / "data.json"
+    text = json.dumps(SCALARS, separators=separators)
+    filepath.write_text(text, encoding="utf-8")
+    for chunk_size in range(1, len(text) + 2):  # cut the array at every offset
+        assert list(iter_json_array(str(filepath), chunk_size=chunk_size)) == SCALARS
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_load_json_array(tmp_path, streaming: bool):
+    filepath = tmp_path / "data.json"
+    filepath.write_text(json.dumps(EXAMPLES), encoding="utf-8")
+    dataset = load_data_from_file(str(filepath), split="train", streaming=streaming)
+    assert list(dataset) == EXAMPLES